@@ -0,0 +1,145 @@
+"""Async building blocks for the I/O-bound views.
+
+Views that mostly wait on the network (SMTP, reCAPTCHA, OAuth providers) are
+``async def``. Their outbound calls await httpx and aiosmtplib when those are
+installed, and otherwise run the blocking requests/smtplib call in a thread.
+SQLAlchemy and password hashing stay synchronous and go through ``run_sync``,
+which runs them on a small thread pool with the caller's context copied in,
+so ``db.session``, ``request`` and ``session`` behave as in any other view.
+
+Served by ``uvicorn asgi:app`` these views share one event loop, so a slow
+mail server holds up a coroutine rather than a worker, and HTTP connections
+are pooled on that loop until shutdown. Under gunicorn Flask runs each of
+them on a private loop, which is merely slower than before; there every
+request opens and closes its own client. The client libraries are imported
+on first use, so the CLI and sync-only workers never load them.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+# Matches SQLAlchemy's default pool (5 connections plus 10 overflow)
+_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('ASYNC_DB_THREADS', '15')),
+                               thread_name_prefix='aio-sync')
+# One pooled HTTP client per long-lived loop (see keep_clients); other loops end with their request
+_pooled_loops = weakref.WeakSet()
+_http_clients = weakref.WeakKeyDictionary()
+_requests_session = None
+
+
+async def run_sync(func, *args, **kwargs):
+    """Run a blocking ``func`` on the worker pool and await its result."""
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(_executor, call)
+
+
+def _httpx():
+    try:
+        import httpx
+    except ImportError:
+        return None
+    return httpx
+
+
+def _aiosmtplib():
+    try:
+        import aiosmtplib
+    except ImportError:
+        return None
+    return aiosmtplib
+
+
+def keep_clients():
+    """Pool HTTP clients on the running loop until ``close()``; call from a server's startup hook."""
+    _pooled_loops.add(asyncio.get_running_loop())
+
+
+def _http_client(httpx, loop):
+    client = _http_clients.get(loop)
+    if client is None:
+        client = _http_clients[loop] = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        )
+    return client
+
+
+def _blocking_session():
+    global _requests_session
+    if _requests_session is None:
+        import requests
+        _requests_session = requests.Session()
+    return _requests_session
+
+
+async def http_request(method, url, timeout=5.0, **kwargs):
+    """Send an HTTP request; the response has ``status_code``, ``json()`` and ``raise_for_status()``."""
+    httpx = _httpx()
+    if httpx is None:
+        return await run_sync(_blocking_session().request, method, url, timeout=timeout, **kwargs)
+    loop = asyncio.get_running_loop()
+    if loop in _pooled_loops:
+        return await _http_client(httpx, loop).request(method, url, timeout=timeout, **kwargs)
+    # A per-request loop is gone after this view, so its client must not outlive the call
+    async with httpx.AsyncClient() as client:
+        return await client.request(method, url, timeout=timeout, **kwargs)
+
+
+async def http_get(url, timeout=5.0, **kwargs):
+    return await http_request('GET', url, timeout=timeout, **kwargs)
+
+
+async def http_post(url, timeout=5.0, **kwargs):
+    return await http_request('POST', url, timeout=timeout, **kwargs)
+
+
+def _send_blocking(message, host, port, username, password, start_tls, timeout):
+    import smtplib
+
+    server = smtplib.SMTP(host, port, timeout=timeout)
+    try:
+        server.set_debuglevel(1)
+        if start_tls:
+            server.starttls()
+        server.login(username, password)
+        server.send_message(message)
+    finally:
+        server.quit()
+
+
+async def send_mail(message, host, port, username, password, start_tls=True, timeout=30.0):
+    """Deliver an ``email.message.Message``, logging in after STARTTLS unless ``start_tls`` is off."""
+    aiosmtplib = _aiosmtplib()
+    if aiosmtplib is not None:
+        await aiosmtplib.send(message, hostname=host, port=port, username=username, password=password,
+                              start_tls=start_tls, timeout=timeout)
+    else:
+        await run_sync(_send_blocking, message, host, port, username, password, start_tls, timeout)
+
+
+def smtp_auth_errors():
+    """Exception types ``send_mail`` raises when the server rejects the login."""
+    import smtplib
+
+    aiosmtplib = _aiosmtplib()
+    return (smtplib.SMTPAuthenticationError,) + ((aiosmtplib.SMTPAuthenticationError,) if aiosmtplib else ())
+
+
+def smtp_errors():
+    """Exception types for any SMTP failure in ``send_mail``."""
+    import smtplib
+
+    aiosmtplib = _aiosmtplib()
+    return (smtplib.SMTPException,) + ((aiosmtplib.SMTPException,) if aiosmtplib else ())
+
+
+async def close():
+    """Close the HTTP client pooled on the running loop (called on ASGI shutdown)."""
+    loop = asyncio.get_running_loop()
+    _pooled_loops.discard(loop)
+    client = _http_clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
@@ -1,60 +1,186 @@
-from flask import Flask, flash, request, jsonify, session, redirect, url_for, render_template
+from flask import Blueprint, Flask, current_app, flash, request, jsonify, session, redirect, url_for, render_template
+import click
+import asyncio
 import random
-import smtplib
 import secrets
 import datetime
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from flask_sqlalchemy import SQLAlchemy
+import heapq
+import time
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
 from dotenv import load_dotenv
 from sqlalchemy import text
-from authlib.integrations.flask_client import OAuth
-import requests
-from flask_wtf import CSRFProtect
-
-# Load environment variables
-load_dotenv()
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-change-in-production-' + os.urandom(24).hex())
-app.permanent_session_lifetime = datetime.timedelta(days=30)  # Support "Remember me" sessions
-
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///users.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
-
-# OAuth configuration
-oauth = OAuth(app)
-
-# CSRF Protection (exempt JSON API endpoints using fetch)
-csrf = CSRFProtect(app)
-
-GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID')
-GOOGLE_CLIENT_SECRET = os.environ.get('GOOGLE_CLIENT_SECRET')
-if GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET:
-    oauth.register(
-        name='google',
-        client_id=GOOGLE_CLIENT_ID,
-        client_secret=GOOGLE_CLIENT_SECRET,
-        server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
-        client_kwargs={'scope': 'openid email profile'}
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+import aio
+import archive
+import compressed_text
+import dedup
+import fulltext
+import export
+import reactions
+import trending
+import assets as asset_pipeline
+from extensions import db, csrf, limiter, assets, page_cache
+from models import User, Secret, ArchivedSecret, PasswordReset, EmailVerification, QuarantinedSecret
+from group_commit import GroupCommitter
+from provider_cache import ProviderCache
+from pagination import encode_cursor, decode_cursor, parse_limit
+from json_provider import provider_for
+from compression import CompressionMiddleware
+from shards import SecretShards
+
+bp = Blueprint('main', __name__, cli_group=None)
+
+secret_shards = SecretShards()
+
+def create_app(config=None):
+    """Build the Flask application.
+
+    Nothing here opens a database connection or starts a thread, so gunicorn
+    can build the app once in the master (--preload) and share it copy-on-write
+    with its workers. Schema setup and migrations live in ``flask init-db``.
+    """
+    # Load environment variables
+    load_dotenv()
+
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-change-in-production-' + os.urandom(24).hex())
+    app.permanent_session_lifetime = datetime.timedelta(days=30)  # Support "Remember me" sessions
+
+    # Database configuration
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///users.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Secrets older than ARCHIVE_AFTER_DAYS move to this database via `flask archive-secrets` (0 disables)
+    app.config['SQLALCHEMY_BINDS'] = {'archive': os.environ.get('ARCHIVE_DATABASE_URL', 'sqlite:///archive.db')}
+    app.config['ARCHIVE_AFTER_DAYS'] = int(os.environ.get('ARCHIVE_AFTER_DAYS', '0'))
+    # Secret.content of at least CONTENT_COMPRESS_MIN_BYTES is stored compressed (zlib, or zstd if installed)
+    app.config['CONTENT_CODEC'] = os.environ.get('CONTENT_CODEC', 'zlib')
+    app.config['CONTENT_COMPRESS_MIN_BYTES'] = int(os.environ.get('CONTENT_COMPRESS_MIN_BYTES', '160'))
+    # Spread secrets over SECRET_SHARDS SQLite files by author; see shards.py before changing it
+    app.config['SECRET_SHARDS'] = int(os.environ.get('SECRET_SHARDS', '1'))
+    app.config['SECRET_SHARD_URL'] = os.environ.get('SECRET_SHARD_URL', 'sqlite:///secrets-{shard}.db')
+    # Concurrent secret inserts share one transaction, waiting up to this long for more once two are queued (0 disables)
+    app.config['WRITE_BATCH_WINDOW_MS'] = float(os.environ.get('WRITE_BATCH_WINDOW_MS', '5'))
+    # Heart counts are kept in memory and written out this often (0 writes every heart through)
+    app.config['REACTION_FLUSH_SECONDS'] = float(os.environ.get('REACTION_FLUSH_SECONDS', '2'))
+    # ?sort=trending ranks by engagement halving every TRENDING_HALF_LIFE_HOURS; see trending.py
+    app.config['TRENDING_HALF_LIFE_HOURS'] = float(os.environ.get('TRENDING_HALF_LIFE_HOURS', '6'))
+    app.config['TRENDING_REFRESH_SECONDS'] = float(os.environ.get('TRENDING_REFRESH_SECONDS', '60'))
+    app.config['TRENDING_TOP_K'] = int(os.environ.get('TRENDING_TOP_K', '500'))
+    # New secrets repeating one from the last DEDUP_WINDOW_MINUTES are rejected or quarantined; see dedup.py
+    app.config['DEDUP_ENABLED'] = os.environ.get('DEDUP_ENABLED', 'true').lower() == 'true'
+    app.config['DEDUP_ACTION'] = os.environ.get('DEDUP_ACTION', 'reject')
+    app.config['DEDUP_WINDOW_MINUTES'] = float(os.environ.get('DEDUP_WINDOW_MINUTES', '60'))
+    app.config['DEDUP_SIMILARITY'] = float(os.environ.get('DEDUP_SIMILARITY', '0.8'))
+    app.config['DEDUP_MAX_ENTRIES'] = int(os.environ.get('DEDUP_MAX_ENTRIES', '50000'))
+    # Shorter posts only count as repeats of the same author's own posts
+    app.config['DEDUP_CROSS_USER_MIN_CHARS'] = int(os.environ.get('DEDUP_CROSS_USER_MIN_CHARS', '80'))
+
+    # Rate limiting; point RATELIMIT_STORAGE_URL at a sqlite:/// file to share counters across workers
+    app.config['RATELIMIT_ENABLED'] = os.environ.get('RATELIMIT_ENABLED', 'true').lower() == 'true'
+    app.config['RATELIMIT_STORAGE_URL'] = os.environ.get('RATELIMIT_STORAGE_URL', 'memory://')
+
+    app.config['OAUTH_TIMEOUT'] = float(os.environ.get('OAUTH_TIMEOUT', '5'))
+    app.config['RECAPTCHA_SITE_KEY'] = os.environ.get('RECAPTCHA_SITE_KEY', '')
+    app.config['RECAPTCHA_VERIFY_URL'] = os.environ.get('RECAPTCHA_VERIFY_URL', 'https://www.google.com/recaptcha/api/siteverify')
+    # Reuse rendered HTML for anonymous pages that only depend on config
+    app.config['PAGE_CACHE_ENABLED'] = os.environ.get('PAGE_CACHE_ENABLED', 'true').lower() == 'true'
+
+    # JSON encoder: auto (orjson when installed), orjson or stdlib
+    app.config['JSON_PROVIDER'] = os.environ.get('JSON_PROVIDER', 'auto')
+    # Negotiated gzip/brotli/zstd for JSON and HTML bodies of at least COMPRESS_MIN_SIZE bytes
+    app.config['COMPRESS_ENABLED'] = os.environ.get('COMPRESS_ENABLED', 'true').lower() == 'true'
+    app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', '1024'))
+
+    if config:
+        app.config.update(config)
+
+    app.json = provider_for(app, app.config['JSON_PROVIDER'])
+    if app.config['COMPRESS_ENABLED']:
+        app.wsgi_app = CompressionMiddleware(app.wsgi_app, min_size=app.config['COMPRESS_MIN_SIZE'])
+
+    compressed_text.configure(
+        os.environ.get('CONTENT_DICT_DIR', os.path.join(app.instance_path, 'content-dicts')),
+        min_size=app.config['CONTENT_COMPRESS_MIN_BYTES'],
+        codec=app.config['CONTENT_CODEC']
     )
-
-GITHUB_CLIENT_ID = os.environ.get('GITHUB_CLIENT_ID')
-GITHUB_CLIENT_SECRET = os.environ.get('GITHUB_CLIENT_SECRET')
-if GITHUB_CLIENT_ID and GITHUB_CLIENT_SECRET:
-    oauth.register(
-        name='github',
-        client_id=GITHUB_CLIENT_ID,
-        client_secret=GITHUB_CLIENT_SECRET,
-        access_token_url='https://github.com/login/oauth/access_token',
-        authorize_url='https://github.com/login/oauth/authorize',
-        api_base_url='https://api.github.com/',
-        client_kwargs={'scope': 'read:user user:email'}
+    secret_shards.init_app(app)
+    db.init_app(app)
+    # CSRF Protection (exempt JSON API endpoints using fetch)
+    csrf.init_app(app)
+    limiter.init_app(app)
+    # Hashed, pre-compressed static files from `flask build-assets`
+    assets.init_app(app)
+    page_cache.init_app(app)
+
+    app.extensions['secret_writer'] = GroupCommitter(Secret.__table__, window=app.config['WRITE_BATCH_WINDOW_MS'] / 1000.0)
+    app.extensions['reaction_counter'] = reactions.ReactionCounter(interval=app.config['REACTION_FLUSH_SECONDS'])
+    # The score upsert needs SQL functions only SQLite and PostgreSQL get; elsewhere trending is off
+    backend = make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+    if backend not in trending.DIALECTS:
+        print(f"[TRENDING] Disabled: scores need SQLite or PostgreSQL, not {backend}")
+    app.extensions['trending'] = trending.TrendingScores(
+        half_life_hours=app.config['TRENDING_HALF_LIFE_HOURS'],
+        interval=app.config['REACTION_FLUSH_SECONDS'],
+        refresh_every=app.config['TRENDING_REFRESH_SECONDS'],
+        top_k=app.config['TRENDING_TOP_K']
+    ) if backend in trending.DIALECTS else None
+    app.extensions['dedup'] = dedup.DuplicateFilter(
+        window_minutes=app.config['DEDUP_WINDOW_MINUTES'],
+        similarity=app.config['DEDUP_SIMILARITY'],
+        max_entries=app.config['DEDUP_MAX_ENTRIES'],
+        cross_user_min_chars=app.config['DEDUP_CROSS_USER_MIN_CHARS']
+    ) if app.config['DEDUP_ENABLED'] else None
+    # Discovery documents and JWKS are cached on disk so every worker shares one copy
+    app.extensions['provider_cache'] = ProviderCache(
+        os.environ.get('OAUTH_CACHE_DIR', os.path.join(app.instance_path, 'oauth-cache')),
+        ttl=int(os.environ.get('OAUTH_METADATA_TTL', '3600')),
+        timeout=app.config['OAUTH_TIMEOUT']
     )
+    _register_oauth(app)
+
+    app.register_blueprint(bp)
+    return app
+
+def _register_oauth(app):
+    """Register the OAuth providers that have credentials configured."""
+    google_client_id = os.environ.get('GOOGLE_CLIENT_ID')
+    google_client_secret = os.environ.get('GOOGLE_CLIENT_SECRET')
+    github_client_id = os.environ.get('GITHUB_CLIENT_ID')
+    github_client_secret = os.environ.get('GITHUB_CLIENT_SECRET')
+    if not ((google_client_id and google_client_secret) or (github_client_id and github_client_secret)):
+        return
+
+    # authlib (and its crypto stack) is only imported when a provider is enabled
+    from authlib.integrations.flask_client import OAuth
+    oauth = OAuth(app)
+    timeout = app.config['OAUTH_TIMEOUT']
+
+    if google_client_id and google_client_secret:
+        oauth.register(
+            name='google',
+            client_id=google_client_id,
+            client_secret=google_client_secret,
+            server_metadata_url=os.environ.get('GOOGLE_METADATA_URL', 'https://accounts.google.com/.well-known/openid-configuration'),
+            client_kwargs={'scope': 'openid email profile', 'default_timeout': timeout}
+        )
+
+    if github_client_id and github_client_secret:
+        oauth.register(
+            name='github',
+            client_id=github_client_id,
+            client_secret=github_client_secret,
+            access_token_url=os.environ.get('GITHUB_ACCESS_TOKEN_URL', 'https://github.com/login/oauth/access_token'),
+            authorize_url=os.environ.get('GITHUB_AUTHORIZE_URL', 'https://github.com/login/oauth/authorize'),
+            api_base_url=os.environ.get('GITHUB_API_BASE_URL', 'https://api.github.com/'),
+            client_kwargs={'scope': 'read:user user:email', 'default_timeout': timeout}
+        )
+
+def _oauth_client(name):
+    """Return the registered authlib client for a provider, or None if it isn't configured."""
+    oauth = current_app.extensions.get('authlib.integrations.flask_client')
+    return oauth.create_client(name) if oauth is not None else None
 
 def is_demo_mode() -> bool:
     """Check if we're in demo mode (bypasses email verification)."""
@@ -72,85 +198,29 @@ def is_email_verified(email: str) -> bool:
     latest = EmailVerification.query.filter_by(email=email, verified=True).order_by(EmailVerification.created_at.desc()).first()
     return latest is not None
 
-# User model
-# This model is used to store user credentials in the database
-# username is a unique identifier for the user
-# email is a unique identifier for the user and is used for authentication
-# password is the hashed password for the user
-
-class User(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(150), unique=True, nullable=False)
-    email = db.Column(db.String(150), unique=True, nullable=False)
-    password = db.Column(db.String(256), nullable=False)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
-    
-    # Relationship with secrets
-    secrets = db.relationship('Secret', backref='author', lazy=True)
-
-    def set_password(self, password):
-        self.password = generate_password_hash(password, method='sha256')
-
-    def check_password(self, password):
-        return check_password_hash(self.password, password)
-
-# Secret model for storing user messages/secrets
-class Secret(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String(200), nullable=False)
-    content = db.Column(db.Text, nullable=False)
-    is_anonymous = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'content': self.content,
-            'is_anonymous': self.is_anonymous,
-            'created_at': self.created_at.isoformat(),
-            'author': 'Anonymous' if self.is_anonymous else self.author.username
-        }
-
-# Password Reset model for secure token management
-class PasswordReset(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    email = db.Column(db.String(150), nullable=False)
-    token = db.Column(db.String(100), nullable=False, unique=True)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
-    expires_at = db.Column(db.DateTime, nullable=False)
-    used = db.Column(db.Boolean, default=False)
-    
-    def is_expired(self):
-        return datetime.datetime.now(datetime.UTC) > self.expires_at
-    
-    def is_valid(self):
-        return not self.used and not self.is_expired()
-
-# Email Verification model
-class EmailVerification(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    email = db.Column(db.String(150), nullable=False)
-    code = db.Column(db.String(6), nullable=False)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
-    expires_at = db.Column(db.DateTime, nullable=False)
-    verified = db.Column(db.Boolean, default=False)
-
-    def is_expired(self):
-        return datetime.datetime.now(datetime.UTC) > self.expires_at
-
-    def is_valid(self, submitted_code: str):
-        return (not self.verified) and (not self.is_expired()) and (self.code == submitted_code)
-
 def generate_verification_code():
     return str(random.randint(100000, 999999))
 
-def send_email(recipient_email, subject, html_body, text_body=None):
+def _store_verification_code(email, code):
+    """Replace any unverified codes for ``email`` with ``code``, valid for 15 minutes."""
+    EmailVerification.query.filter(
+        EmailVerification.email == email,
+        EmailVerification.verified == False
+    ).delete()
+    expires_at = datetime.datetime.now(datetime.UTC) + datetime.timedelta(minutes=15)
+    db.session.add(EmailVerification(email=email, code=code, expires_at=expires_at))
+    db.session.commit()
+
+async def send_email(recipient_email, subject, html_body, text_body=None):
     """Enhanced email sending function with HTML support and dev fallback."""
+    # Only needed when a mail actually goes out, so keep them off the import path
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
+
     # Configuration
     smtp_server = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
     smtp_port = int(os.environ.get('SMTP_PORT', '587'))
+    smtp_starttls = os.environ.get('SMTP_STARTTLS', 'true').lower() == 'true'
     sender_email = os.environ.get('SENDER_EMAIL', 'your_email@example.com')
     sender_password = os.environ.get('SENDER_PASSWORD', 'your_password')
     flask_env = os.environ.get('FLASK_ENV', 'production').lower()
@@ -187,21 +257,14 @@ def send_email(recipient_email, subject, html_body, text_body=None):
 
     try:
         print(f"[EMAIL] Attempting to send email via {smtp_server}:{smtp_port}")
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.set_debuglevel(1)  # Enable debug output
-        server.starttls()
-        print(f"[AUTH] Logging in as {sender_email}")
-        server.login(sender_email, sender_password)
-        print(f"[EMAIL] Sending email to {recipient_email}")
-        server.sendmail(sender_email, recipient_email, msg.as_string())
-        server.quit()
+        await aio.send_mail(msg, smtp_server, smtp_port, sender_email, sender_password, start_tls=smtp_starttls)
         print(f"[EMAIL] Email sent successfully to {recipient_email}")
         return True
-    except smtplib.SMTPAuthenticationError as e:
+    except aio.smtp_auth_errors() as e:
         print(f"[ERROR] SMTP Authentication failed: {e}")
         print("[INFO] For Gmail, make sure you're using an App Password, not your regular password")
         print("[INFO] Enable 2-Step Verification and generate an App Password at: https://myaccount.google.com/apppasswords")
-    except smtplib.SMTPException as e:
+    except aio.smtp_errors() as e:
         print(f"[ERROR] SMTP Error: {e}")
     except Exception as e:
         print(f"[ERROR] Email sending failed: {e}")
@@ -216,7 +279,7 @@ def send_email(recipient_email, subject, html_body, text_body=None):
     print("======= END EMAIL =======\n")
     return False
 
-def send_verification_email(recipient_email, code):
+async def send_verification_email(recipient_email, code):
     subject = "Your Verification Code - Segreta"
     html_body = f"""
     <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 10px;">
@@ -233,13 +296,13 @@ def send_verification_email(recipient_email, code):
     </div>
     """
     text_body = f"Hello Beautiful Soul\n\nYour verification code is: {code}\n\nEnter this on the site to verify your email.\n\nEchoes of Love Team [SUCCESS]"
-    return send_email(recipient_email, subject, html_body, text_body)
+    return await send_email(recipient_email, subject, html_body, text_body)
 
 def generate_reset_token():
     """Generate a secure random token for password reset"""
     return secrets.token_urlsafe(32)
 
-def send_password_reset_email(recipient_email, reset_token):
+async def send_password_reset_email(recipient_email, reset_token):
     """Send password reset email with secure token"""
     reset_url = f"{request.url_root}reset-password?token={reset_token}"
     subject = "Reset Your Password - Segreta"
@@ -283,19 +346,21 @@ def send_password_reset_email(recipient_email, reset_token):
     Echoes of Love Team [SUCCESS]
     """
     
-    return send_email(recipient_email, subject, html_body, text_body)
+    return await send_email(recipient_email, subject, html_body, text_body)
 
-@app.route('/verify', methods=['GET'])
+@bp.route('/verify', methods=['GET'])
 def verify_page():
     """Render the email verification page. Email comes from session or query param."""
     email = request.args.get('email') or session.get('email_to_verify')
     if not email:
         flash('Please provide an email to verify.')
-        return redirect(url_for('signup_page'))
+        return redirect(url_for('main.signup_page'))
     return render_template('verify.html', email=email)
 
-@app.route('/send-code', methods=['POST'])
-def send_code():
+@bp.route('/send-code', methods=['POST'])
+@limiter.limit(20, per=3600, by='ip')
+@limiter.limit(1, per=60, by='email', message='A code was sent recently. Please wait a minute before requesting another.')
+async def send_code():
     """Send a 6-digit verification code to the provided email and persist it."""
     # Accept both form POST and JSON
     email = request.form.get('email') if request.form else None
@@ -311,22 +376,12 @@ def send_code():
     if not re.match(r'^[\w\.-]+@[\w\.-]+\.[a-zA-Z]{2,}$', email):
         return jsonify({'message': 'Please enter a valid email address'}), 400
 
-    # Generate code and store
+    # Generate code and store, replacing previous unverified records for this email
     code = generate_verification_code()
-    expires_at = datetime.datetime.now(datetime.UTC) + datetime.timedelta(minutes=15)
-
-    # Cleanup previous unverified records for this email
-    EmailVerification.query.filter(
-        EmailVerification.email == email,
-        EmailVerification.verified == False
-    ).delete()
-
-    record = EmailVerification(email=email, code=code, expires_at=expires_at)
-    db.session.add(record)
-    db.session.commit()
+    await aio.run_sync(_store_verification_code, email, code)
 
     # Send the email
-    send_verification_email(email, code)
+    await send_verification_email(email, code)
 
     # Keep for UX navigations
     session['email_to_verify'] = email
@@ -336,59 +391,48 @@ def send_code():
         return jsonify({'message': 'Verification code sent. Please check your inbox.'}), 200
     return render_template('verify.html', email=email)
 
-@app.route('/verify-email', methods=['POST'])
+@bp.route('/verify-email', methods=['POST'])
 def verify_email():
     """Validate the submitted code against the database and mark verified."""
     code = request.form.get('code') if request.form else None
     email = session.get('email_to_verify') or request.form.get('email')
     if not (email and code):
         flash('Missing email or code.')
-        return redirect(url_for('verify_page'))
+        return redirect(url_for('main.verify_page'))
 
     latest = EmailVerification.query.filter_by(email=email).order_by(EmailVerification.created_at.desc()).first()
     if not latest or not latest.is_valid(code):
         flash('Invalid or expired code. Please try again or resend a new code.')
-        return redirect(url_for('verify_page', email=email))
+        return redirect(url_for('main.verify_page', email=email))
 
     latest.verified = True
     db.session.commit()
 
     flash("Email verified successfully!")
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
+
+def _resend_limited(retry_after):
+    email = request.args.get('email') or session.get('email_to_verify')
+    flash('A code was sent recently. Please wait a minute before requesting another.')
+    return redirect(url_for('main.verify_page', email=email))
 
-@app.route('/resend-code', methods=['GET'])
-def resend_code():
+@bp.route('/resend-code', methods=['GET'])
+@limiter.limit(20, per=3600, by='ip', on_limit=_resend_limited)
+@limiter.limit(1, per=60, by='email', on_limit=_resend_limited)
+async def resend_code():
     email = request.args.get('email') or session.get('email_to_verify')
     if not email:
         flash('No email to resend code for.')
-        return redirect(url_for('signup_page'))
+        return redirect(url_for('main.signup_page'))
 
     print(f"[RESEND] Resending code to {email}")
 
-    # Rate limit: only once per minute
-    recent = EmailVerification.query.filter(
-        EmailVerification.email == email,
-        EmailVerification.created_at > datetime.datetime.now(datetime.UTC) - datetime.timedelta(minutes=1)
-    ).first()
-    if recent:
-        flash('A code was sent recently. Please wait a minute before requesting another.')
-        return redirect(url_for('verify_page', email=email))
-
     try:
-        # Clean up old codes
-        EmailVerification.query.filter(
-            EmailVerification.email == email,
-            EmailVerification.verified == False
-        ).delete()
-        
         code = generate_verification_code()
-        expires_at = datetime.datetime.now(datetime.UTC) + datetime.timedelta(minutes=15)
-        record = EmailVerification(email=email, code=code, expires_at=expires_at)
-        db.session.add(record)
-        db.session.commit()
+        await aio.run_sync(_store_verification_code, email, code)
         
         print(f"[EMAIL] Resending verification code {code} to {email}")
-        email_sent = send_verification_email(email, code)
+        email_sent = await send_verification_email(email, code)
         
         if email_sent:
             flash('A new verification code has been sent to your email.')
@@ -399,27 +443,33 @@ def resend_code():
         print(f"[ERROR] Error resending code: {e}")
         flash('There was an error sending the verification code. Please try again.')
 
-    return redirect(url_for('verify_page', email=email))
+    return redirect(url_for('main.verify_page', email=email))
 
-@app.route('/')
+@bp.route('/')
+@page_cache.cached()
 def home():
     return render_template("home.html")
 
-@app.route('/about')
+@bp.route('/about')
+@page_cache.cached()
 def about():
     return render_template('about.html')
 
-@app.route('/login', methods=['GET'])
+@bp.route('/login', methods=['GET'])
+@page_cache.cached()
 def login_page():
     return render_template("login.html")
 
-@app.route('/signup', methods=['GET'])
+@bp.route('/signup', methods=['GET'])
+@page_cache.cached('RECAPTCHA_SITE_KEY')
 def signup_page():
-    return render_template("signup.html", recaptcha_site_key=os.environ.get('RECAPTCHA_SITE_KEY', ''))
+    return render_template("signup.html", recaptcha_site_key=current_app.config['RECAPTCHA_SITE_KEY'])
 
 @csrf.exempt
-@app.route('/signup', methods=['POST'])
-def signup():
+@bp.route('/signup', methods=['POST'])
+@limiter.limit(10, per=3600, by='ip')
+@limiter.limit(3, per=3600, by='email')
+async def signup():
     data = request.get_json()
     username = data.get('username')
     email = data.get('email')
@@ -441,7 +491,7 @@ def signup():
         if not recaptcha_token:
             return jsonify({'message': 'reCAPTCHA verification failed: token missing'}), 400
         try:
-            resp = requests.post('https://www.google.com/recaptcha/api/siteverify', data={
+            resp = await aio.http_post(current_app.config['RECAPTCHA_VERIFY_URL'], data={
                 'secret': recaptcha_secret,
                 'response': recaptcha_token
             }, timeout=5)
@@ -452,32 +502,18 @@ def signup():
             print(f"[ERROR] reCAPTCHA verification error: {e}")
             return jsonify({'message': 'reCAPTCHA verification error'}), 400
 
-    if User.query.filter_by(email=email).first() or User.query.filter_by(username=username).first():
+    # Lookups and the password hash run on the worker pool; hashing dominates
+    if not await aio.run_sync(_create_user, username, email, password):
         return jsonify({'message': 'User already exists!'}), 400
 
-    hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
-    new_user = User(username=username, email=email, password=hashed_password)
-    db.session.add(new_user)
-    db.session.commit()
-
     # Trigger email verification flow (skip in demo mode)
     if not is_demo_mode():
         try:
             code = generate_verification_code()
-            expires_at = datetime.datetime.now(datetime.UTC) + datetime.timedelta(minutes=15)
-            
-            # Remove any previous unverified records
-            EmailVerification.query.filter(
-                EmailVerification.email == email,
-                EmailVerification.verified == False
-            ).delete()
-            
-            verification = EmailVerification(email=email, code=code, expires_at=expires_at)
-            db.session.add(verification)
-            db.session.commit()
+            await aio.run_sync(_store_verification_code, email, code)
             
             print(f"[EMAIL] Sending signup verification code {code} to {email}")
-            email_sent = send_verification_email(email, code)
+            email_sent = await send_verification_email(email, code)
             session['email_to_verify'] = email
             
             if email_sent:
@@ -488,10 +524,10 @@ def signup():
             return jsonify({
                 'message': message,
                 'user': {
-                    'username': new_user.username,
-                    'email': new_user.email
+                    'username': username,
+                    'email': email
                 },
-                'redirect_url': url_for('verify_page', email=email)
+                'redirect_url': url_for('main.verify_page', email=email)
             }), 201
             
         except Exception as e:
@@ -499,38 +535,70 @@ def signup():
             return jsonify({
                 'message': 'User created successfully! There was an issue sending the verification code. You can request a new one.',
                 'user': {
-                    'username': new_user.username,
-                    'email': new_user.email
+                    'username': username,
+                    'email': email
                 },
-                'redirect_url': url_for('verify_page', email=email)
+                'redirect_url': url_for('main.verify_page', email=email)
             }), 201
     else:
         # Demo mode - no verification needed
-        print(f"[SUCCESS] Demo mode - user {new_user.username} created without verification")
+        print(f"[SUCCESS] Demo mode - user {username} created without verification")
         return jsonify({
             'message': 'User created successfully! (Demo mode - no verification needed)',
             'user': {
-                'username': new_user.username,
-                'email': new_user.email
+                'username': username,
+                'email': email
             }
         }), 201
 
+def _create_user(username, email, password):
+    """Insert a password user; return False if the email or username is already taken."""
+    if User.query.filter_by(email=email).first() or User.query.filter_by(username=username).first():
+        return False
+    hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+    db.session.add(User(username=username, email=email, password=hashed_password))
+    db.session.commit()
+    return True
+
+def _allocate_username(base_username: str) -> str:
+    """Return base_username, or base_username plus one more than its highest numeric suffix.
+
+    After a point lookup for the name itself, the highest suffix comes from a
+    range scan on the unique username index over names continuing with a
+    digit 1-9 (a prefix LIKE can't use it under SQLite's default collation),
+    longest then greatest first, LIMIT 1, so only one row is ever loaded.
+    """
+    if db.session.query(User.id).filter_by(username=base_username).first() is None:
+        return base_username
+    suffix = db.func.substr(User.username, len(base_username) + 1)
+    highest = db.session.query(suffix).filter(
+        User.username >= base_username + '1',
+        User.username < base_username + ':',
+        db.func.ltrim(suffix, '0123456789') == ''
+    ).order_by(db.func.length(suffix).desc(), suffix.desc()).limit(1).scalar()
+    return f"{base_username}{int(highest) + 1 if highest else 1}"
+
 # OAuth routes
 def _login_or_create_user(email: str, suggested_username: str = None):
-    user = User.query.filter_by(email=email).first()
-    if user:
-        session['user_id'] = user.id
-        return user, False
-    # Create new user (passwordless OAuth user)
     base_username = suggested_username or (email.split('@')[0] if email else f'user{random.randint(1000,9999)}')
-    username = base_username
-    suffix = 1
-    while User.query.filter_by(username=username).first() is not None:
-        username = f"{base_username}{suffix}"
-        suffix += 1
-    user = User(username=username, email=email, password=generate_password_hash(secrets.token_urlsafe(16)))
-    db.session.add(user)
-    db.session.commit()
+    # Another worker may claim the same username (or email) between allocation
+    # and commit; the unique constraints catch that and we try again
+    for attempt in range(5):
+        user = User.query.filter_by(email=email).first()
+        if user:
+            session['user_id'] = user.id
+            return user, False
+        # Create new user (passwordless OAuth user)
+        user = User(username=_allocate_username(base_username), email=email, password=generate_password_hash(secrets.token_urlsafe(16)))
+        db.session.add(user)
+        try:
+            db.session.commit()
+            break
+        except IntegrityError:
+            db.session.rollback()
+            print(f"[WARN] Username conflict for {base_username}, retrying ({attempt + 1})")
+    else:
+        raise RuntimeError(f'Could not allocate a username for {base_username}')
     # Mark email as verified in our table, to skip code flow for OAuth
     try:
         ev = EmailVerification(email=email, code='oauth', expires_at=datetime.datetime.now(datetime.UTC), verified=True)
@@ -541,61 +609,100 @@ def _login_or_create_user(email: str, suggested_username: str = None):
     session['user_id'] = user.id
     return user, True
 
-@app.route('/oauth/google')
+@bp.route('/oauth/google')
 def oauth_google():
-    if 'google' not in oauth._clients:
+    google = _oauth_client('google')
+    if google is None:
         flash('Google OAuth is not configured')
-        return redirect(url_for('login_page'))
-    redirect_uri = url_for('oauth_google_callback', _external=True)
-    return oauth.google.authorize_redirect(redirect_uri)
-
-@app.route('/oauth/google/callback')
-def oauth_google_callback():
-    if 'google' not in oauth._clients:
+        return redirect(url_for('main.login_page'))
+    current_app.extensions['provider_cache'].prime(google)
+    redirect_uri = url_for('main.oauth_google_callback', _external=True)
+    return google.authorize_redirect(redirect_uri)
+
+@bp.route('/oauth/google/callback')
+async def oauth_google_callback():
+    google = _oauth_client('google')
+    if google is None:
         flash('Google OAuth is not configured')
-        return redirect(url_for('login_page'))
-    token = oauth.google.authorize_access_token()
-    userinfo = oauth.google.parse_id_token(token)
+        return redirect(url_for('main.login_page'))
+    # With metadata and JWKS cached, the code exchange is the only provider round trip;
+    # authlib verifies the ID token locally and returns its claims as token['userinfo'].
+    # authlib's Flask client is blocking, so both run on the worker pool
+    await aio.run_sync(current_app.extensions['provider_cache'].prime, google)
+    token = await aio.run_sync(google.authorize_access_token)
+    userinfo = token.get('userinfo')
     email = userinfo.get('email') if userinfo else None
     if not email:
         flash('Failed to retrieve email from Google')
-        return redirect(url_for('login_page'))
-    _login_or_create_user(email)
-    return redirect(url_for('dashboard'))
+        return redirect(url_for('main.login_page'))
+    await aio.run_sync(_login_or_create_user, email)
+    return redirect(url_for('main.dashboard'))
 
-@app.route('/oauth/github')
+@bp.route('/oauth/github')
 def oauth_github():
-    if 'github' not in oauth._clients:
+    github = _oauth_client('github')
+    if github is None:
         flash('GitHub OAuth is not configured')
-        return redirect(url_for('login_page'))
-    redirect_uri = url_for('oauth_github_callback', _external=True)
-    return oauth.github.authorize_redirect(redirect_uri)
+        return redirect(url_for('main.login_page'))
+    redirect_uri = url_for('main.oauth_github_callback', _external=True)
+    return github.authorize_redirect(redirect_uri)
+
+async def _fetch_github_identity(github, token):
+    """Fetch the GitHub profile and email list concurrently over a pooled client."""
+    base_url = github.api_base_url
+    timeout = current_app.config['OAUTH_TIMEOUT']
+    headers = {
+        'Authorization': f"Bearer {token['access_token']}",
+        'Accept': 'application/vnd.github+json'
+    }
+
+    async def fetch(path, default=None):
+        resp = await aio.http_get(base_url + path, headers=headers, timeout=timeout)
+        if default is not None and resp.status_code >= 400:
+            return default
+        resp.raise_for_status()
+        return resp.json()
+
+    # The email list is only a fallback, so a failure there must not block login
+    return await asyncio.gather(fetch('user'), fetch('user/emails', []))
 
-@app.route('/oauth/github/callback')
-def oauth_github_callback():
-    if 'github' not in oauth._clients:
+@bp.route('/oauth/github/callback')
+async def oauth_github_callback():
+    github = _oauth_client('github')
+    if github is None:
         flash('GitHub OAuth is not configured')
-        return redirect(url_for('login_page'))
-    token = oauth.github.authorize_access_token()
-    resp = oauth.github.get('user', token=token)
-    data = resp.json()
+        return redirect(url_for('main.login_page'))
+    token = await aio.run_sync(github.authorize_access_token)
+    try:
+        data, emails = await _fetch_github_identity(github, token)
+    except Exception as e:
+        print(f"[ERROR] GitHub profile fetch failed: {e}")
+        flash('Failed to retrieve your profile from GitHub')
+        return redirect(url_for('main.login_page'))
     email = data.get('email')
-    # GitHub may not return primary email in /user; fetch separately
+    # GitHub may not return primary email in /user; fall back to /user/emails
     if not email:
-        emails_resp = oauth.github.get('user/emails', token=token)
-        emails = emails_resp.json() if emails_resp else []
         primary = next((e for e in emails if e.get('primary') and e.get('verified')), None)
         email = primary.get('email') if primary else (emails[0]['email'] if emails else None)
     if not email:
         flash('Failed to retrieve email from GitHub')
-        return redirect(url_for('login_page'))
+        return redirect(url_for('main.login_page'))
     suggested = data.get('login')
-    _login_or_create_user(email, suggested_username=suggested)
-    return redirect(url_for('dashboard'))
+    await aio.run_sync(_login_or_create_user, email, suggested_username=suggested)
+    return redirect(url_for('main.dashboard'))
+
+def _check_login(email, password):
+    """Return (user id, email verified) for valid credentials, else (None, False)."""
+    user = User.query.filter_by(email=email).first()
+    if not user or not check_password_hash(user.password, password):
+        return None, False
+    return user.id, is_email_verified(user.email)
 
 @csrf.exempt
-@app.route('/login', methods=['POST'])
-def login():
+@bp.route('/login', methods=['POST'])
+@limiter.limit(20, per=60, by='ip')
+@limiter.limit(5, per=60, by='email', message='Too many login attempts. Please wait a minute and try again.')
+async def login():
     data = request.get_json()
     email = data.get('email')
     password = data.get('password')
@@ -604,33 +711,23 @@ def login():
     if not all([email, password]):
         return jsonify({'message': 'Both email and secret must be present'}), 400
 
-    user = User.query.filter_by(email=email).first()
-    if not user or not check_password_hash(user.password, password):
+    user_id, verified = await aio.run_sync(_check_login, email, password)
+    if user_id is None:
         return jsonify({'message': 'Invalid credentials!'}), 401
 
     # Enforce verified email before login (skip in demo mode)
-    if not is_email_verified(user.email):
-        print(f"[LOGIN] Login blocked - email not verified for {user.email}")
-        session['email_to_verify'] = user.email
+    if not verified:
+        print(f"[LOGIN] Login blocked - email not verified for {email}")
+        session['email_to_verify'] = email
         
         # Always send a new verification code when login is attempted
         try:
-            # Clean up old unverified codes
-            EmailVerification.query.filter(
-                EmailVerification.email == user.email,
-                EmailVerification.verified == False
-            ).delete()
-            
-            # Generate and send new verification code
+            # Generate and store a new code, replacing old unverified ones
             code = generate_verification_code()
-            expires_at = datetime.datetime.now(datetime.UTC) + datetime.timedelta(minutes=15)
-            
-            verification = EmailVerification(email=user.email, code=code, expires_at=expires_at)
-            db.session.add(verification)
-            db.session.commit()
+            await aio.run_sync(_store_verification_code, email, code)
             
-            print(f"[EMAIL] Sending verification code {code} to {user.email}")
-            email_sent = send_verification_email(user.email, code)
+            print(f"[EMAIL] Sending verification code {code} to {email}")
+            email_sent = await send_verification_email(email, code)
             
             if email_sent:
                 message = 'Please verify your email before logging in. We have sent you a verification code.'
@@ -643,30 +740,279 @@ def login():
         
         return jsonify({
             'message': message,
-            'redirect_url': url_for('verify_page', email=user.email)
+            'redirect_url': url_for('main.verify_page', email=email)
         }), 403
 
-    session['user_id'] = user.id
+    session['user_id'] = user_id
     # Apply remember-me preference
     session.permanent = remember
     return jsonify({'message': 'Logged in successfully!'}), 200
 
-@app.route('/dashboard')
+@bp.route('/dashboard')
 def dashboard():
     if 'user_id' not in session:
-        return redirect(url_for('login_page'))
+        return redirect(url_for('main.login_page'))
     
     user = User.query.get(session['user_id'])
     verified = is_email_verified(user.email)
     return render_template('dashboard.html', user=user, is_verified=verified)
 
-@app.route('/api/secrets', methods=['GET'])
+@bp.route('/api/secrets', methods=['GET'])
 def get_secrets():
-    secrets = Secret.query.order_by(Secret.created_at.desc()).all()
-    return jsonify([secret.to_dict() for secret in secrets])
+    """Global feed, newest first, merged across shards.
+
+    With ``limit`` or ``cursor`` this pages like the timelines and returns
+    ``{secrets, next_cursor}``; without them it returns every secret as a
+    bare list, which is what the dashboard reads. Both include archived
+    secrets. ``sort=trending`` pages through the precomputed trending list
+    instead.
+    """
+    sort = request.args.get('sort', 'new')
+    if sort == 'trending':
+        return _trending_response()
+    if sort != 'new':
+        return jsonify({'message': 'Unknown sort order'}), 400
+    engines = secret_shards.engines()
+    archived_before = _archived_before()
+    if 'limit' not in request.args and 'cursor' not in request.args:
+        rows = _merged_rows(db.select(Secret), Secret, engines, None, None)
+        if archived_before:
+            seen = {row.id for row in rows}
+            rows += [row for row in _keyset_rows(db.select(ArchivedSecret), ArchivedSecret, None, None)
+                     if row.id not in seen]
+            rows.sort(key=lambda row: (row.created_at, row.id), reverse=True)
+        return jsonify(_with_hearts(_serialize_secrets(rows)))
+    limit = parse_limit(request.args.get('limit'))
+    try:
+        page, next_cursor = paginate_secrets(db.select(Secret), request.args.get('cursor'), limit, engines,
+                                             db.select(ArchivedSecret) if archived_before else None, archived_before)
+    except (ValueError, TypeError):
+        return jsonify({'message': 'Invalid cursor'}), 400
+    return jsonify({'secrets': _with_hearts(_serialize_secrets(page)), 'next_cursor': next_cursor})
+
+def _trending_response():
+    if current_app.extensions['trending'] is None:
+        return jsonify({'message': 'Trending is not available on this server'}), 501
+    limit = parse_limit(request.args.get('limit'))
+    try:
+        after = decode_cursor(request.args.get('cursor'), 2)
+        with db.engine.connect() as connection:
+            ranked = trending.page(connection, after, limit + 1)
+    except (ValueError, TypeError):
+        return jsonify({'message': 'Invalid cursor'}), 400
+    more = len(ranked) > limit
+    ranked = ranked[:limit]
+
+    ids = [secret_id for secret_id, _ in ranked]
+    by_id = {}
+    for engine in secret_shards.engines():
+        rows = db.session.execute(db.select(Secret).where(Secret.id.in_(ids)), bind_arguments={'bind': engine}).scalars()
+        by_id.update((row.id, row) for row in rows)
+    # Secrets archived since the last refresh simply drop out of the page
+    page = [by_id[secret_id].to_dict() for secret_id in ids if secret_id in by_id]
+    return jsonify({
+        'secrets': _with_hearts(page),
+        'next_cursor': encode_cursor(ranked[-1].score, ranked[-1].secret_id) if more else None
+    })
+
+def _with_hearts(items):
+    """Add ``hearts`` (approximate) and ``hearted`` to serialized secrets with two queries for the whole list."""
+    ids = [item['id'] for item in items]
+    if not ids:
+        return items
+    with db.engine.connect() as connection:
+        counts = reactions.counts(connection, current_app.extensions['reaction_counter'], ids)
+        hearted = reactions.hearted_by(connection, session['user_id'], ids) if 'user_id' in session else set()
+    for item in items:
+        item['hearts'] = counts[item['id']]
+        item['hearted'] = item['id'] in hearted
+    return items
+
+def _created_at_key(value, model=Secret, engine=None):
+    """Column expression and bound value for comparing model.created_at in a keyset."""
+    # SQLite keeps DateTime as text and CURRENT_TIMESTAMP omits microseconds,
+    # so compare against the same textual form the rows were written in
+    engine = engine or db.engines[getattr(model, '__bind_key__', None)]
+    if engine.dialect.name == 'sqlite':
+        fmt = '%Y-%m-%d %H:%M:%S.%f' if value.microsecond else '%Y-%m-%d %H:%M:%S'
+        return db.type_coerce(model.created_at, db.String), value.strftime(fmt)
+    return model.created_at, value
+
+def _keyset_rows(stmt, model, after, count, engine=None):
+    """Rows of ``stmt`` after the keyset ``after``, newest first, read from ``engine`` (default: the model's bind)."""
+    if after:
+        column, created_at = _created_at_key(datetime.datetime.fromisoformat(after[0]), model, engine)
+        stmt = stmt.where(db.tuple_(column, model.id) < (created_at, after[1]))
+    stmt = stmt.order_by(model.created_at.desc(), model.id.desc())
+    if count is not None:
+        stmt = stmt.limit(count)
+    bind_arguments = {'bind': engine} if engine is not None else None
+    return db.session.execute(stmt, bind_arguments=bind_arguments).scalars().all()
+
+def _merged_rows(stmt, model, engines, after, count):
+    """k-way merge of ``stmt`` run on each engine, newest first by (created_at, id)."""
+    if len(engines) == 1:
+        return _keyset_rows(stmt, model, after, count, engines[0])
+    streams = [_keyset_rows(stmt, model, after, count, engine) for engine in engines]
+    rows, seen = [], set()
+    for row in heapq.merge(*streams, key=lambda row: (row.created_at, row.id), reverse=True):
+        # While a rebalance is copying a batch, a row can briefly exist on two shards
+        if row.id in seen:
+            continue
+        seen.add(row.id)
+        rows.append(row)
+        if count is not None and len(rows) == count:
+            break
+    return rows
+
+def paginate_secrets(stmt, cursor, limit, engines, archive_stmt=None, archived_before=None):
+    """Keyset-paginate a select of Secret newest first by (created_at, id).
+
+    ``stmt`` runs on each of ``engines`` (shards) and the results are merged.
+    ``archive_stmt`` is the same filter over ArchivedSecret, whose rows all
+    predate ``archived_before``; it is merged in only when the page could reach
+    that far back. Returns (rows, next_cursor); raises ValueError on a
+    malformed cursor.
+    """
+    after = decode_cursor(cursor, 2)
+    rows = _merged_rows(stmt, Secret, engines, after, limit + 1)
+    if archive_stmt is not None and (len(rows) <= limit or rows[-1].created_at < archived_before):
+        seen = {row.id for row in rows}
+        # A run interrupted between its two commits can leave a row in both tiers
+        archived = [row for row in _keyset_rows(archive_stmt, ArchivedSecret, after, limit + 1) if row.id not in seen]
+        rows = sorted(rows + archived, key=lambda row: (row.created_at, row.id), reverse=True)
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1].created_at.isoformat(), page[-1].id) if len(rows) > limit else None
+    return page, next_cursor
+
+def _archived_before():
+    """Cut-off the archive tier lies behind, or None when archiving is off."""
+    archive_days = current_app.config['ARCHIVE_AFTER_DAYS']
+    if not archive_days:
+        return None
+    # created_at is naive UTC (CURRENT_TIMESTAMP)
+    return datetime.datetime.now(datetime.UTC).replace(tzinfo=None) - datetime.timedelta(days=archive_days)
+
+def _serialize_secrets(rows):
+    """to_dict() a page mixing Secret and ArchivedSecret rows, looking up archived authors in one query."""
+    user_ids = {row.user_id for row in rows if isinstance(row, ArchivedSecret) and not row.is_anonymous}
+    usernames = {}
+    if user_ids:
+        usernames = dict(db.session.execute(db.select(User.id, User.username).where(User.id.in_(user_ids))).all())
+    return [row.to_dict(usernames.get(row.user_id)) if isinstance(row, ArchivedSecret) else row.to_dict()
+            for row in rows]
+
+def _timeline_response(user, stmt, archive_stmt):
+    limit = parse_limit(request.args.get('limit'))
+    archived_before = _archived_before()
+    try:
+        # All of a user's secrets live on one shard
+        page, next_cursor = paginate_secrets(stmt, request.args.get('cursor'), limit,
+                                             [secret_shards.engine_for(user.id)],
+                                             archive_stmt if archived_before else None, archived_before)
+    except (ValueError, TypeError):
+        return jsonify({'message': 'Invalid cursor'}), 400
+    return jsonify({'secrets': _with_hearts(_serialize_secrets(page)), 'next_cursor': next_cursor})
+
+@bp.route('/api/me/secrets', methods=['GET'])
+def my_secrets():
+    """The logged-in user's own secrets, anonymous ones included."""
+    if 'user_id' not in session:
+        return jsonify({'message': 'Please log in first'}), 401
+    user = User.query.get(session['user_id'])
+    if not user:
+        return jsonify({'message': 'User not found'}), 404
+    return _timeline_response(
+        user,
+        db.select(Secret).filter_by(user_id=user.id),
+        db.select(ArchivedSecret).filter_by(user_id=user.id)
+    )
+
+@bp.route('/api/users/<username>/secrets', methods=['GET'])
+def user_secrets(username):
+    """Public timeline of a user's secrets; anonymous posts are never attributed."""
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        return jsonify({'message': 'User not found'}), 404
+    return _timeline_response(
+        user,
+        db.select(Secret).filter_by(user_id=user.id).where(Secret.is_anonymous.isnot(True)),
+        db.select(ArchivedSecret).filter_by(user_id=user.id).where(ArchivedSecret.is_anonymous.isnot(True))
+    )
+
+@bp.route('/api/me/export', methods=['GET'])
+@limiter.limit(5, per=3600, by='user')
+def export_my_secrets():
+    """Stream every secret of the logged-in user as NDJSON (?gzip=1 for a .ndjson.gz file)."""
+    if 'user_id' not in session:
+        return jsonify({'message': 'Please log in first'}), 401
+    compress = request.args.get('gzip', '').lower() in ('1', 'true')
+    # The generator outlives the request context, so resolve what it needs up front
+    body = export.iter_ndjson(db.engine, current_app.json.dumps, user_id=session['user_id'], compress=compress,
+                              archive_engine=_archive_engine(),
+                              secret_engines=[secret_shards.engine_for(session['user_id'])])
+    filename = 'secrets.ndjson.gz' if compress else 'secrets.ndjson'
+    return current_app.response_class(
+        body,
+        mimetype='application/gzip' if compress else 'application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@bp.route('/api/secrets/search', methods=['GET'])
+def search_secrets():
+    """Ranked full-text search over secrets with highlighted snippets.
+
+    Only the hot tier is indexed, so archived secrets never match.
+    """
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({'message': 'A search query is required'}), 400
+    limit = parse_limit(request.args.get('limit'))
+    try:
+        after = decode_cursor(request.args.get('cursor'), 2)
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor'}), 400
+
+    # Each shard ranks its own rows; merge them by (score, id) like a single index.
+    # bm25 uses per-shard term statistics, so across shards the order is approximate
+    hits, more, shard_of = [], False, {}
+    for engine in secret_shards.engines():
+        with engine.connect() as connection:
+            shard_hits, shard_last = fulltext.search(connection, query, after=after, limit=limit)
+        more = more or shard_last is not None
+        for hit in shard_hits:
+            # Mid-rebalance a row can be indexed on two shards
+            if hit['id'] not in shard_of:
+                shard_of[hit['id']] = engine
+                hits.append(hit)
+    hits.sort(key=lambda hit: (hit['score'], hit['id']))
+    more = more or len(hits) > limit
+    hits = hits[:limit]
+    last_key = (hits[-1]['score'], hits[-1]['id']) if more and hits else None
+
+    by_id = {}
+    for engine in set(shard_of[hit['id']] for hit in hits):
+        ids = [hit['id'] for hit in hits if shard_of[hit['id']] is engine]
+        rows = db.session.execute(db.select(Secret).where(Secret.id.in_(ids)), bind_arguments={'bind': engine}).scalars()
+        by_id.update((row.id, row) for row in rows)
+    results = []
+    for hit in hits:
+        secret = by_id.get(hit['id'])
+        if secret is None:
+            continue
+        item = secret.to_dict()
+        item['highlight'] = {'title': hit['title'], 'content': hit['snippet']}
+        results.append(item)
+
+    return jsonify({
+        'results': _with_hearts(results),
+        'next_cursor': encode_cursor(*last_key) if last_key else None
+    })
 
 @csrf.exempt
-@app.route('/api/secrets', methods=['POST'])
+@bp.route('/api/secrets', methods=['POST'])
+@limiter.limit(60, per=60, by='ip')
+@limiter.limit(10, per=60, by='user', message='You are sharing secrets too quickly. Please wait a moment.')
 def create_secret():
     print(f"[DEBUG] Create secret called - Session: {session}")
     
@@ -701,22 +1047,46 @@ def create_secret():
         else:
             print("[SUCCESS] Demo mode - skipping email verification")
 
+    duplicates = current_app.extensions['dedup']
+    fingerprint = None
+    if duplicates is not None:
+        fingerprint = dedup.fingerprint(content)
+        with db.engine.connect() as connection:
+            match = duplicates.check(connection, fingerprint, user.id)
+        if match is not None:
+            print(f"[DEDUP] Secret from {user.username} is a {match.kind} repeat of secret {match.secret_id}")
+            if current_app.config['DEDUP_ACTION'] != 'quarantine':
+                return jsonify({'message': 'This secret looks like a repeat of a recent one.'}), 409
+            with db.engine.begin() as connection:
+                dedup.quarantine(connection, {'title': title, 'content': content, 'is_anonymous': is_anonymous,
+                                              'user_id': user.id}, match)
+            return jsonify({'message': 'Your secret looks a lot like a recent one, so it is being held for review.'}), 202
+
     try:
-        secret = Secret(
-            title=title,
-            content=content,
-            is_anonymous=is_anonymous,
-            user_id=session['user_id']
-        )
-        
-        db.session.add(secret)
-        db.session.commit()
+        values = {
+            'title': title,
+            'content': content,
+            'is_anonymous': is_anonymous,
+            'user_id': session['user_id']
+        }
+        if current_app.config['WRITE_BATCH_WINDOW_MS'] > 0:
+            # Batches are per engine, so each shard commits its own group
+            engine, values = secret_shards.prepare(values)
+            secret_id = current_app.extensions['secret_writer'].submit(engine, values)
+        else:
+            engine, secret_id = secret_shards.insert(values)
+        secret = db.session.get(Secret, secret_id, bind_arguments={'bind': engine})
         
         print(f"[SUCCESS] Secret created successfully: {secret.id}")
+        scores = current_app.extensions['trending']
+        if scores is not None:
+            scores.record(db.engine, secret.id, trending.POST_WEIGHT)
+        if fingerprint is not None:
+            duplicates.remember(db.engine, secret.id, user.id, fingerprint)
         
         return jsonify({
             'message': 'Secret shared successfully!',
-            'secret': secret.to_dict()
+            'secret': dict(secret.to_dict(), hearts=0, hearted=False)
         }), 201
         
     except Exception as e:
@@ -724,19 +1094,70 @@ def create_secret():
         db.session.rollback()
         return jsonify({'message': 'Failed to save secret. Please try again.'}), 500
 
-@app.route('/logout')
+def _secret_tier(secret_id):
+    """'hot' if the secret is on a shard, 'archive' if it has been archived, None if it does not exist."""
+    # Ids are unique across shards, so probe each one
+    if any(db.session.execute(db.select(Secret.id).filter_by(id=secret_id), bind_arguments={'bind': engine}).first()
+           for engine in secret_shards.engines()):
+        return 'hot'
+    archive_engine = _archive_engine()
+    if archive_engine is not None and db.session.execute(
+        db.select(ArchivedSecret.id).filter_by(id=secret_id), bind_arguments={'bind': archive_engine}
+    ).first():
+        return 'archive'
+    return None
+
+@csrf.exempt
+@bp.route('/api/secrets/<int:secret_id>/heart', methods=['POST', 'DELETE'])
+@limiter.limit(60, per=60, by='user', message='You are reacting too quickly. Please wait a moment.')
+def heart_secret(secret_id):
+    """Heart (POST) or un-heart (DELETE) a secret; a user holds at most one heart per secret."""
+    if 'user_id' not in session:
+        return jsonify({'message': 'Please log in first'}), 401
+    tier = _secret_tier(secret_id)
+    if tier is None:
+        return jsonify({'message': 'Secret not found'}), 404
+
+    counter = current_app.extensions['reaction_counter']
+    hearted = request.method == 'POST'
+    try:
+        with db.engine.begin() as connection:
+            if hearted:
+                changed = reactions.react(connection, session['user_id'], secret_id)
+                given_at = None
+            else:
+                given_at = reactions.unreact(connection, session['user_id'], secret_id)
+                changed = given_at is not None
+    except Exception as e:
+        print(f"[ERROR] Reaction failed: {e}")
+        return jsonify({'message': 'Failed to save your reaction. Please try again.'}), 500
+    if changed:
+        counter.add(db.engine, secret_id, 1 if hearted else -1)
+        scores = current_app.extensions['trending']
+        # Archived secrets are past trending; the feed only shows hot ones
+        if tier == 'hot' and scores is not None:
+            # Taking a heart back removes exactly the weight it was given with
+            scores.record(
+                db.engine, secret_id, trending.HEART_WEIGHT if hearted else -trending.HEART_WEIGHT,
+                at=trending.epoch(given_at) if given_at else None
+            )
+    with db.engine.connect() as connection:
+        hearts = reactions.counts(connection, counter, [secret_id])[secret_id]
+    return jsonify({'hearted': hearted, 'hearts': hearts}), 201 if hearted and changed else 200
+
+@bp.route('/logout')
 def logout():
     session.pop('user_id', None)
-    return redirect(url_for('home'))
+    return redirect(url_for('main.home'))
 
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def handle_404(e):
     # Handle Chrome DevTools requests gracefully
     if '/.well-known/appspecific/com.chrome.devtools' in request.path:
         return jsonify({'message': 'Chrome DevTools endpoint not available'}), 404
     return jsonify({'message': 'Page not found'}), 404
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def handle_500(e):
     # Return JSON for API requests, HTML for regular requests
     if request.path.startswith('/api/') or request.is_json or 'application/json' in request.headers.get('Content-Type', ''):
@@ -744,13 +1165,33 @@ def handle_500(e):
     return render_template('error.html', error='Internal Server Error'), 500
 
 # Password Reset Routes
-@app.route('/forgot-password', methods=['GET'])
+@bp.route('/forgot-password', methods=['GET'])
+@page_cache.cached()
 def forgot_password_page():
     return render_template('forgot_password.html')
 
+def _create_password_reset(email):
+    """Store a fresh one-hour reset token for ``email`` and return it, or None if no account uses it."""
+    if not User.query.filter_by(email=email).first():
+        return None
+    
+    # Clean up old reset tokens for this email (older than 5 minutes)
+    PasswordReset.query.filter(
+        PasswordReset.email == email,
+        PasswordReset.created_at <= datetime.datetime.now(datetime.UTC) - datetime.timedelta(minutes=5)
+    ).delete()
+    
+    reset_token = generate_reset_token()
+    expires_at = datetime.datetime.now(datetime.UTC) + datetime.timedelta(hours=1)
+    db.session.add(PasswordReset(email=email, token=reset_token, expires_at=expires_at))
+    db.session.commit()
+    return reset_token
+
 @csrf.exempt
-@app.route('/forgot-password', methods=['POST'])
-def forgot_password():
+@bp.route('/forgot-password', methods=['POST'])
+@limiter.limit(10, per=3600, by='ip')
+@limiter.limit(1, per=300, by='email', message='A password reset email was already sent recently. Please check your email or wait 5 minutes before requesting another.')
+async def forgot_password():
     data = request.get_json()
     email = data.get('email')
     
@@ -763,63 +1204,34 @@ def forgot_password():
     if not re.match(email_pattern, email):
         return jsonify({'message': 'Please enter a valid email address'}), 400
     
-    # Rate limiting: Check for recent reset requests
-    recent_reset = PasswordReset.query.filter(
-        PasswordReset.email == email,
-        PasswordReset.created_at > datetime.datetime.now(datetime.UTC) - datetime.timedelta(minutes=5)
-    ).first()
-    
-    if recent_reset:
-        return jsonify({'message': 'A password reset email was already sent recently. Please check your email or wait 5 minutes before requesting another.'}), 429
-    
-    # Check if user exists
-    user = User.query.filter_by(email=email).first()
-    if not user:
+    reset_token = await aio.run_sync(_create_password_reset, email)
+    if reset_token is None:
         # Don't reveal if email exists or not for security
         return jsonify({'message': 'If an account with this email exists, you will receive a password reset link shortly.'}), 200
     
-    # Clean up old reset tokens for this email (older than 5 minutes)
-    PasswordReset.query.filter(
-        PasswordReset.email == email,
-        PasswordReset.created_at <= datetime.datetime.now(datetime.UTC) - datetime.timedelta(minutes=5)
-    ).delete()
-    
-    # Generate new reset token
-    reset_token = generate_reset_token()
-    expires_at = datetime.datetime.now(datetime.UTC) + datetime.timedelta(hours=1)
-    
-    # Save reset token to database
-    password_reset = PasswordReset(
-        email=email,
-        token=reset_token,
-        expires_at=expires_at
-    )
-    db.session.add(password_reset)
-    db.session.commit()
-    
     # Send reset email
-    if send_password_reset_email(email, reset_token):
+    if await send_password_reset_email(email, reset_token):
         return jsonify({'message': 'If an account with this email exists, you will receive a password reset link shortly.'}), 200
     else:
         return jsonify({'message': 'Failed to send reset email. Please try again later.'}), 500
 
-@app.route('/reset-password', methods=['GET'])
+@bp.route('/reset-password', methods=['GET'])
 def reset_password_page():
     token = request.args.get('token')
     if not token:
         flash('Invalid or missing reset token.')
-        return redirect(url_for('forgot_password_page'))
+        return redirect(url_for('main.forgot_password_page'))
     
     # Verify token
     reset_request = PasswordReset.query.filter_by(token=token).first()
     if not reset_request or not reset_request.is_valid():
         flash('Invalid or expired reset token.')
-        return redirect(url_for('forgot_password_page'))
+        return redirect(url_for('main.forgot_password_page'))
     
     return render_template('reset_password.html', token=token)
 
 @csrf.exempt
-@app.route('/reset-password', methods=['POST'])
+@bp.route('/reset-password', methods=['POST'])
 def reset_password():
     data = request.get_json()
     token = data.get('token')
@@ -855,11 +1267,12 @@ def reset_password():
     
     return jsonify({'message': 'Password reset successfully! You can now log in with your new password.'}), 200
 
-@app.route('/quiz')
+@bp.route('/quiz')
+@page_cache.cached()
 def quiz():
     return render_template('quiz.html')
 
-@app.route('/api/questions')
+@bp.route('/api/questions')
 def get_quiz_questions():
     """Return quiz questions for the cosmic flower personality test"""
     questions = [
@@ -887,7 +1300,7 @@ def get_quiz_questions():
     return jsonify(questions)
 
 @csrf.exempt
-@app.route('/api/gemini', methods=['POST'])
+@bp.route('/api/gemini', methods=['POST'])
 def cosmic_flower_match():
     """AI-powered flower personality matching based on quiz answers"""
     data = request.get_json()
@@ -934,10 +1347,217 @@ def cosmic_flower_match():
         'text': f"<h3>{result['flower']}</h3><p>{result['description']}</p><br><p><em>Your cosmic essence resonates with the frequency of {result['flower'].lower()}, a rare bloom in the infinite garden of the universe.</em></p>"
     })
 
+@bp.cli.command('search-backfill')
+def search_backfill_command():
+    """Build the full-text search index for existing secrets."""
+    count = 0
+    for engine in secret_shards.engines():
+        with engine.begin() as connection:
+            count += fulltext.backfill(connection)
+    print(f"[SEARCH] Indexed {count} secrets")
+
+@bp.cli.command('search-drop-triggers')
+def search_drop_triggers_command():
+    """Drop the search triggers before writing to secret from outside the app; search-backfill restores them."""
+    dropped = 0
+    for engine in secret_shards.engines():
+        with engine.begin() as connection:
+            dropped += fulltext.drop_triggers(connection)
+    print(f"[SEARCH] Dropped {dropped} triggers; run `flask search-backfill` when done")
+
+@bp.cli.command('build-assets')
+def build_assets_command():
+    """Minify, fingerprint and pre-compress static/css and static/js into static/dist."""
+    manifest = asset_pipeline.build(current_app.static_folder)
+    print(f"[ASSETS] Built {len(manifest)} assets into static/dist")
+
+def _archive_engine():
+    return db.engines['archive'] if current_app.config['ARCHIVE_AFTER_DAYS'] else None
+
+@bp.cli.command('archive-secrets')
+@click.option('--older-than-days', type=int, help='Defaults to ARCHIVE_AFTER_DAYS, and may not be less.')
+@click.option('--batch-size', type=int, default=1000, show_default=True)
+@click.option('--pause', type=float, default=0.05, show_default=True, help='Seconds to sleep between batches.')
+@click.option('--vacuum', is_flag=True, help='VACUUM the hot database afterwards to return freed pages.')
+def archive_secrets_command(older_than_days, batch_size, pause, vacuum):
+    """Move old secrets from the hot table into the archive database."""
+    # The feeds only read the archive for secrets older than ARCHIVE_AFTER_DAYS;
+    # anything archived earlier would vanish from them
+    archive_days = current_app.config['ARCHIVE_AFTER_DAYS']
+    if not archive_days:
+        raise click.ClickException('Archiving is off; set ARCHIVE_AFTER_DAYS so the feeds read the archive')
+    days = older_than_days or archive_days
+    if days < archive_days:
+        raise click.ClickException(f'--older-than-days must be at least ARCHIVE_AFTER_DAYS ({archive_days})')
+    cutoff = datetime.datetime.now(datetime.UTC) - datetime.timedelta(days=days)
+    moved = archive.archive_before(cutoff, batch_size=batch_size, pause=pause, engines=secret_shards.engines())
+    print(f"[ARCHIVE] Archived {moved} secrets created before {cutoff:%Y-%m-%d %H:%M:%S}")
+    if vacuum and moved:
+        for engine in secret_shards.engines():
+            with engine.connect() as connection:
+                connection.execution_options(isolation_level='AUTOCOMMIT').execute(text('VACUUM'))
+        print("[ARCHIVE] Vacuumed the hot database")
+
+@bp.cli.command('train-content-dict')
+@click.option('--samples', type=int, default=5000, show_default=True, help='Most recent secrets to learn from.')
+def train_content_dict_command(samples):
+    """Build a new shared compression dictionary from recent secrets."""
+    recent = db.select(Secret.id, Secret.content).order_by(Secret.id.desc()).limit(samples)
+    rows = []
+    for engine in secret_shards.engines():
+        with engine.connect() as connection:
+            rows.extend(connection.execute(recent).all())
+    texts = [row.content for row in heapq.nlargest(samples, rows, key=lambda row: row.id)]
+    if not texts:
+        raise click.ClickException('No secrets to train on')
+    dict_id = compressed_text.save_dictionary(compressed_text.train_dictionary(texts))
+    print(f"[COMPRESS] Trained dictionary {dict_id} from {len(texts)} secrets; run `flask recompress-secrets` to apply it")
+
+@bp.cli.command('recompress-secrets')
+@click.option('--batch-size', type=int, default=500, show_default=True)
+@click.option('--pause', type=float, default=0.05, show_default=True, help='Seconds to sleep between batches.')
+def recompress_secrets_command(batch_size, pause):
+    """Compress plain-text secrets and move compressed ones onto the newest dictionary."""
+    if db.engine.dialect.name != 'sqlite':
+        raise click.ClickException('Content is only compressed on SQLite')
+    select_batch = text('SELECT id, content FROM secret WHERE id > :after_id ORDER BY id LIMIT :batch_size')
+    before = after = rewritten = 0
+    for engine in secret_shards.engines():
+        after_id = 0
+        while True:
+            with engine.connect() as connection:
+                rows = connection.execute(select_batch, {'after_id': after_id, 'batch_size': batch_size}).all()
+            if not rows:
+                break
+            updates = []
+            for row in rows:
+                if compressed_text.needs_recompress(row.content):
+                    stored = compressed_text.encode(compressed_text.decode(row.content))
+                    if stored != row.content:
+                        updates.append({'id': row.id, 'content': stored})
+                        before += len(row.content.encode('utf-8') if isinstance(row.content, str) else row.content)
+                        after += len(stored.encode('utf-8') if isinstance(stored, str) else stored)
+            if updates:
+                with engine.begin() as connection:
+                    connection.execute(text('UPDATE secret SET content = :content WHERE id = :id'), updates)
+                rewritten += len(updates)
+            after_id = rows[-1].id
+            if pause:
+                time.sleep(pause)
+    print(f"[COMPRESS] Rewrote {rewritten} secrets: {before} -> {after} bytes")
+
+@bp.cli.command('export-secrets')
+@click.option('--user', 'username', help='Only export this user\'s secrets.')
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+@click.option('--output', type=click.File('wb'), default='-', help='Output file (default: stdout).')
+@click.option('--chunk-size', type=int, default=1000, show_default=True)
+def export_secrets_command(username, compress, output, chunk_size):
+    """Stream secrets as NDJSON for backups and analytics."""
+    user_id = None
+    if username:
+        user = User.query.filter_by(username=username).first()
+        if not user:
+            raise click.ClickException(f'User not found: {username}')
+        user_id = user.id
+    secret_engines = [secret_shards.engine_for(user_id)] if user_id else secret_shards.engines()
+    for chunk in export.iter_ndjson(db.engine, current_app.json.dumps, user_id=user_id, chunk_size=chunk_size,
+                                    compress=compress, archive_engine=_archive_engine(),
+                                    secret_engines=secret_engines):
+        output.write(chunk)
+
+@bp.cli.command('rebalance-shards')
+@click.option('--from-count', type=int, default=1, show_default=True,
+              help='SECRET_SHARDS before the change; those shard files are drained too.')
+@click.option('--batch-size', type=int, default=500, show_default=True)
+@click.option('--pause', type=float, default=0.05, show_default=True, help='Seconds to sleep between batches.')
+def rebalance_shards_command(from_count, batch_size, pause):
+    """Move secrets onto the shard their author maps to under the current SECRET_SHARDS."""
+    secret_shards.install()
+    moved = secret_shards.rebalance(current_app, from_count=from_count, batch_size=batch_size, pause=pause)
+    print(f"[SHARDS] Moved {moved} secrets; {secret_shards.count} shard(s) in use")
+
+@bp.cli.command('recount-reactions')
+def recount_reactions_command():
+    """Rebuild heart counters from the reaction table (stop workers first for exact counts)."""
+    with db.engine.begin() as connection:
+        secrets_with_hearts = reactions.recount(connection)
+    print(f"[REACTIONS] Recounted hearts for {secrets_with_hearts} secrets")
+
+@bp.cli.command('refresh-trending')
+@click.option('--rebuild', is_flag=True, help='Recompute every score from post and heart times first.')
+def refresh_trending_command(rebuild):
+    """Refresh the materialized trending list now."""
+    scores = current_app.extensions['trending']
+    if scores is None:
+        raise click.ClickException('Trending is disabled on this database')
+    if rebuild:
+        scored, listed = scores.rebuild(db.engine, secret_shards.engines())
+        print(f"[TRENDING] Rebuilt {scored} scores")
+    else:
+        listed = scores.refresh(db.engine)
+    print(f"[TRENDING] {listed} secrets in the trending list")
+
+@bp.cli.command('dedup-secrets')
+@click.option('--window-minutes', type=float, help='Defaults to DEDUP_WINDOW_MINUTES.')
+@click.option('--batch-size', type=int, default=500, show_default=True)
+@click.option('--dry-run', is_flag=True, help='Only list the repeats that would be quarantined.')
+def dedup_secrets_command(window_minutes, batch_size, dry_run):
+    """Run existing secrets through the duplicate filter, quarantining repeats and fingerprinting recent posts."""
+    scanned, quarantined, fingerprinted = dedup.backfill(
+        db.engine, secret_shards.engines(),
+        window_minutes=window_minutes or current_app.config['DEDUP_WINDOW_MINUTES'],
+        similarity=current_app.config['DEDUP_SIMILARITY'],
+        batch_size=batch_size, dry_run=dry_run,
+        cross_user_min_chars=current_app.config['DEDUP_CROSS_USER_MIN_CHARS']
+    )
+    action = 'would quarantine' if dry_run else 'quarantined'
+    print(f"[DEDUP] Scanned {scanned} secrets, {action} {quarantined}, fingerprinted {fingerprinted}")
+    if quarantined and not dry_run and current_app.extensions['trending'] is not None:
+        # Drop the quarantined secrets from the materialized trending list right away
+        current_app.extensions['trending'].refresh(db.engine)
+
+@bp.cli.command('quarantined-secrets')
+@click.option('--release', 'release_ids', type=int, multiple=True, help='Publish this held secret (repeatable).')
+@click.option('--discard', 'discard_ids', type=int, multiple=True, help='Delete this held secret (repeatable).')
+def quarantined_secrets_command(release_ids, discard_ids):
+    """List secrets held back as repeats, or release or discard them by quarantine id."""
+    if not release_ids and not discard_ids:
+        held = db.session.execute(db.select(QuarantinedSecret).order_by(QuarantinedSecret.id)).scalars().all()
+        for row in held:
+            print(f"{row.id}\tuser {row.user_id}\t{row.reason} repeat of {row.matched_secret_id} "
+                  f"({row.similarity:.2f})\t{row.created_at:%Y-%m-%d %H:%M}\t{row.title}")
+        print(f"[DEDUP] {len(held)} secrets held for review")
+        return
+    scores = current_app.extensions['trending']
+    for quarantine_id in release_ids:
+        row = db.session.get(QuarantinedSecret, quarantine_id)
+        if row is None:
+            raise click.ClickException(f'No quarantined secret {quarantine_id}')
+        # Published under a new id, but keeping the time it was first posted
+        posted_at = row.created_at
+        engine, secret_id = secret_shards.insert({'title': row.title, 'content': row.content,
+                                                  'is_anonymous': row.is_anonymous, 'user_id': row.user_id,
+                                                  'created_at': posted_at})
+        db.session.delete(row)
+        db.session.commit()
+        if scores is not None:
+            scores.record(db.engine, secret_id, trending.POST_WEIGHT, at=trending.epoch(posted_at))
+        print(f"[DEDUP] Released quarantined secret {quarantine_id} as secret {secret_id}")
+    for quarantine_id in discard_ids:
+        deleted = db.session.execute(db.delete(QuarantinedSecret).filter_by(id=quarantine_id)).rowcount
+        db.session.commit()
+        if not deleted:
+            raise click.ClickException(f'No quarantined secret {quarantine_id}')
+        print(f"[DEDUP] Discarded quarantined secret {quarantine_id}")
+    if scores is not None:
+        scores.flush()
+
 # Create demo data
 def create_demo_data():
     """Create engaging demo content for hackathon presentation"""
-    if Secret.query.count() == 0:  # Only create if no secrets exist
+    # Only create if no secrets exist
+    if not any(db.session.execute(db.select(Secret.id).limit(1), bind_arguments={'bind': engine}).first()
+               for engine in secret_shards.engines()):
         # Create multiple demo users
         demo_users = [
             {
@@ -1028,37 +1648,54 @@ def create_demo_data():
         # Add demo secrets
         for secret_data in demo_secrets:
             user = created_users[secret_data['user_idx']]
-            secret = Secret(
-                title=secret_data['title'],
-                content=secret_data['content'],
-                is_anonymous=secret_data['is_anonymous'],
-                user_id=user.id
-            )
-            db.session.add(secret)
+            secret_shards.insert({
+                'title': secret_data['title'],
+                'content': secret_data['content'],
+                'is_anonymous': secret_data['is_anonymous'],
+                'user_id': user.id
+            })
         
-        db.session.commit()
         print('[SUCCESS] Demo data created successfully!')
         print('[DATA] Demo users created:')
         for user in created_users:
             print(f'   - {user.username} (email: {user.email}, password: demo123)')
         print('[READY] Ready for hackathon presentation!')
 
-# Create the database
+def init_database():
+    """Create tables, apply in-place migrations and build indexes. Safe to re-run."""
+    db.create_all()
+    # Ensure existing SQLite DBs have required columns
+    try:
+        cols = db.session.execute(text("PRAGMA table_info(user)")).fetchall()
+        col_names = {row[1] for row in cols}
+        if 'created_at' not in col_names:
+            db.session.execute(text("ALTER TABLE user ADD COLUMN created_at DATETIME"))
+            db.session.commit()
+            print("[MIGRATION] Added 'created_at' column to user table")
+        cols = db.session.execute(text("PRAGMA table_info(secret_fingerprint)")).fetchall()
+        if 'user_id' not in {row[1] for row in cols}:
+            db.session.execute(text("ALTER TABLE secret_fingerprint ADD COLUMN user_id INTEGER"))
+            db.session.commit()
+            print("[MIGRATION] Added 'user_id' column to secret_fingerprint table")
+    except Exception as e:
+        print(f"[MIGRATION] Skipped schema check or migration failed: {e}")
+    # create_all() only builds indexes for new tables; shards get the secret table,
+    # its indexes and the search index here
+    created = secret_shards.install()
+    if created:
+        print(f"[MIGRATION] Created search index on {created} database(s)")
+    with db.engine.begin() as connection:
+        trending.install(connection)
+    create_demo_data()
+
+@bp.cli.command('init-db')
+def init_db_command():
+    """Create and migrate the schema. Run once per deploy, before starting workers."""
+    init_database()
+
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
-        db.create_all()
-        # Ensure existing SQLite DBs have required columns
-        try:
-            cols = db.session.execute(text("PRAGMA table_info(user)")).fetchall()
-            col_names = {row[1] for row in cols}
-            if 'created_at' not in col_names:
-                db.session.execute(text("ALTER TABLE user ADD COLUMN created_at DATETIME"))
-                db.session.commit()
-                print("[MIGRATION] Added 'created_at' column to user table")
-        except Exception as e:
-            print(f"[MIGRATION] Skipped schema check or migration failed: {e}")
-        create_demo_data()
+        init_database()
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=os.environ.get('FLASK_ENV') == 'development')
-
-
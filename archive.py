@@ -0,0 +1,82 @@
+"""Hot/cold tiering: move old secrets out of the hot ``secret`` table.
+
+``flask archive-secrets`` copies secrets older than a cutoff, in batches, into
+``secret_archive`` in the separate "archive" database (ARCHIVE_DATABASE_URL)
+with zlib-compressed content, then deletes them from ``secret``. The global
+feed, timeline pagination and exports fall through to the archive once the
+hot rows run out, so clients see one continuous history. Search and trending
+cover hot secrets only. The cutoff is never more recent than
+ARCHIVE_AFTER_DAYS, which is where the read paths start looking.
+
+Each batch is written to the archive before it is deleted from the hot table,
+and re-archiving an id replaces it, so an interrupted run is simply re-run.
+"""
+import time
+import zlib
+
+from sqlalchemy import text
+
+import compressed_text
+from extensions import db
+from models import ArchivedSecret, Secret
+
+# Walk the primary key rather than created_at, which has no index of its own.
+# The newest secret always stays hot so SQLite never hands its id out again
+# (shards take ids from the primary's allocator, so there it is merely kept).
+SELECT_BATCH = text(
+    'SELECT id, title, content, is_anonymous, created_at, user_id FROM secret '
+    'WHERE id > :after_id AND created_at < :cutoff AND id < (SELECT MAX(id) FROM secret) '
+    'ORDER BY id LIMIT :batch_size'
+)
+
+# created_at is passed through as the text the hot table stored, so keyset
+# comparisons behave the same on both tiers
+INSERT_ARCHIVED = text(
+    'INSERT INTO secret_archive (id, title, content, is_anonymous, created_at, user_id) '
+    'VALUES (:id, :title, :content, :is_anonymous, :created_at, :user_id)'
+)
+
+
+def archive_before(cutoff, batch_size=1000, pause=0.0, engines=None):
+    """Move secrets created before ``cutoff`` (a datetime) to the archive; return how many moved.
+
+    ``engines`` are the databases holding ``secret`` (every shard); the
+    default is the primary.
+    """
+    moved = 0
+    for hot in engines or [db.engine]:
+        moved += _archive_from(hot, cutoff, batch_size, pause)
+    return moved
+
+
+def _archive_from(hot, cutoff, batch_size, pause):
+    cold = db.engines['archive']
+    cutoff_text = cutoff.strftime('%Y-%m-%d %H:%M:%S')
+    after_id = 0
+    moved = 0
+    while True:
+        with hot.connect() as connection:
+            rows = connection.execute(SELECT_BATCH, {
+                'after_id': after_id, 'cutoff': cutoff_text, 'batch_size': batch_size
+            }).all()
+        if not rows:
+            return moved
+        ids = [row.id for row in rows]
+        with cold.begin() as connection:
+            connection.execute(ArchivedSecret.__table__.delete().where(ArchivedSecret.id.in_(ids)))
+            connection.execute(INSERT_ARCHIVED, [{
+                'id': row.id,
+                'title': row.title,
+                'content': zlib.compress(compressed_text.decode(row.content).encode('utf-8'), 9),
+                'is_anonymous': row.is_anonymous,
+                'created_at': row.created_at,
+                'user_id': row.user_id
+            } for row in rows])
+        with hot.begin() as connection:
+            connection.execute(Secret.__table__.delete().where(Secret.id.in_(ids)))
+        moved += len(rows)
+        after_id = ids[-1]
+        print(f"[ARCHIVE] Moved {moved} secrets so far (up to id {after_id})")
+        if pause:
+            # Give request traffic a turn at the SQLite write lock
+            time.sleep(pause)
@@ -0,0 +1,214 @@
+"""ASGI entry point for the async serving mode.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+Views declared ``async def`` (signup, login, sending codes and reset mails,
+the OAuth callbacks) are dispatched on uvicorn's event loop: the body is
+read, a Flask request context is pushed and the view coroutine awaited, so a
+single process keeps hundreds of them waiting on SMTP or HTTP at once. Every
+other route runs the regular WSGI app on a thread pool of ASGI_THREADS
+threads, streaming its body back chunk by chunk, as a threaded gunicorn
+worker would. Responses from both paths go through the same compression.
+"""
+import asyncio
+import inspect
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import request_started
+from werkzeug.exceptions import HTTPException
+
+import aio
+from app import create_app
+from compression import CompressionMiddleware
+
+
+def _environ(scope, body):
+    """Translate an ASGI HTTP scope and its body into a WSGI environ."""
+    script_name = scope.get('root_path', '').encode('utf-8').decode('latin-1')
+    path_info = scope['path'].encode('utf-8').decode('latin-1')
+    if script_name and path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': script_name,
+        'PATH_INFO': path_info,
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        value = value.decode('latin-1')
+        if name in environ:
+            # Cookie pairs are separated by "; ", every other list header by ","
+            value = f"{environ[name]}{'; ' if name == 'HTTP_COOKIE' else ','}{value}"
+        environ[name] = value
+    return environ
+
+
+def _start_message(status, headers):
+    return {
+        'type': 'http.response.start',
+        'status': int(status.split(' ', 1)[0]),
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    }
+
+
+class AsyncDispatcher:
+    def __init__(self, flask_app, threads=16):
+        self.flask_app = flask_app
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='asgi-wsgi')
+        self._native = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+        body = tempfile.SpooledTemporaryFile(max_size=64 * 1024)
+        try:
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                body.write(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+            body.seek(0)
+            environ = _environ(scope, body)
+            if self._is_native(environ):
+                await self._dispatch_native(environ, send)
+            else:
+                await self._dispatch_wsgi(environ, send)
+        finally:
+            body.close()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                aio.keep_clients()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await aio.close()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _is_native(self, environ):
+        """True if the request routes to an ``async def`` view."""
+        if environ['REQUEST_METHOD'] == 'OPTIONS':
+            return False
+        adapter = self.flask_app.url_map.bind_to_environ(environ)
+        try:
+            endpoint, _ = adapter.match()
+        except HTTPException:
+            # 404s, 405s and slash redirects are answered by the WSGI path
+            return False
+        native = self._native.get(endpoint)
+        if native is None:
+            native = self._native[endpoint] = inspect.iscoroutinefunction(self.flask_app.view_functions[endpoint])
+        return native
+
+    async def _dispatch_native(self, environ, send):
+        # Mirrors Flask.wsgi_app and full_dispatch_request, awaiting the view
+        app = self.flask_app
+        ctx = app.request_context(environ)
+        error = None
+        try:
+            try:
+                ctx.push()
+                try:
+                    request_started.send(app, _async_wrapper=app.ensure_sync)
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        if ctx.request.routing_exception is not None:
+                            app.raise_routing_exception(ctx.request)
+                        rv = await app.view_functions[ctx.request.url_rule.endpoint](**ctx.request.view_args)
+                except Exception as e:
+                    rv = app.handle_user_exception(e)
+                response = app.finalize_request(rv)
+            except Exception as e:
+                error = e
+                response = app.handle_exception(e)
+            # Bodies of these views are small, so they are built before the context goes away
+            status, headers, chunks = self._collect(self._middleware(response), environ)
+        finally:
+            if error is not None and app.should_ignore_error(error):
+                error = None
+            ctx.pop(error)
+        await send(_start_message(status, headers))
+        await send({'type': 'http.response.body', 'body': b''.join(chunks)})
+
+    def _middleware(self, response):
+        wsgi_app = self.flask_app.wsgi_app
+        if isinstance(wsgi_app, CompressionMiddleware):
+            return CompressionMiddleware(response, min_size=wsgi_app.min_size,
+                                         buffer_size=wsgi_app.buffer_size, encoders=wsgi_app.encoders)
+        return response
+
+    @staticmethod
+    def _collect(wsgi_app, environ):
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [status, headers]
+
+        app_iter = wsgi_app(environ, start_response)
+        try:
+            chunks = list(app_iter)
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+        return started[0], started[1], chunks
+
+    async def _dispatch_wsgi(self, environ, send):
+        loop = asyncio.get_running_loop()
+
+        def send_sync(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def run():
+            started = []
+
+            def start_response(status, headers, exc_info=None):
+                started[:] = [status, headers]
+
+            app_iter = self.flask_app(environ, start_response)
+            sent_start = False
+            try:
+                for chunk in app_iter:
+                    if not chunk:
+                        continue
+                    if not sent_start:
+                        send_sync(_start_message(*started))
+                        sent_start = True
+                    # Blocks until the chunk is handed to the socket, so slow clients apply backpressure
+                    send_sync({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            finally:
+                if hasattr(app_iter, 'close'):
+                    app_iter.close()
+            if not sent_start:
+                send_sync(_start_message(*started))
+            send_sync({'type': 'http.response.body', 'body': b''})
+
+        await loop.run_in_executor(self.executor, run)
+
+
+app = AsyncDispatcher(create_app(), threads=int(os.environ.get('ASGI_THREADS', '16')))
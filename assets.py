@@ -0,0 +1,138 @@
+"""Fingerprinted, pre-compressed static assets.
+
+``flask build-assets`` minifies everything under static/css and static/js into
+static/dist with content-hashed filenames, writes gzip (and, when the optional
+``brotli`` package is installed, brotli) variants next to each file and
+records the mapping in static/dist/manifest.json.
+
+Templates call ``asset_url('css/home.css')``. With a manifest present that
+resolves to the hashed file, served with a one-year immutable cache lifetime
+and the best pre-compressed variant the client accepts, straight from disk via
+``send_from_directory`` (the server's ``wsgi.file_wrapper``/sendfile path).
+Without a build it falls back to the plain /static URL.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from flask import current_app, request, send_from_directory, url_for
+from werkzeug.exceptions import NotFound
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+SOURCE_DIRS = ('css', 'js')
+ONE_YEAR = 365 * 24 * 60 * 60
+
+
+def minify_css(source):
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    return source.replace(';}', '}').strip() + '\n'
+
+
+def minify_js(source):
+    # Deliberately conservative: drop indentation, blank lines and whole-line
+    # comments only, so statements relying on newlines keep their meaning
+    lines = []
+    for line in source.splitlines():
+        stripped = line.strip()
+        if stripped and not stripped.startswith('//'):
+            lines.append(stripped)
+    return '\n'.join(lines) + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def _compressors():
+    compressors = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    try:
+        import brotli
+    except ImportError:
+        print("[ASSETS] brotli not installed; writing gzip variants only")
+    else:
+        compressors.append(('.br', lambda data: brotli.compress(data, quality=11)))
+    return compressors
+
+
+def build(static_folder):
+    """Rebuild static/dist from the sources and return the new manifest."""
+    dist = os.path.join(static_folder, DIST_DIR)
+    shutil.rmtree(dist, ignore_errors=True)
+    compressors = _compressors()
+    manifest = {}
+
+    for source_dir in SOURCE_DIRS:
+        root = os.path.join(static_folder, source_dir)
+        for dirpath, _, filenames in os.walk(root):
+            for filename in sorted(filenames):
+                stem, ext = os.path.splitext(filename)
+                if ext not in MINIFIERS:
+                    continue
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, static_folder).replace(os.sep, '/')
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = MINIFIERS[ext](f.read()).encode('utf-8')
+
+                digest = hashlib.sha256(data).hexdigest()[:12]
+                hashed = f"{os.path.dirname(name)}/{stem}.{digest}{ext}"
+                target = os.path.join(dist, hashed)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, 'wb') as f:
+                    f.write(data)
+                for suffix, compress in compressors:
+                    packed = compress(data)
+                    if len(packed) < len(data):
+                        with open(target + suffix, 'wb') as f:
+                            f.write(packed)
+                manifest[name] = hashed
+
+    with open(os.path.join(dist, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class Assets:
+    def __init__(self, app=None):
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        try:
+            with open(os.path.join(app.static_folder, DIST_DIR, MANIFEST), 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+        app.add_url_rule(f'{app.static_url_path}/{DIST_DIR}/<path:filename>',
+                         endpoint='dist_asset', view_func=self.send_asset)
+        app.jinja_env.globals['asset_url'] = self.asset_url
+        app.extensions['assets'] = self
+
+    def asset_url(self, name):
+        hashed = self.manifest.get(name)
+        if hashed:
+            return url_for('dist_asset', filename=hashed)
+        return url_for('static', filename=name)
+
+    def send_asset(self, filename):
+        directory = os.path.join(current_app.static_folder, DIST_DIR)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz'), (None, '')):
+            if encoding and not request.accept_encodings[encoding]:
+                continue
+            try:
+                response = send_from_directory(directory, filename + suffix, mimetype=mimetype, max_age=ONE_YEAR)
+            except NotFound:
+                continue
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+            response.cache_control.immutable = True
+            response.vary.add('Accept-Encoding')
+            return response
+        raise NotFound()
@@ -0,0 +1,194 @@
+"""Concurrent slow-I/O requests: sync gunicorn workers versus ``uvicorn asgi:app``.
+
+    python -m bench.async_io [--requests 200] [--concurrency 100] [--delay 0.2] [--workers 2]
+
+Starts a stub SMTP server and a stub reCAPTCHA endpoint that each take
+``--delay`` seconds to answer, then fires ``--requests`` requests with
+``--concurrency`` in flight at each serving mode:
+
+* ``reset``: POST /forgot-password, one database write plus one mail.
+* ``signup``: POST /signup with a reCAPTCHA check (``--scenario signup``);
+  password hashing adds CPU time, so this one measures the mix.
+
+Reports throughput and latency percentiles. Needs gunicorn, uvicorn and httpx.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+async def _smtp_session(reader, writer, delay):
+    """Just enough SMTP (no TLS) for smtplib and aiosmtplib to deliver a message."""
+    writer.write(b'220 stub ESMTP\r\n')
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        command = line.split(b' ', 1)[0].strip().upper()
+        if command in (b'EHLO', b'HELO'):
+            writer.write(b'250-stub\r\n250 AUTH PLAIN LOGIN\r\n')
+        elif command == b'AUTH':
+            writer.write(b'235 2.7.0 Authentication successful\r\n')
+        elif command == b'DATA':
+            writer.write(b'354 End data with <CR><LF>.<CR><LF>\r\n')
+            await writer.drain()
+            while (await reader.readline()) not in (b'.\r\n', b''):
+                pass
+            # The slow part of a real relay: queueing and acknowledging the message
+            await asyncio.sleep(delay)
+            writer.write(b'250 2.0.0 Queued\r\n')
+        elif command == b'QUIT':
+            writer.write(b'221 Bye\r\n')
+            await writer.drain()
+            break
+        else:
+            writer.write(b'250 OK\r\n')
+        await writer.drain()
+    writer.close()
+
+
+def start_smtp_stub(port, delay):
+    loop = asyncio.new_event_loop()
+
+    async def serve():
+        server = await asyncio.start_server(lambda r, w: _smtp_session(r, w, delay), '127.0.0.1', port, backlog=1024)
+        async with server:
+            await server.serve_forever()
+
+    threading.Thread(target=loop.run_until_complete, args=(serve(),), daemon=True).start()
+
+
+def start_recaptcha_stub(port, delay):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(delay)
+            body = b'{"success": true, "score": 0.9}'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+def wait_for(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+async def fire(port, scenario, total, concurrency):
+    import httpx
+    limit = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def one(client, i):
+        nonlocal failures
+        if scenario == 'signup':
+            path, payload = '/signup', {'username': f'bench{i}-{time.time_ns()}', 'email': f'b{i}-{time.time_ns()}@example.com',
+                                        'password': 'correct horse', 'recaptcha_token': 'stub'}
+        else:
+            path, payload = '/forgot-password', {'email': 'bench@example.com'}
+        async with limit:
+            start = time.perf_counter()
+            resp = await client.post(f'http://127.0.0.1:{port}{path}', json=payload)
+            latencies.append(time.perf_counter() - start)
+            if resp.status_code >= 300:
+                failures += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(client, i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return elapsed, latencies, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--delay', type=float, default=0.2)
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn sync workers')
+    parser.add_argument('--scenario', choices=['reset', 'signup'], default='reset')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    smtp_port, recaptcha_port = free_port(), free_port()
+    start_smtp_stub(smtp_port, args.delay)
+    start_recaptcha_stub(recaptcha_port, args.delay)
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+        ARCHIVE_DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'archive.db')}",
+        SECRET_KEY='bench', RATELIMIT_ENABLED='false', DEMO_MODE='true',
+        EMAIL_DEV_MODE='false', FLASK_ENV='production', SMTP_SERVER='127.0.0.1', SMTP_PORT=str(smtp_port),
+        SMTP_STARTTLS='false', SENDER_EMAIL='bench@segreta.test', SENDER_PASSWORD='stub',
+        RECAPTCHA_SECRET='stub', RECAPTCHA_VERIFY_URL=f'http://127.0.0.1:{recaptcha_port}/siteverify',
+    )
+    subprocess.run([sys.executable, '-c', (
+        'import app; from extensions import db; from models import User\n'
+        'a = app.create_app()\n'
+        'with a.app_context():\n'
+        '    db.create_all()\n'
+        "    db.session.add(User(username='bench', email='bench@example.com', password='x'))\n"
+        '    db.session.commit()\n'
+    )], cwd=ROOT, env=env, check=True)
+
+    print(f'{args.scenario}: {args.requests} requests, {args.concurrency} concurrent, '
+          f'{args.delay * 1000:.0f} ms per SMTP/HTTP call\n')
+    modes = [
+        (f'gunicorn sync x{args.workers}', ['gunicorn', '-c', 'gunicorn.conf.py', '--log-level', 'warning']),
+        ('uvicorn asgi x1', ['uvicorn', 'asgi:app', '--log-level', 'warning', '--no-access-log']),
+    ]
+    for label, command in modes:
+        port = free_port()
+        server_env = dict(env, PORT=str(port), WEB_CONCURRENCY=str(args.workers))
+        if command[0] == 'uvicorn':
+            command = command + ['--port', str(port)]
+        server = subprocess.Popen([sys.executable, '-m'] + command, cwd=ROOT, env=server_env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for(port)
+            elapsed, latencies, failures = asyncio.run(fire(port, args.scenario, args.requests, args.concurrency))
+        finally:
+            server.terminate()
+            server.wait()
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f'  {label:<18} {args.requests / elapsed:7.1f} req/s  p50 {p50 * 1000:7.0f} ms  '
+              f'p99 {p99 * 1000:7.0f} ms  failed {failures}')
+
+
+if __name__ == '__main__':
+    main()
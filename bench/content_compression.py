@@ -0,0 +1,109 @@
+"""Storage saved by CompressedText and its decode cost on the feed path.
+
+    python -m bench.content_compression [--secrets 5000] [--page 50]
+
+Generates confession-style prose, trains a dictionary on half of it and
+measures the other half: stored bytes per codec/dictionary, and the time to
+load and serialize one feed page of ``--page`` secrets with content stored
+plain versus compressed.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import zlib
+
+OPENINGS = [
+    'I never told anyone that', 'Sometimes I wonder if', 'Every night I look at the stars and think',
+    'The truth is', 'I still remember the day', 'I wish I could tell you that', 'No one knows that',
+    'When I was younger I believed', 'I have been thinking about how', 'For the first time in years',
+]
+MIDDLES = [
+    'I fell in love with my best friend', 'the universe feels a little less lonely', 'my heart still races',
+    'I kept every letter you wrote', 'we danced under the moonlight', 'I am grateful for the small things',
+    'I was afraid of being forgotten', 'kindness is the only language that matters', 'I miss the way you laughed',
+    'I whispered your name to the night sky', 'I pretend to be brave', 'the silence between us said everything',
+]
+ENDINGS = [
+    'and I hope one day you will know.', 'and I think that is okay.', 'across the whole universe.',
+    'even if no one ever reads this.', 'and the stars were the only witnesses.', 'and I would do it all again.',
+]
+
+
+def confession(rng):
+    sentences = [f'{rng.choice(OPENINGS)} {rng.choice(MIDDLES)} {rng.choice(ENDINGS)}'
+                 for _ in range(rng.randint(1, 8))]
+    return ' '.join(sentences)
+
+
+def stored_size(value):
+    return len(value.encode('utf-8') if isinstance(value, str) else value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--secrets', type=int, default=5000)
+    parser.add_argument('--page', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ['CONTENT_DICT_DIR'] = os.path.join(tmp, 'dicts')
+    import app
+    import compressed_text
+    from extensions import db
+    from models import Secret, User
+
+    rng = random.Random(11)
+    corpus = [confession(rng) for _ in range(args.secrets)]
+    training, evaluation = corpus[::2], corpus[1::2]
+    raw = sum(len(text.encode('utf-8')) for text in evaluation)
+    print(f'{len(evaluation)} secrets, {raw} bytes of UTF-8 content\n')
+
+    deflate = sum(min(len(text.encode('utf-8')), len(zlib.compress(text.encode('utf-8'), 9)))
+                  for text in evaluation)
+    print(f"  {'zlib, no dictionary':<28} {deflate:9d} bytes  {deflate / raw:6.1%}")
+    application = app.create_app({'RATELIMIT_ENABLED': False})
+    trained_id = compressed_text.save_dictionary(compressed_text.train_dictionary(training))
+    codecs = ['zlib'] + (['zstd'] if compressed_text.zstandard is not None else [])
+    for codec in codecs:
+        for label, dict_id in (('built-in', 1), ('trained', trained_id)):
+            compressed_text.configure(os.environ['CONTENT_DICT_DIR'], codec=codec)
+            stored = sum(stored_size(compressed_text.encode(text, dict_id)) for text in evaluation)
+            print(f"  {codec + ', ' + label + ' dictionary':<28} {stored:9d} bytes  {stored / raw:6.1%}")
+
+    print(f'\nfeed page of {args.page} secrets (query + to_dict + JSON):')
+    with application.app_context():
+        db.create_all()
+        user = User(username='bench', email='bench@example.com', password='x')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        variants = [('plain', 'zlib', 1 << 30)] + [(codec, codec, 160) for codec in codecs]
+        for label, codec, min_size in variants:
+            compressed_text.configure(os.environ['CONTENT_DICT_DIR'], min_size=min_size, codec=codec)
+            Secret.query.delete()
+            db.session.add_all(Secret(title='t', content=text, user_id=user_id) for text in evaluation[:args.page])
+            db.session.commit()
+            db.session.expunge_all()
+
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                page = [secret.to_dict() for secret in Secret.query.limit(args.page)]
+                application.json.dumps(page)
+                db.session.expunge_all()
+            elapsed = (time.perf_counter() - start) / args.repeat
+            with db.engine.connect() as connection:
+                blobs = [row[0] for row in connection.exec_driver_sql('SELECT content FROM secret')]
+            decode_start = time.perf_counter()
+            for _ in range(args.repeat):
+                for blob in blobs:
+                    compressed_text.decode(blob)
+            decode = (time.perf_counter() - decode_start) / args.repeat
+            print(f'  {label:<6} {elapsed * 1e6:9.1f} us per page, of which decoding {decode * 1e6:7.1f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Latency of the pre-insert duplicate check.
+
+    python -m bench.dedup [--recent 20000] [--checks 2000]
+
+Fills a DuplicateFilter with ``--recent`` distinct secret-shaped texts, then
+times ``--checks`` lookups each of fresh texts, exact repeats and
+near-repeats (a few words changed): fingerprinting plus the in-memory match,
+and the full ``check`` including the sync query against a file-backed
+SQLite database with the recent fingerprints in it.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+
+import dedup
+from models import SecretFingerprint
+
+WORDS = ('night star moon sister brother friend secret dream heart ocean city letter kitchen rain summer '
+         'winter always never finally told broke favourite remember quietly laughed cried promised forgot '
+         'window train school mother father garden music afraid happy lonely grateful').split()
+
+
+def text(rng, words=30):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)) + f' {rng.getrandbits(32)}'
+
+
+def tweak(rng, content):
+    words = content.split()
+    for _ in range(2):
+        words[rng.randrange(len(words))] = rng.choice(WORDS)
+    return ' '.join(words)
+
+
+def timed(label, func, items):
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1e6
+    p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+    print(f'{label:<28} p50 {p50:7.1f} us  p99 {p99:7.1f} us')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recent', type=int, default=20000)
+    parser.add_argument('--checks', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    recent = [text(rng) for _ in range(args.recent)]
+    now = time.time()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        SecretFingerprint.__table__.create(engine)
+        index = dedup.DuplicateFilter(window_minutes=60)
+        rows = []
+        for secret_id, content in enumerate(recent, 1):
+            fp = dedup.fingerprint(content)
+            rows.append({'secret_id': secret_id, 'user_id': secret_id % 1000, 'digest': fp.digest,
+                         'signature': dedup._pack(fp.slots), 'created_at': now})
+        with engine.begin() as connection:
+            connection.execute(SecretFingerprint.__table__.insert(), rows)
+        with engine.connect() as connection:
+            start = time.perf_counter()
+            index.sync(connection, now)
+            print(f'loaded {args.recent} fingerprints in {time.perf_counter() - start:.2f}s\n')
+
+        fresh = [text(rng) for _ in range(args.checks)]
+        exact = [rng.choice(recent).upper() for _ in range(args.checks)]
+        near = [tweak(rng, rng.choice(recent)) for _ in range(args.checks)]
+        # Checked as a user with no posts of their own, so every match is across authors
+        for label, items in (('fresh', fresh), ('exact repeat', exact), ('near repeat', near)):
+            caught = sum(index.match(dedup.fingerprint(item), -1) is not None for item in items)
+            timed(f'{label} (memory)', lambda item: index.match(dedup.fingerprint(item), -1), items)
+            with engine.connect() as connection:
+                timed(f'{label} (with sync)',
+                      lambda item: index.check(connection, dedup.fingerprint(item), -1, now), items)
+            print(f'{"":<28} flagged {caught}/{len(items)}')
+
+
+if __name__ == '__main__':
+    main()
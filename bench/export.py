@@ -0,0 +1,86 @@
+"""Throughput and peak memory of the streaming NDJSON export.
+
+    python -m bench.export [--rows 10000000] [--chunk-size 1000] [--compare]
+
+Seeds a temporary SQLite database with ``--rows`` secrets (10M by default;
+seeding alone takes a few minutes), then streams the whole table through
+export.iter_ndjson into a byte counter. Peak Python heap comes from
+tracemalloc, sampled separately from the timed run. ``--compare`` also
+measures the ``Secret.query.all()`` + ``to_dict()`` approach on the same data,
+which needs memory proportional to the table.
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+SEED_BATCH = 50000
+
+
+def seed(path, rows):
+    connection = sqlite3.connect(path)
+    connection.execute('PRAGMA journal_mode=OFF')
+    connection.execute('PRAGMA synchronous=OFF')
+    connection.execute("INSERT INTO user (id, username, email, password) VALUES (1, 'bench', 'bench@example.com', 'x')")
+    content = 'a quiet secret whispered to the stars ' * 6
+    for start in range(0, rows, SEED_BATCH):
+        count = min(SEED_BATCH, rows - start)
+        connection.executemany(
+            'INSERT INTO secret (title, content, is_anonymous, created_at, user_id) VALUES (?, ?, ?, ?, 1)',
+            ((f'Secret {start + i}', content, (start + i) % 3 == 0, '2024-01-01 00:00:00') for i in range(count))
+        )
+    connection.commit()
+    connection.close()
+
+
+def measure(func):
+    start = time.perf_counter()
+    written = func()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return written, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--compare', action='store_true')
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    import app
+    import export
+    from extensions import db
+    from models import Secret
+
+    application = app.create_app({'RATELIMIT_ENABLED': False})
+    with application.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        seed(path, args.rows)
+        print(f'seeded {args.rows} rows in {time.perf_counter() - start:.1f} s')
+        dumps = application.json.dumps
+
+        def streaming():
+            return sum(len(chunk) for chunk in export.iter_ndjson(db.engine, dumps, chunk_size=args.chunk_size))
+
+        def load_all():
+            return len('\n'.join(dumps(secret.to_dict()) for secret in Secret.query.all()).encode('utf-8'))
+
+        runs = [('streaming export', streaming)] + ([('query.all()', load_all)] if args.compare else [])
+        for label, func in runs:
+            written, elapsed, peak = measure(func)
+            db.session.remove()
+            print(f'{label:<17} {written / 1e6:9.1f} MB  {args.rows / elapsed:10.0f} rows/s  '
+                  f'peak heap {peak / 1e6:8.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
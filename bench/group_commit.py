@@ -0,0 +1,86 @@
+"""Burst benchmark: per-request commits vs. GroupCommitter on SQLite.
+
+    python -m bench.group_commit [--threads 32] [--per-thread 50]
+
+Each thread inserts secret-shaped rows as fast as it can into a fresh
+file-backed SQLite database, once committing every row on its own and once
+through the group committer.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import Boolean, Column, DateTime, Integer, MetaData, String, Table, Text, create_engine, func
+
+from group_commit import GroupCommitter
+
+metadata = MetaData()
+secret = Table(
+    'secret', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('title', String(200), nullable=False),
+    Column('content', Text, nullable=False),
+    Column('is_anonymous', Boolean, default=False),
+    Column('created_at', DateTime, default=func.current_timestamp()),
+    Column('user_id', Integer, nullable=False),
+)
+
+CONTENT = 'At 3 AM, when the world sleeps, I find myself talking to the moon about hopes and fears. ' * 3
+
+
+def make_engine(path):
+    engine = create_engine(f'sqlite:///{path}', connect_args={'timeout': 30})
+    metadata.create_all(engine)
+    return engine
+
+
+def row(thread, i):
+    return {'title': f'burst {thread}-{i}', 'content': CONTENT, 'is_anonymous': bool(i % 2), 'user_id': thread + 1}
+
+
+def per_request(engine, thread, count):
+    for i in range(count):
+        with engine.begin() as connection:
+            connection.execute(secret.insert().values(**row(thread, i)))
+
+
+def grouped(engine, committer, thread, count):
+    for i in range(count):
+        committer.submit(engine, row(thread, i))
+
+
+def run(label, target, threads, per_thread):
+    workers = [threading.Thread(target=target, args=(t, per_thread)) for t in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    total = threads * per_thread
+    print(f'{label:<22} {total:>6} rows  {elapsed:7.3f}s  {total / elapsed:9.0f} rows/s')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--per-thread', type=int, default=50)
+    parser.add_argument('--window-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(os.path.join(tmp, 'per_request.db'))
+        baseline = run('per-request commit', lambda t, n: per_request(engine, t, n), args.threads, args.per_thread)
+
+        engine = make_engine(os.path.join(tmp, 'grouped.db'))
+        committer = GroupCommitter(secret, window=args.window_ms / 1000.0)
+        batched = run('group commit', lambda t, n: grouped(engine, committer, t, n), args.threads, args.per_thread)
+
+    print(f'speedup: {baseline / batched:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
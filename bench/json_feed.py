@@ -0,0 +1,87 @@
+"""Serialization CPU and bytes on the wire for one page of the secrets feed.
+
+    python -m bench.json_feed [--page 50] [--repeat 200]
+
+Seeds a temporary SQLite database with text-heavy secrets, then times each
+available JSON provider on a page of ``Secret.to_dict()`` rows and reports the
+size and CPU cost of each available content encoding, and the end-to-end
+GET /api/secrets response through the compression middleware.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+WORDS = ('star cosmos whisper night secret dream ocean silence light memory '
+         'drift ember hollow bloom echo gravity comet orbit distant quiet').split()
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--page', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    import app
+    import compression
+    import json_provider
+    from extensions import db
+    from models import User, Secret
+
+    rng = random.Random(7)
+    application = app.create_app({'RATELIMIT_ENABLED': False})
+    with application.app_context():
+        db.create_all()
+        user = User(username='bench', email='bench@example.com', password='x')
+        db.session.add(user)
+        db.session.flush()
+        for i in range(args.page):
+            db.session.add(Secret(
+                title=' '.join(rng.choices(WORDS, k=4)).title(),
+                content=' '.join(rng.choices(WORDS, k=rng.randint(40, 160))),
+                is_anonymous=i % 3 == 0,
+                user_id=user.id,
+            ))
+        db.session.commit()
+        page = [secret.to_dict() for secret in Secret.query.order_by(Secret.created_at.desc()).limit(args.page)]
+
+        print(f'serialization of {len(page)} secrets:')
+        body = None
+        for name in ('stdlib', 'orjson'):
+            try:
+                provider = json_provider.provider_for(application, name)
+            except RuntimeError:
+                print(f'  {name:<8} not installed')
+                continue
+            encoded, elapsed = timed(lambda: provider.dumps(page), args.repeat)
+            body = body or encoded.encode('utf-8')
+            print(f'  {name:<8} {elapsed * 1e6:9.1f} us per page')
+
+        print(f'\nbytes on the wire ({len(body)} bytes uncompressed):')
+        for name, factory in compression.available_encoders():
+            def encode():
+                encoder = factory()
+                return encoder.compress(body) + encoder.finish()
+            compressed, elapsed = timed(encode, args.repeat)
+            print(f'  {name:<8} {len(compressed):8d} bytes  {len(compressed) / len(body):6.1%}  '
+                  f'{elapsed * 1e6:9.1f} us to compress')
+
+        client = application.test_client()
+        for encoding in ('identity', ', '.join(name for name, _ in compression.available_encoders())):
+            response = client.get('/api/secrets', headers={'Accept-Encoding': encoding})
+            print(f'\nGET /api/secrets Accept-Encoding: {encoding} -> '
+                  f"{response.headers.get('Content-Encoding', 'identity')}, {len(response.data)} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Write throughput: one SQLite file vs. secrets sharded by author.
+
+    python -m bench.sharding [--processes 8] [--per-process 200] [--shards 4]
+
+Each process plays a different author and commits secret-shaped rows one per
+transaction, as ``create_secret`` does without group commit, once into a
+single database and once into the file ``shards.jump_hash`` picks for the
+author. Writers on one file queue behind its lock; writers on different
+shards do not.
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from sqlalchemy import Boolean, Column, DateTime, Integer, MetaData, String, Table, Text, create_engine, func
+
+from shards import jump_hash
+
+metadata = MetaData()
+secret = Table(
+    'secret', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('title', String(200), nullable=False),
+    Column('content', Text, nullable=False),
+    Column('is_anonymous', Boolean, default=False),
+    Column('created_at', DateTime, default=func.current_timestamp()),
+    Column('user_id', Integer, nullable=False),
+)
+
+CONTENT = 'At 3 AM, when the world sleeps, I find myself talking to the moon about hopes and fears. ' * 3
+
+
+def writer(path, user_id, count):
+    engine = create_engine(f'sqlite:///{path}', connect_args={'timeout': 60})
+    for i in range(count):
+        with engine.begin() as connection:
+            connection.execute(secret.insert().values(title=f'post {user_id}-{i}', content=CONTENT,
+                                                      is_anonymous=bool(i % 2), user_id=user_id))
+    engine.dispose()
+
+
+def run(label, paths, processes, per_process):
+    for path in set(paths):
+        metadata.create_all(create_engine(f'sqlite:///{path}'))
+    workers = [multiprocessing.Process(target=writer, args=(paths[user_id - 1], user_id, per_process))
+               for user_id in range(1, processes + 1)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    total = processes * per_process
+    print(f'{label:<14} {total:>6} rows  {elapsed:7.3f}s  {total / elapsed:9.0f} rows/s')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--per-process', type=int, default=200)
+    parser.add_argument('--shards', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        single = os.path.join(tmp, 'single.db')
+        baseline = run('1 file', [single] * args.processes, args.processes, args.per_process)
+        sharded = [os.path.join(tmp, f'secrets-{jump_hash(user_id, args.shards)}.db')
+                   for user_id in range(1, args.processes + 1)]
+        used = len(set(sharded))
+        elapsed = run(f'{args.shards} shards', sharded, args.processes, args.per_process)
+
+    print(f'speedup: {baseline / elapsed:.1f}x ({used} of {args.shards} shards received writes)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Import-time and cold-start benchmark for the application factory.
+
+    python -m bench.startup [--runs 5] [--top 10]
+
+Every run is a fresh interpreter, measuring ``import app``, ``create_app()``
+and the first request served by a test client. The slowest imports come from
+``python -X importtime``.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+application = app.create_app()
+t2 = time.perf_counter()
+response = application.test_client().get('/login')
+t3 = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({'import': t1 - t0, 'create_app': t2 - t1, 'first_request': t3 - t2}))
+"""
+
+
+def run_probe(env):
+    out = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(env, top):
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if not cumulative_us.strip().isdigit():
+            continue
+        # Nested imports are indented under their parent; report the top two levels
+        depth = len(name) - len(name.lstrip(' '))
+        rows.append((int(cumulative_us), depth, name.strip()))
+    shallowest = min((depth for _, depth, _ in rows), default=0)
+    top_level = [(cumulative, name) for cumulative, depth, name in rows if depth <= shallowest + 2]
+    return sorted(top_level, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+
+    samples = [run_probe(env) for _ in range(args.runs)]
+    for phase in ('import', 'create_app', 'first_request'):
+        values = [sample[phase] * 1000 for sample in samples]
+        print(f'{phase:<14} median {statistics.median(values):8.1f} ms   min {min(values):8.1f} ms')
+
+    print('\nslowest imports (cumulative):')
+    for cumulative_us, name in slowest_imports(env, args.top):
+        print(f'  {cumulative_us / 1000:8.1f} ms  {name}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Benchmark username allocation against a hot handle with 10k collisions.
+
+    python -m bench.username_alloc [--collisions 10000]
+
+Seeds "john", "john1" ... "john<N-1>" plus unrelated names into a temporary
+SQLite database, then times the old probe-per-suffix loop against
+app._allocate_username.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--collisions', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    import app
+    from extensions import db
+    from models import User
+
+    with app.create_app().app_context():
+        db.create_all()
+        names = ['john'] + [f'john{i}' for i in range(1, args.collisions)]
+        names += [f'johnny{i}' for i in range(1000)] + [f'jane{i}' for i in range(1000)]
+        db.session.execute(User.__table__.insert(), [
+            {'username': name, 'email': f'{name}@example.com', 'password': 'x'} for name in names
+        ])
+        db.session.commit()
+
+        def probe_loop(base_username):
+            username = base_username
+            suffix = 1
+            while User.query.filter_by(username=username).first() is not None:
+                username = f"{base_username}{suffix}"
+                suffix += 1
+            return username
+
+        for label, allocate in (('probe per suffix', probe_loop), ('single range scan', app._allocate_username)):
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                username = allocate('john')
+            elapsed = (time.perf_counter() - start) / args.repeat
+            print(f'{label:<18} -> {username:<12} {elapsed * 1000:9.2f} ms per allocation')
+
+
+if __name__ == '__main__':
+    main()
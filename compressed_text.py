@@ -0,0 +1,222 @@
+"""Transparent compression for long text columns.
+
+``CompressedText`` stores values of at least ``min_size`` UTF-8 bytes as a
+small binary header plus a raw DEFLATE (or, with CONTENT_CODEC=zstd, zstd)
+stream primed with a shared dictionary of phrases common in our corpus. On
+short confessions DEFLATE with a trained dictionary compresses better than
+zstd, so it is the default. Short values, and any value that would not shrink, are stored as
+plain text, and so are all rows written before this type existed. Reads
+tell the two apart by type: SQLite hands back ``str`` for text and ``bytes``
+for compressed blobs. Other dialects store plain text (PostgreSQL already
+compresses large values with TOAST).
+
+Header: ``\\x00``, codec (``z`` zlib/DEFLATE, ``s`` zstd), dictionary id as
+two big-endian bytes. Dictionary 1 is built in; ``flask train-content-dict``
+writes newer ones to CONTENT_DICT_DIR, and ``flask recompress-secrets``
+moves existing rows onto the newest one. Every SQLite connection also gets a
+``secret_text(content)`` SQL function so triggers and views can see plain
+text.
+"""
+import collections
+import os
+import re
+import sqlite3
+import threading
+import zlib
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.types import Text, TypeDecorator
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MAGIC = b'\x00'
+CODEC_ZLIB = b'z'
+CODEC_ZSTD = b's'
+HEADER_SIZE = 4
+# DEFLATE only looks back 32 KiB, so a larger dictionary would be wasted
+MAX_DICT_SIZE = 32 * 1024
+
+# Phrases that recur across confessions; the most useful ones sit last, where
+# back-references are cheapest
+BUILTIN_DICTIONARY = (
+    'sometimes, something, somewhere, everything, nothing, anything, everyone, '
+    'because, through, without, between, together, forever, always, never again, '
+    'universe, galaxy, constellation, cosmic, cosmos, stars above, the moon, moonlight, '
+    'starlight, the night sky, infinite space, across the universe, the stars tonight, '
+    'heart, hearts, soul, souls, dream, dreams, dreaming, whisper, whispered, silence, '
+    'kindness, gentle, tender, beautiful, wonder, hope, afraid, lonely, alone, '
+    'memory, memories, remember when, I still remember, I never told anyone, '
+    'I wish I could, I wish I had, I want to, I used to, I have never, I think about, '
+    'every time I, every night I, every day I, when I was, when we were, '
+    'I don\'t know how to tell, I\'m afraid that, I can\'t stop thinking about, '
+    'my best friend, my family, my mother, my father, the person I love, '
+    'falling in love, fell in love with, in love with you, I love you, I miss you, '
+    'I am grateful, thank you for, no one knows, nobody knows that, the truth is, '
+    'in this vast universe, love finds a way, under the stars, beneath the stars, '
+    'I have been thinking about, for a long time, for the first time, one day I will, '
+    'and then I, but I, that I, to the, in the, of the, and the '
+).encode('utf-8')
+
+_dictionaries = {1: BUILTIN_DICTIONARY}
+_zstd_dicts = {}
+_lock = threading.Lock()
+_settings = {'directory': None, 'min_size': 160, 'codec': 'zlib'}
+_local = threading.local()
+
+
+def configure(directory=None, min_size=160, codec='zlib'):
+    """Set where trained dictionaries live, the size threshold and the codec, and load dictionaries."""
+    if codec not in ('zlib', 'zstd'):
+        raise ValueError(f'Unknown content codec: {codec}')
+    if codec == 'zstd' and zstandard is None:
+        raise RuntimeError('CONTENT_CODEC=zstd but zstandard is not installed')
+    _settings.update(directory=directory, min_size=min_size, codec=codec)
+    load_dictionaries()
+
+
+def load_dictionaries():
+    directory = _settings['directory']
+    if not directory or not os.path.isdir(directory):
+        return
+    with _lock:
+        for filename in os.listdir(directory):
+            match = re.fullmatch(r'(\d+)\.dict', filename)
+            if match and int(match.group(1)) not in _dictionaries:
+                with open(os.path.join(directory, filename), 'rb') as f:
+                    _dictionaries[int(match.group(1))] = f.read()
+
+
+def current_dictionary_id():
+    return max(_dictionaries)
+
+
+def _dictionary(dict_id):
+    if dict_id not in _dictionaries:
+        # Written by a worker that has already loaded a newer dictionary
+        load_dictionaries()
+    return _dictionaries[dict_id]
+
+
+def _zstd_dict(dict_id):
+    zdict = _zstd_dicts.get(dict_id)
+    if zdict is None:
+        zdict = zstandard.ZstdCompressionDict(_dictionary(dict_id), dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+        _zstd_dicts[dict_id] = zdict
+    return zdict
+
+
+def _zstd_decompressor(dict_id):
+    # Decompressors are expensive to build and not safe to share between threads
+    cache = _local.__dict__.setdefault('zstd_decompressors', {})
+    decompressor = cache.get(dict_id)
+    if decompressor is None:
+        decompressor = cache[dict_id] = zstandard.ZstdDecompressor(dict_data=_zstd_dict(dict_id))
+    return decompressor
+
+
+def encode(value, dict_id=None):
+    """Return ``value`` compressed with a header, or unchanged if that would not pay off."""
+    if value is None:
+        return None
+    raw = value.encode('utf-8')
+    if len(raw) < _settings['min_size']:
+        return value
+    dict_id = dict_id or current_dictionary_id()
+    codec = CODEC_ZSTD if _settings['codec'] == 'zstd' else CODEC_ZLIB
+    if codec == CODEC_ZSTD:
+        compressor = zstandard.ZstdCompressor(level=9, dict_data=_zstd_dict(dict_id),
+                                              write_checksum=False, write_dict_id=False)
+        payload = compressor.compress(raw)
+    else:
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=_dictionary(dict_id))
+        payload = compressor.compress(raw) + compressor.flush()
+    if len(payload) + HEADER_SIZE >= len(raw):
+        return value
+    return MAGIC + codec + dict_id.to_bytes(2, 'big') + payload
+
+
+def decode(stored):
+    """Inverse of ``encode``; plain ``str`` values (legacy or short rows) pass through."""
+    if stored is None or isinstance(stored, str):
+        return stored
+    stored = bytes(stored)
+    if stored[:1] != MAGIC:
+        return stored.decode('utf-8')
+    codec, dict_id, payload = stored[1:2], int.from_bytes(stored[2:4], 'big'), stored[HEADER_SIZE:]
+    if codec == CODEC_ZSTD:
+        return _zstd_decompressor(dict_id).decompress(payload).decode('utf-8')
+    decompressor = zlib.decompressobj(-15, zdict=_dictionary(dict_id))
+    return (decompressor.decompress(payload) + decompressor.flush()).decode('utf-8')
+
+
+def needs_recompress(stored):
+    """True for rows that are plain but long enough to compress, or on an older dictionary."""
+    if stored is None:
+        return False
+    if isinstance(stored, str):
+        return len(stored.encode('utf-8')) >= _settings['min_size']
+    stored = bytes(stored)
+    return stored[:1] == MAGIC and int.from_bytes(stored[2:4], 'big') != current_dictionary_id()
+
+
+def train_dictionary(samples, size=MAX_DICT_SIZE):
+    """Build a raw-content dictionary from sample texts.
+
+    Scores repeated word n-grams by frequency times length and packs the best
+    into ``size`` bytes, most valuable last. The same bytes prime both zlib
+    (``zdict``) and zstd (raw-content dictionary).
+    """
+    counts = collections.Counter()
+    for sample in samples:
+        words = re.findall(r"\S+\s*", sample)
+        for n in (1, 2, 3, 4):
+            for i in range(len(words) - n + 1):
+                counts[''.join(words[i:i + n])] += 1
+    scored = sorted(((count * len(gram), gram) for gram, count in counts.items() if count > 1 and len(gram) > 3),
+                    reverse=True)
+    chosen, used = [], 0
+    for _, gram in scored:
+        encoded = gram.encode('utf-8')
+        if used + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        used += len(encoded)
+    return b''.join(reversed(chosen))
+
+
+def save_dictionary(data):
+    """Store ``data`` as the next dictionary id in the configured directory and return the id."""
+    directory = _settings['directory']
+    if not directory:
+        raise RuntimeError('No content dictionary directory configured')
+    os.makedirs(directory, exist_ok=True)
+    load_dictionaries()
+    with _lock:
+        dict_id = current_dictionary_id() + 1
+        with open(os.path.join(directory, f'{dict_id}.dict'), 'wb') as f:
+            f.write(data)
+        _dictionaries[dict_id] = data
+    return dict_id
+
+
+class CompressedText(TypeDecorator):
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if dialect.name != 'sqlite':
+            return value
+        return encode(value)
+
+    def process_result_value(self, value, dialect):
+        return decode(value)
+
+
+@event.listens_for(Engine, 'connect')
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function('secret_text', 1, decode, deterministic=True)
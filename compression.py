@@ -0,0 +1,191 @@
+"""Negotiated response compression as WSGI middleware.
+
+Picks the best of zstd, brotli and gzip that the client accepts (honouring
+q-values) for JSON, NDJSON and HTML responses. zstd and brotli are used only
+when ``zstandard``/``brotli`` are installed. Bodies under ``min_size`` bytes
+are left alone. Bodies up to ``buffer_size`` are compressed in one shot with
+an accurate Content-Length; larger or unknown-length bodies are compressed
+chunk by chunk as the application yields them, flushing after every chunk so
+streamed responses stay incremental.
+
+Responses that already carry a Content-Encoding (the pre-compressed static
+assets) or ``Cache-Control: no-transform`` pass through untouched, as do
+CSS/JS files so they keep the server's sendfile path.
+"""
+import zlib
+
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/html', 'text/plain')
+
+
+class _Gzip:
+    def __init__(self, level=6):
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._obj.compress(data)
+
+    def flush(self):
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._obj.flush(zlib.Z_FINISH)
+
+
+class _Brotli:
+    def __init__(self, brotli, quality=4):
+        self._obj = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._obj.process(data)
+
+    def flush(self):
+        return self._obj.flush()
+
+    def finish(self):
+        return self._obj.finish()
+
+
+class _Zstd:
+    def __init__(self, zstandard, level=3):
+        self._zstandard = zstandard
+        self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._obj.compress(data)
+
+    def flush(self):
+        return self._obj.flush(self._zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._obj.flush()
+
+
+def available_encoders():
+    """Encoders usable in this environment, in server preference order."""
+    encoders = []
+    try:
+        import zstandard
+    except ImportError:
+        pass
+    else:
+        encoders.append(('zstd', lambda: _Zstd(zstandard)))
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        encoders.append(('br', lambda: _Brotli(brotli)))
+    encoders.append(('gzip', _Gzip))
+    return encoders
+
+
+def negotiate(accept_encoding, encoders):
+    """Return (name, factory) for the best encoder the client accepts, or None."""
+    if not accept_encoding:
+        return None
+    accepted = parse_accept_header(accept_encoding)
+    best = None
+    for name, factory in encoders:
+        quality = accepted[name]
+        if quality > 0 and (best is None or quality > best[0]):
+            best = (quality, name, factory)
+    return best[1:] if best else None
+
+
+class CompressionMiddleware:
+    def __init__(self, app, min_size=1024, buffer_size=256 * 1024, encoders=None):
+        self.app = app
+        self.min_size = min_size
+        self.buffer_size = buffer_size
+        self.encoders = available_encoders() if encoders is None else encoders
+
+    def __call__(self, environ, start_response):
+        choice = negotiate(environ.get('HTTP_ACCEPT_ENCODING'), self.encoders)
+        if choice is None or environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.app(environ, start_response)
+
+        captured = []
+
+        def write(data):
+            raise RuntimeError('CompressionMiddleware does not support the write() callable')
+
+        def capture(status, headers, exc_info=None):
+            captured[:] = [status, headers, exc_info]
+            return write
+
+        app_iter = self.app(environ, capture)
+        iterator = iter(app_iter)
+        pending = []
+        while not captured:
+            # start_response may be deferred until the first chunk is produced
+            chunk = next(iterator)
+            if chunk:
+                pending.append(chunk)
+        status, headers, exc_info = captured
+        headers = Headers(headers)
+
+        if not self._should_compress(status, headers):
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            return self._passthrough(app_iter, iterator, pending)
+
+        name, factory = choice
+        headers.add('Vary', 'Accept-Encoding')
+        length = headers.get('Content-Length', type=int)
+        if length is not None and length < self.min_size:
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            return self._passthrough(app_iter, iterator, pending)
+
+        headers['Content-Encoding'] = name
+        etag = headers.get('ETag')
+        if etag and not etag.startswith('W/'):
+            # Different bytes, same entity: only a weak validator still holds
+            headers['ETag'] = 'W/' + etag
+
+        if length is not None and length <= self.buffer_size:
+            try:
+                body = b''.join(pending) + b''.join(iterator)
+            finally:
+                if hasattr(app_iter, 'close'):
+                    app_iter.close()
+            encoder = factory()
+            compressed = encoder.compress(body) + encoder.finish()
+            headers['Content-Length'] = str(len(compressed))
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            return [compressed]
+
+        headers.remove('Content-Length')
+        start_response(status, headers.to_wsgi_list(), exc_info)
+        return self._stream(app_iter, iterator, pending, factory())
+
+    def _should_compress(self, status, headers):
+        if status[:3] in ('204', '304') or int(status[:3]) < 200:
+            return False
+        if 'Content-Encoding' in headers or 'no-transform' in headers.get('Cache-Control', ''):
+            return False
+        mimetype = headers.get('Content-Type', '').split(';')[0].strip()
+        return mimetype in COMPRESSIBLE_TYPES
+
+    def _passthrough(self, app_iter, iterator, pending):
+        if not pending:
+            # Hand back the original iterable so wsgi.file_wrapper/sendfile still applies
+            return app_iter
+        return self._chain(app_iter, iterator, pending)
+
+    def _chain(self, app_iter, iterator, pending):
+        try:
+            yield from pending
+            yield from iterator
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+    def _stream(self, app_iter, iterator, pending, encoder):
+        for chunk in self._chain(app_iter, iterator, pending):
+            if chunk:
+                data = encoder.compress(chunk) + encoder.flush()
+                if data:
+                    yield data
+        yield encoder.finish()
@@ -0,0 +1,335 @@
+"""Pre-insert filter for repeated and near-duplicate secrets.
+
+``create_secret`` runs every new post past ``DuplicateFilter`` before
+inserting it. Content is normalized (NFKC, case-folded, punctuation and
+whitespace collapsed) and compared with the secrets accepted in the last
+DEDUP_WINDOW_MINUTES in two ways:
+
+* exact: a BLAKE2 digest of the normalized text, looked up in a dict;
+* near: a 64-slot MinHash signature of its character 5-grams. The signature
+  uses one-permutation hashing (each shingle hashed once and binned), so
+  building it costs one hash per shingle, not one per slot. An LSH index of
+  8 bands of 8 slots finds candidates, which are confirmed when at least
+  DEDUP_SIMILARITY of their slots match (an estimate of Jaccard similarity).
+
+Any post is compared with its author's own recent posts. Posts by other
+people count only when the normalized text is at least
+DEDUP_CROSS_USER_MIN_CHARS long: copy-pasted spam is long, while short lines
+such as "i miss my dad" are posted independently by different people.
+
+Matches are rejected, or with DEDUP_ACTION=quarantine parked in
+``quarantined_secret`` until ``flask quarantined-secrets`` releases or
+discards them. Accepted posts leave a row in
+``secret_fingerprint`` on the primary. Before checking, each worker re-reads
+rows stamped since SYNC_OVERLAP seconds before the newest one it has seen,
+so all workers agree. Ids are no watermark: on PostgreSQL a row with a lower
+id can commit after one with a higher id. If recording a fingerprint fails,
+the worker still knows it and retries the write with its next one. Each index keeps
+only the window in memory, capped at DEDUP_MAX_ENTRIES. ``flask
+dedup-secrets`` replays existing secrets through the same filter, oldest first.
+"""
+import collections
+import datetime
+import hashlib
+import heapq
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from array import array
+
+from sqlalchemy import delete, insert, select
+
+from models import QuarantinedSecret, Reaction, ReactionCount, Secret, SecretFingerprint, SecretScore, TrendingSecret
+
+SIGNATURE_SLOTS = 64
+BANDS = 8
+ROWS = SIGNATURE_SLOTS // BANDS
+SHINGLE = 5
+# Shorter texts have too few shingles for a meaningful similarity estimate
+MIN_NEAR_CHARS = 32
+CROSS_USER_MIN_CHARS = 80
+# Generous bound on the time from stamping a fingerprint to its commit becoming visible, plus clock skew
+SYNC_OVERLAP = 10.0
+
+_EMPTY = 0xFFFFFFFF
+_SEPARATORS = re.compile(r'[\W_]+')
+
+# length is that of the normalized text; None for fingerprints read back from the table
+Fingerprint = collections.namedtuple('Fingerprint', 'digest slots length')
+Match = collections.namedtuple('Match', 'kind secret_id similarity')
+_Entry = collections.namedtuple('_Entry', 'secret_id user_id created_at digest slots')
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKC', text).casefold()
+    return ' '.join(_SEPARATORS.sub(' ', text).split())
+
+
+def _mix(h):
+    # murmur3's finalizer; CRC-32 alone is linear, so its low bits make poor slot numbers
+    h ^= h >> 16
+    h = (h * 0x85EBCA6B) & 0xFFFFFFFF
+    h ^= h >> 13
+    h = (h * 0xC2B2AE35) & 0xFFFFFFFF
+    return h ^ (h >> 16)
+
+
+def signature(normalized):
+    """One-permutation MinHash of the text's byte 5-grams, densified so every slot is filled."""
+    data = normalized.encode('utf-8')
+    shingles = {zlib.crc32(data[i:i + SHINGLE]) for i in range(max(1, len(data) - SHINGLE + 1))}
+    slots = [_EMPTY] * SIGNATURE_SLOTS
+    for shingle in shingles:
+        h = _mix(shingle)
+        slot, value = h & (SIGNATURE_SLOTS - 1), h >> 6
+        if value < slots[slot]:
+            slots[slot] = value
+    if _EMPTY in slots:
+        # An empty slot borrows the next filled one, offset by the distance so it stays distinguishable
+        filled = list(slots)
+        for index, value in enumerate(filled):
+            if value == _EMPTY:
+                for step in range(1, SIGNATURE_SLOTS):
+                    borrowed = filled[(index + step) % SIGNATURE_SLOTS]
+                    if borrowed != _EMPTY:
+                        slots[index] = borrowed + (step << 26)
+                        break
+    return tuple(slots)
+
+
+def fingerprint(content):
+    normalized = normalize(content)
+    digest = hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).hexdigest()
+    return Fingerprint(digest, signature(normalized) if len(normalized) >= MIN_NEAR_CHARS else None, len(normalized))
+
+
+def _bands(slots):
+    return [hash((band,) + slots[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+
+def _pack(slots):
+    return array('I', slots).tobytes() if slots is not None else None
+
+
+def _unpack(blob):
+    return tuple(array('I', blob)) if blob is not None else None
+
+
+class DuplicateFilter:
+    """Sliding-window index of recent fingerprints: an exact-digest dict plus MinHash LSH buckets."""
+
+    def __init__(self, window_minutes=60, similarity=0.8, max_entries=50000, cross_user_min_chars=CROSS_USER_MIN_CHARS):
+        self.window = window_minutes * 60.0
+        self.similarity = similarity
+        self.max_entries = max_entries
+        self.cross_user_min_chars = cross_user_min_chars
+        self._entries = collections.deque()
+        self._by_secret = {}
+        self._exact = {}
+        self._buckets = {}
+        self._synced_to = 0.0
+        self._unrecorded = []
+        self._lock = threading.Lock()
+
+    def check(self, connection, fp, user_id, now=None):
+        """Catch up with fingerprints other workers recorded, then return a ``Match`` or None."""
+        now = time.time() if now is None else now
+        self.sync(connection, now)
+        with self._lock:
+            return self.match(fp, user_id)
+
+    def match(self, fp, user_id):
+        """Best match for a post by ``user_id``; other authors' posts only count for long texts."""
+        anyone = fp.length >= self.cross_user_min_chars
+        authors = self._exact.get(fp.digest)
+        if authors:
+            entry = authors.get(user_id) or (next(iter(authors.values())) if anyone else None)
+            if entry is not None:
+                return Match('exact', entry.secret_id, 1.0)
+        if fp.slots is None:
+            return None
+        best = None
+        candidates = set()
+        for key in _bands(fp.slots):
+            candidates.update(self._buckets.get(key, ()))
+        for secret_id in candidates:
+            entry = self._by_secret[secret_id]
+            if not anyone and entry.user_id != user_id:
+                continue
+            similarity = sum(a == b for a, b in zip(fp.slots, entry.slots)) / SIGNATURE_SLOTS
+            if similarity >= self.similarity and (best is None or similarity > best.similarity):
+                best = Match('near', secret_id, similarity)
+        return best
+
+    def sync(self, connection, now):
+        """Load fingerprints recorded since the last sync and drop the ones that left the window."""
+        fingerprints = SecretFingerprint.__table__
+        since = max(now - self.window, self._synced_to - SYNC_OVERLAP)
+        rows = connection.execute(
+            select(fingerprints).where(fingerprints.c.created_at >= since).order_by(fingerprints.c.created_at)
+        ).all()
+        with self._lock:
+            for row in rows:
+                self.add(row.secret_id, row.user_id, row.created_at, Fingerprint(row.digest, _unpack(row.signature), None))
+                self._synced_to = max(self._synced_to, row.created_at)
+            self.expire(now)
+
+    def add(self, secret_id, user_id, created_at, fp):
+        if secret_id in self._by_secret:
+            return
+        entry = _Entry(secret_id, user_id, created_at, fp.digest, fp.slots)
+        self._entries.append(entry)
+        self._by_secret[secret_id] = entry
+        self._exact.setdefault(fp.digest, {}).setdefault(user_id, entry)
+        if fp.slots is not None:
+            for key in _bands(fp.slots):
+                self._buckets.setdefault(key, set()).add(secret_id)
+
+    def expire(self, now):
+        cutoff = now - self.window
+        while self._entries and (self._entries[0].created_at < cutoff or len(self._entries) > self.max_entries):
+            entry = self._entries.popleft()
+            self._by_secret.pop(entry.secret_id, None)
+            authors = self._exact.get(entry.digest)
+            if authors is not None and authors.get(entry.user_id) is entry:
+                del authors[entry.user_id]
+                if not authors:
+                    del self._exact[entry.digest]
+            if entry.slots is not None:
+                for key in _bands(entry.slots):
+                    bucket = self._buckets.get(key)
+                    if bucket is not None:
+                        bucket.discard(entry.secret_id)
+                        if not bucket:
+                            del self._buckets[key]
+
+    def remember(self, engine, secret_id, user_id, fp, now=None):
+        """Record an accepted secret so every worker treats later copies as repeats.
+
+        This worker knows it at once. Should the write fail, it is kept and
+        retried with the next call, as long as it is still inside the window.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self.add(secret_id, user_id, now, fp)
+            self._unrecorded = [row for row in self._unrecorded if row['created_at'] >= now - self.window]
+            self._unrecorded.append({'secret_id': secret_id, 'user_id': user_id, 'digest': fp.digest,
+                                     'signature': _pack(fp.slots), 'created_at': now})
+            rows, self._unrecorded = self._unrecorded, []
+        try:
+            with engine.begin() as connection:
+                recorded = set()
+                if len(rows) > 1:
+                    # A failed attempt may still have committed
+                    ids = [row['secret_id'] for row in rows]
+                    recorded.update(connection.execute(
+                        select(SecretFingerprint.secret_id).where(SecretFingerprint.secret_id.in_(ids))
+                    ).scalars())
+                missing = [row for row in rows if row['secret_id'] not in recorded]
+                if missing:
+                    connection.execute(insert(SecretFingerprint), missing)
+                # Rows that have left everyone's window are no longer needed
+                connection.execute(delete(SecretFingerprint).where(SecretFingerprint.created_at < now - self.window))
+        except Exception as e:
+            print(f"[DEDUP] Failed to record {len(rows)} fingerprints (latest: secret {secret_id}); will retry: {e}")
+            with self._lock:
+                self._unrecorded = rows + self._unrecorded
+            return False
+        return True
+
+
+def quarantine(connection, values, match, secret_id=None):
+    """Park a secret (``title``, ``content``, ``is_anonymous``, ``user_id``) for review."""
+    if secret_id is not None:
+        # A re-run of an interrupted backfill replaces its earlier copy
+        connection.execute(delete(QuarantinedSecret).where(QuarantinedSecret.secret_id == secret_id))
+    connection.execute(insert(QuarantinedSecret).values(
+        secret_id=secret_id, reason=match.kind, matched_secret_id=match.secret_id,
+        similarity=match.similarity, **values
+    ))
+
+
+def _forget(connection, secret_id):
+    # Hearts and trending rows would otherwise point at a secret that is gone
+    for model in (Reaction, ReactionCount, SecretScore, TrendingSecret):
+        connection.execute(delete(model).where(model.secret_id == secret_id))
+
+
+def _epoch(value):
+    return value.replace(tzinfo=datetime.UTC).timestamp()
+
+
+def _iter_secrets(engine, batch_size):
+    secret = Secret.__table__
+    after_id = 0
+    while True:
+        with engine.connect() as connection:
+            rows = connection.execute(
+                select(secret).where(secret.c.id > after_id).order_by(secret.c.id).limit(batch_size)
+            ).all()
+        for row in rows:
+            yield row, engine
+        if len(rows) < batch_size:
+            return
+        after_id = rows[-1].id
+
+
+def backfill(engine, secret_engines, window_minutes=60, similarity=0.8, batch_size=500, dry_run=False, now=None,
+             cross_user_min_chars=CROSS_USER_MIN_CHARS):
+    """Replay existing secrets through the filter in id order; return ``(scanned, quarantined, fingerprinted)``.
+
+    A secret repeating an earlier one posted within the window before it is
+    moved from its shard to ``quarantined_secret``, and its hearts and
+    trending rows are deleted with it; refresh trending afterwards. Kept
+    secrets still inside the window as of ``now`` are fingerprinted so the
+    live filter knows them.
+    """
+    now = time.time() if now is None else now
+    scan = DuplicateFilter(window_minutes, similarity, max_entries=float('inf'), cross_user_min_chars=cross_user_min_chars)
+    with engine.connect() as connection:
+        known = set(connection.execute(select(SecretFingerprint.secret_id)).scalars())
+    scanned = quarantined = 0
+    recent, repeats = [], []
+
+    def move(batch):
+        for row, shard, match in batch:
+            values = {'title': row.title, 'content': row.content, 'is_anonymous': row.is_anonymous,
+                      'user_id': row.user_id, 'created_at': row.created_at}
+            with engine.begin() as connection:
+                quarantine(connection, values, match, secret_id=row.id)
+                _forget(connection, row.id)
+            with shard.begin() as connection:
+                connection.execute(delete(Secret.__table__).where(Secret.__table__.c.id == row.id))
+        print(f"[DEDUP] Quarantined {quarantined} repeated secrets so far")
+
+    streams = [_iter_secrets(shard, batch_size) for shard in secret_engines]
+    for row, shard in heapq.merge(*streams, key=lambda item: item[0].id):
+        scanned += 1
+        created_at = _epoch(row.created_at)
+        fp = fingerprint(row.content)
+        scan.expire(created_at)
+        match = scan.match(fp, row.user_id)
+        if match is not None:
+            quarantined += 1
+            repeats.append((row, shard, match))
+            if len(repeats) >= batch_size and not dry_run:
+                move(repeats)
+                repeats = []
+            continue
+        scan.add(row.id, row.user_id, created_at, fp)
+        if created_at >= now - scan.window and row.id not in known:
+            recent.append({'secret_id': row.id, 'user_id': row.user_id, 'digest': fp.digest,
+                           'signature': _pack(fp.slots), 'created_at': created_at})
+
+    if dry_run:
+        for row, _, match in repeats:
+            print(f"[DEDUP] Secret {row.id} repeats secret {match.secret_id} ({match.kind}, {match.similarity:.2f})")
+        return scanned, quarantined, 0
+    if repeats:
+        move(repeats)
+    if recent:
+        with engine.begin() as connection:
+            connection.execute(insert(SecretFingerprint), recent)
+    return scanned, quarantined, len(recent)
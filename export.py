@@ -0,0 +1,110 @@
+"""Constant-memory NDJSON export of secrets.
+
+Rows are read in keyset chunks (``id > last_id ORDER BY id LIMIT chunk``) as
+plain Core rows, never ORM objects, and each chunk is encoded and handed on
+before the next is read. Memory therefore depends on the chunk size, not on
+the table size, and no transaction stays open across the whole export.
+
+When an archive engine is given, archived secrets are exported first (they
+are the oldest), followed by the hot table. When ``secret`` is sharded, each
+shard is exported in turn and usernames are looked up on the primary.
+"""
+import zlib
+
+from sqlalchemy import select
+
+from models import ArchivedSecret, Secret, User
+
+
+def _iter_detached(source_engine, table, engine, user_id, chunk_size, decode=None):
+    """Export ``table`` from a database without the user table (archive or shard)."""
+    query = select(table).order_by(table.c.id).limit(chunk_size)
+    if user_id is not None:
+        query = query.where(table.c.user_id == user_id)
+    users = User.__table__
+
+    last_id = 0
+    while True:
+        with source_engine.connect() as connection:
+            rows = connection.execute(query.where(table.c.id > last_id)).all()
+        # The rows live in another database, so usernames are looked up per chunk
+        with engine.connect() as connection:
+            names = dict(connection.execute(
+                select(users.c.id, users.c.username).where(users.c.id.in_({row.user_id for row in rows}))
+            ).all()) if rows else {}
+        for row in rows:
+            yield {
+                'id': row.id,
+                'title': row.title,
+                'content': decode(row.content) if decode else row.content,
+                'is_anonymous': row.is_anonymous,
+                'created_at': row.created_at.isoformat() if row.created_at else None,
+                'author': 'Anonymous' if row.is_anonymous else names.get(row.user_id)
+            }
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1].id
+
+
+def _decompress(content):
+    return zlib.decompress(content).decode('utf-8')
+
+
+def iter_rows(engine, user_id=None, chunk_size=1000, archive_engine=None, secret_engines=None):
+    """Yield secrets as dicts shaped like ``Secret.to_dict()``, archived ones first, each tier in id order.
+
+    ``secret_engines`` are the shards to read ``secret`` from; by default the
+    primary ``engine`` holds it.
+    """
+    if archive_engine is not None:
+        yield from _iter_detached(archive_engine, ArchivedSecret.__table__, engine, user_id, chunk_size, _decompress)
+    if secret_engines is not None and secret_engines != [engine]:
+        for shard in secret_engines:
+            yield from _iter_detached(shard, Secret.__table__, engine, user_id, chunk_size)
+        return
+    secret = Secret.__table__
+    query = (
+        select(secret.c.id, secret.c.title, secret.c.content, secret.c.is_anonymous,
+               secret.c.created_at, User.__table__.c.username)
+        .join(User.__table__, User.__table__.c.id == secret.c.user_id)
+        .order_by(secret.c.id)
+        .limit(chunk_size)
+    )
+    if user_id is not None:
+        query = query.where(secret.c.user_id == user_id)
+
+    last_id = 0
+    while True:
+        with engine.connect() as connection:
+            rows = connection.execute(query.where(secret.c.id > last_id)).all()
+        for row in rows:
+            yield {
+                'id': row.id,
+                'title': row.title,
+                'content': row.content,
+                'is_anonymous': row.is_anonymous,
+                'created_at': row.created_at.isoformat() if row.created_at else None,
+                'author': 'Anonymous' if row.is_anonymous else row.username
+            }
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1].id
+
+
+def iter_ndjson(engine, dumps, user_id=None, chunk_size=1000, compress=False, archive_engine=None,
+                secret_engines=None):
+    """Yield the export as NDJSON byte chunks, one per keyset chunk, optionally gzipped."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    lines = []
+    for row in iter_rows(engine, user_id=user_id, chunk_size=chunk_size, archive_engine=archive_engine,
+                         secret_engines=secret_engines):
+        lines.append(dumps(row))
+        if len(lines) >= chunk_size:
+            data = ('\n'.join(lines) + '\n').encode('utf-8')
+            lines = []
+            yield compressor.compress(data) if compressor else data
+    if lines:
+        data = ('\n'.join(lines) + '\n').encode('utf-8')
+        yield compressor.compress(data) if compressor else data
+    if compressor:
+        yield compressor.flush()
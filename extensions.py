@@ -0,0 +1,13 @@
+from flask_sqlalchemy import SQLAlchemy
+from flask_wtf import CSRFProtect
+
+from assets import Assets
+from page_cache import PageCache
+from ratelimit import RateLimiter
+
+# Extensions are created unbound and attached to an app in create_app()
+db = SQLAlchemy()
+csrf = CSRFProtect()
+limiter = RateLimiter()
+assets = Assets()
+page_cache = PageCache()
@@ -0,0 +1,200 @@
+"""Full-text search over secrets.
+
+On SQLite the ``secret_fts`` FTS5 table indexes ``secret`` as external content
+and is kept in sync by triggers, so every writer (ORM or raw SQL) updates it.
+Content may be stored compressed (see compressed_text), so the index reads it
+through the ``secret_plain`` view and the ``secret_text()`` SQL function.
+On PostgreSQL a GIN ``tsvector`` expression index is used instead.
+
+``secret_text()`` exists only on connections opened by this app (see
+compressed_text), and SQLite refuses to run a statement whose triggers name
+an unknown function. So a writer outside the app, such as the sqlite3 shell,
+a restore script or a hand-written migration, cannot insert into or update
+``secret`` while the triggers are in place. Run ``flask search-drop-triggers``
+first, and ``flask search-backfill`` afterwards to restore them and reindex.
+"""
+import html
+import re
+
+from sqlalchemy import text
+
+FTS_TABLE = 'secret_fts'
+PLAIN_VIEW = 'secret_plain'
+
+# Highlight markers are control characters so user content can be HTML-escaped
+# before they are swapped for <mark> tags.
+_MARK_OPEN = '\x02'
+_MARK_CLOSE = '\x03'
+
+_SQLITE_DDL = [
+    f"""CREATE VIEW IF NOT EXISTS {PLAIN_VIEW} AS
+        SELECT id, title, secret_text(content) AS content FROM secret""",
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, content,
+        content='{PLAIN_VIEW}', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON secret BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, secret_text(new.content));
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON secret BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content)
+        VALUES ('delete', old.id, old.title, secret_text(old.content));
+    END""",
+    # Recompressing leaves the text unchanged, so only reindex when it differs
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, content ON secret
+        WHEN old.title IS NOT new.title OR secret_text(old.content) IS NOT secret_text(new.content) BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content)
+        VALUES ('delete', old.id, old.title, secret_text(old.content));
+        INSERT INTO {FTS_TABLE}(rowid, title, content) VALUES (new.id, new.title, secret_text(new.content));
+    END""",
+]
+
+# Objects from the first version of the index, which read secret.content directly
+_SQLITE_LEGACY_DROP = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+_SQLITE_TRIGGERS = [f'{FTS_TABLE}_ai', f'{FTS_TABLE}_ad', f'{FTS_TABLE}_au']
+
+_POSTGRES_DDL = [
+    """CREATE INDEX IF NOT EXISTS ix_secret_search ON secret
+        USING GIN (to_tsvector('english', title || ' ' || content))""",
+]
+
+_SQLITE_QUERY = f"""
+    SELECT id, score, title_hl, snippet FROM (
+        SELECT rowid AS id,
+               bm25({FTS_TABLE}, 2.0, 1.0) AS score,
+               highlight({FTS_TABLE}, 0, char(2), char(3)) AS title_hl,
+               snippet({FTS_TABLE}, 1, char(2), char(3), '…', 24) AS snippet
+        FROM {FTS_TABLE}
+        WHERE {FTS_TABLE} MATCH :match
+    )
+    WHERE :after_score IS NULL OR (score, id) > (:after_score, :after_id)
+    ORDER BY score, id
+    LIMIT :limit
+"""
+
+# ts_rank is "higher is better"; negate it so both dialects page ascending.
+_POSTGRES_QUERY = """
+    SELECT id, score, title_hl, snippet FROM (
+        SELECT s.id,
+               -ts_rank(to_tsvector('english', s.title || ' ' || s.content), q) AS score,
+               ts_headline('english', s.title, q, 'StartSel=' || chr(2) || ', StopSel=' || chr(3) || ', HighlightAll=true') AS title_hl,
+               ts_headline('english', s.content, q, 'StartSel=' || chr(2) || ', StopSel=' || chr(3) || ', MaxWords=24, MinWords=8') AS snippet
+        FROM secret s, plainto_tsquery('english', :match) q
+        WHERE to_tsvector('english', s.title || ' ' || s.content) @@ q
+    ) ranked
+    WHERE CAST(:after_score AS double precision) IS NULL OR (score, id) > (:after_score, :after_id)
+    ORDER BY score, id
+    LIMIT :limit
+"""
+
+
+def install(connection):
+    """Create the search index for the connection's dialect.
+
+    Returns True if a SQLite FTS table was created and needs a backfill.
+    """
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        existing = connection.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': FTS_TABLE},
+        ).scalar()
+        if existing is not None and PLAIN_VIEW not in existing:
+            for statement in _SQLITE_LEGACY_DROP:
+                connection.execute(text(statement))
+            existing = None
+        for statement in _SQLITE_DDL:
+            connection.execute(text(statement))
+        return existing is None
+    if dialect == 'postgresql':
+        for statement in _POSTGRES_DDL:
+            connection.execute(text(statement))
+    return False
+
+
+def drop_triggers(connection):
+    """Drop the SQLite sync triggers so writers without ``secret_text()`` can use the table.
+
+    The index goes stale until ``backfill`` puts them back. Returns how many
+    triggers were dropped.
+    """
+    if connection.dialect.name != 'sqlite':
+        return 0
+    existing = set(connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger'")).scalars())
+    dropped = [name for name in _SQLITE_TRIGGERS if name in existing]
+    for name in dropped:
+        connection.execute(text(f'DROP TRIGGER {name}'))
+    return len(dropped)
+
+
+def backfill(connection):
+    """Rebuild the index from existing secret rows and return the row count."""
+    if connection.dialect.name == 'sqlite':
+        install(connection)
+        connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    else:
+        install(connection)
+    return connection.execute(text('SELECT COUNT(*) FROM secret')).scalar()
+
+
+def build_match(query):
+    """Turn free text into a safe FTS5 MATCH expression (prefix on the last term)."""
+    terms = re.findall(r'\w+', query)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def render_highlight(fragment):
+    """HTML-escape a highlighted fragment and turn markers into <mark> tags."""
+    escaped = html.escape(fragment or '')
+    return escaped.replace(_MARK_OPEN, '<mark>').replace(_MARK_CLOSE, '</mark>')
+
+
+def search(connection, query, after=None, limit=20):
+    """Run a ranked search.
+
+    ``after`` is the ``(score, id)`` pair of the last hit on the previous page.
+    Returns ``(hits, last_key)`` where ``last_key`` is None on the final page.
+
+    Scores are relative to the database searched: bm25 weighs terms by that
+    index's own document counts and lengths. Hits merged from several shards
+    therefore page consistently but rank only approximately against each other.
+    """
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        match = build_match(query)
+        sql = _SQLITE_QUERY
+    elif dialect == 'postgresql':
+        match = query
+        sql = _POSTGRES_QUERY
+    else:
+        raise RuntimeError(f'Full-text search is not supported on {dialect}')
+    if not match:
+        return [], None
+
+    after_score, after_id = after if after else (None, None)
+    rows = connection.execute(text(sql), {
+        'match': match,
+        'after_score': after_score,
+        'after_id': after_id,
+        'limit': limit + 1,
+    }).fetchall()
+
+    hits = [{
+        'id': row.id,
+        'score': row.score,
+        'title': render_highlight(row.title_hl),
+        'snippet': render_highlight(row.snippet),
+    } for row in rows[:limit]]
+    last_key = (hits[-1]['score'], hits[-1]['id']) if len(rows) > limit else None
+    return hits, last_key
@@ -0,0 +1,106 @@
+"""Group commit for bursty inserts.
+
+Concurrent callers hand their rows to a single writer thread, which inserts
+everything that is queued together in one transaction. On SQLite that turns N
+fsyncs and N write-lock acquisitions into one, while each caller still gets
+back its own primary key or its own exception.
+
+A lone row is written at once: the writer only waits up to ``window`` for more
+when others were already queued behind it, i.e. when requests really are
+arriving concurrently (gunicorn threads, the ASGI server). Rows that arrive
+while a batch is being written queue up for the next one either way.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class GroupCommitter:
+    def __init__(self, table, window=0.005, max_batch=128):
+        self.table = table
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def submit(self, engine, values, timeout=10.0):
+        """Insert ``values`` as part of the next batch and return the new primary key.
+
+        Blocks until the batch has committed. Errors raised while inserting
+        this particular row are re-raised here. On ``timeout`` a row that is
+        still queued is withdrawn and TimeoutError raised; one the writer has
+        already started on is waited for, so a timeout always means no insert.
+        """
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((engine, values, future))
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            if future.cancel():
+                raise
+        return future.result()
+
+    def _ensure_worker(self):
+        # Threads do not survive fork(), so pre-forked workers start their own
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        pending = self._queue
+        while True:
+            batch = [pending.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(pending.get_nowait())
+                except queue.Empty:
+                    break
+            # Nothing else waiting means nobody to share the transaction with
+            deadline = time.monotonic() + (self.window if len(batch) > 1 else 0)
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            by_engine = {}
+            for item in batch:
+                # Skips rows whose caller gave up waiting
+                if not item[2].set_running_or_notify_cancel():
+                    continue
+                by_engine.setdefault(item[0], []).append(item)
+            for engine, items in by_engine.items():
+                self._flush(engine, items)
+
+    def _flush(self, engine, items):
+        try:
+            ids = []
+            with engine.begin() as connection:
+                for _, values, _ in items:
+                    result = connection.execute(self.table.insert().values(**values))
+                    ids.append(result.inserted_primary_key[0])
+        except Exception as e:
+            if len(items) == 1:
+                items[0][2].set_exception(e)
+                return
+            # One bad row must not fail its neighbours: replay them one by one
+            for item in items:
+                self._flush(engine, [item])
+            return
+
+        for (_, _, future), new_id in zip(items, ids):
+            future.set_result(new_id)
@@ -0,0 +1,27 @@
+# gunicorn -c gunicorn.conf.py
+# Run `flask --app app init-db` once per deploy before starting the workers.
+# For many concurrent slow SMTP/OAuth requests, `uvicorn asgi:app` serves the async views on one event loop.
+import gc
+import os
+
+wsgi_app = 'app:create_app()'
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+# Threads let a worker take several requests at once, which is what gives the
+# group committer (WRITE_BATCH_WINDOW_MS) more than one insert to batch
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+
+# Build the app once in the master and fork it into the workers. Freezing the
+# GC before fork keeps collections in the workers from writing to (and so
+# un-sharing) the pages of objects inherited from the master.
+preload_app = True
+gc.disable()
+
+
+def pre_fork(server, worker):
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    gc.enable()
@@ -0,0 +1,54 @@
+"""Pluggable JSON provider for ``jsonify`` and ``request.get_json``.
+
+``JSON_PROVIDER`` selects the encoder: ``orjson`` (when installed), ``stdlib``
+(Flask's default) or ``auto``, which prefers orjson and falls back quietly.
+Output stays compatible with the default provider: keys are sorted, and
+datetimes, dataclasses and other types orjson would format differently are
+routed through the same ``default()`` hook Flask uses.
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    def _option(self):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # orjson has no equivalent for indent/separators/cls; keep exact stdlib semantics
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._option()).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if self.compact is False or (self.compact is None and self._app.debug):
+            # Pretty-printed debug output
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self._option())
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def provider_for(app, name='auto'):
+    """Return the JSON provider instance named by ``name`` for ``app``."""
+    if name == 'stdlib':
+        return DefaultJSONProvider(app)
+    if name not in ('auto', 'orjson'):
+        raise ValueError(f'Unknown JSON provider: {name}')
+    if orjson is None:
+        if name == 'orjson':
+            raise RuntimeError('JSON_PROVIDER=orjson but orjson is not installed')
+        return DefaultJSONProvider(app)
+    return OrjsonProvider(app)
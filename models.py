@@ -0,0 +1,170 @@
+import datetime
+import zlib
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from compressed_text import CompressedText
+from extensions import db
+
+# User model
+# This model is used to store user credentials in the database
+# username is a unique identifier for the user
+# email is a unique identifier for the user and is used for authentication
+# password is the hashed password for the user
+
+class User(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(150), unique=True, nullable=False)
+    email = db.Column(db.String(150), unique=True, nullable=False)
+    password = db.Column(db.String(256), nullable=False)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    
+    # Relationship with secrets
+    secrets = db.relationship('Secret', backref='author', lazy='dynamic')
+
+    def set_password(self, password):
+        self.password = generate_password_hash(password, method='sha256')
+
+    def check_password(self, password):
+        return check_password_hash(self.password, password)
+
+# Secret model for storing user messages/secrets
+class Secret(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(200), nullable=False)
+    content = db.Column(CompressedText, nullable=False)  # compressed at rest above a size threshold
+    is_anonymous = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'content': self.content,
+            'is_anonymous': self.is_anonymous,
+            'created_at': self.created_at.isoformat(),
+            'author': 'Anonymous' if self.is_anonymous else self.author.username
+        }
+
+# Author timelines page through (user_id, created_at DESC, id DESC) without touching other users' rows
+db.Index('ix_secret_user_timeline', Secret.user_id, Secret.created_at.desc(), Secret.id.desc())
+
+# Cold storage for old secrets, moved out of `secret` by `flask archive-secrets`.
+# Lives in its own database (the "archive" bind), so there is no foreign key to
+# user; ids are the original secret ids and content is zlib-compressed.
+class ArchivedSecret(db.Model):
+    __bind_key__ = 'archive'
+    __tablename__ = 'secret_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    title = db.Column(db.String(200), nullable=False)
+    content = db.Column(db.LargeBinary, nullable=False)
+    is_anonymous = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime)
+    user_id = db.Column(db.Integer, nullable=False)
+
+    def to_dict(self, username=None):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'content': zlib.decompress(self.content).decode('utf-8'),
+            'is_anonymous': self.is_anonymous,
+            'created_at': self.created_at.isoformat(),
+            'author': 'Anonymous' if self.is_anonymous else username
+        }
+
+db.Index('ix_secret_archive_user_timeline', ArchivedSecret.user_id, ArchivedSecret.created_at.desc(), ArchivedSecret.id.desc())
+
+# One heart per user and secret. Secrets may live on other databases (shards,
+# archive), so secret_id is a plain id rather than a foreign key.
+class Reaction(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    secret_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+    __table_args__ = (db.UniqueConstraint('user_id', 'secret_id', name='uq_reaction_user_secret'),)
+
+# Heart counts split into slots so worker processes flushing at the same time
+# rarely update the same row; a secret's count is the sum of its slots.
+class ReactionCount(db.Model):
+    __tablename__ = 'reaction_count'
+    secret_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    slot = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+# Trending scores (see trending.py): log of the secret's decayed engagement,
+# kept relative to a fixed origin so only new events ever change it
+class SecretScore(db.Model):
+    __tablename__ = 'secret_score'
+    secret_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    score = db.Column(db.Float, index=True)
+
+# The materialized top of secret_score that the trending feed pages through
+class TrendingSecret(db.Model):
+    __tablename__ = 'trending_secret'
+    secret_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    score = db.Column(db.Float, nullable=False)
+
+db.Index('ix_trending_secret_rank', TrendingSecret.score.desc(), TrendingSecret.secret_id.desc())
+
+# Single row recording when trending_secret was last rebuilt, so one worker refreshes per interval
+class TrendingRefresh(db.Model):
+    __tablename__ = 'trending_refresh'
+    id = db.Column(db.Integer, primary_key=True)
+    refreshed_at = db.Column(db.Float, nullable=False, default=0.0)
+
+# Fingerprints of recently accepted secrets (see dedup.py); every worker tails
+# this table to keep its in-memory duplicate index current
+class SecretFingerprint(db.Model):
+    __tablename__ = 'secret_fingerprint'
+    id = db.Column(db.Integer, primary_key=True)
+    secret_id = db.Column(db.Integer, unique=True, nullable=False)
+    user_id = db.Column(db.Integer)  # author; repeats of short texts only count against their own posts
+    digest = db.Column(db.String(32), nullable=False)
+    signature = db.Column(db.LargeBinary)  # MinHash slots; NULL for texts too short to compare
+    created_at = db.Column(db.Float, nullable=False, index=True)  # epoch seconds
+
+# Posts held back as repeats of a recent secret, kept for review
+class QuarantinedSecret(db.Model):
+    __tablename__ = 'quarantined_secret'
+    id = db.Column(db.Integer, primary_key=True)
+    secret_id = db.Column(db.Integer, unique=True)  # original id when moved out by `flask dedup-secrets`
+    title = db.Column(db.String(200), nullable=False)
+    content = db.Column(CompressedText, nullable=False)
+    is_anonymous = db.Column(db.Boolean, default=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    reason = db.Column(db.String(16), nullable=False)  # 'exact' or 'near'
+    matched_secret_id = db.Column(db.Integer)
+    similarity = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+# Password Reset model for secure token management
+class PasswordReset(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(150), nullable=False)
+    token = db.Column(db.String(100), nullable=False, unique=True)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    expires_at = db.Column(db.DateTime, nullable=False)
+    used = db.Column(db.Boolean, default=False)
+    
+    def is_expired(self):
+        return datetime.datetime.now(datetime.UTC) > self.expires_at
+    
+    def is_valid(self):
+        return not self.used and not self.is_expired()
+
+# Email Verification model
+class EmailVerification(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(150), nullable=False)
+    code = db.Column(db.String(6), nullable=False)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    expires_at = db.Column(db.DateTime, nullable=False)
+    verified = db.Column(db.Boolean, default=False)
+
+    def is_expired(self):
+        return datetime.datetime.now(datetime.UTC) > self.expires_at
+
+    def is_valid(self, submitted_code: str):
+        return (not self.verified) and (not self.is_expired()) and (self.code == submitted_code)
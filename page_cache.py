@@ -0,0 +1,119 @@
+"""Rendered-page cache for anonymous routes whose HTML depends only on config.
+
+Views decorated with ``page_cache.cached('SOME_CONFIG_KEY', ...)`` are rendered
+once per variant and the bytes are reused. A variant is the endpoint, its URL
+arguments, the named config values and a release fingerprint built from the
+template sources and the asset manifest, so a deploy or config change can
+never serve stale markup.
+
+``csrf_token()`` inside a cached render emits a placeholder that is swapped
+for a fresh token on every response. Pages without per-request tokens get a
+strong ETag and answer conditional requests with 304.
+"""
+import functools
+import hashlib
+import os
+import secrets
+import threading
+
+from flask import current_app, g, request
+
+CSRF_PLACEHOLDER = f'__page_cache_csrf_{secrets.token_hex(8)}__'
+
+
+class _Page:
+    __slots__ = ('body', 'mimetype', 'etag', 'has_token')
+
+    def __init__(self, body, mimetype):
+        self.body = body
+        self.mimetype = mimetype
+        self.has_token = CSRF_PLACEHOLDER.encode('utf-8') in body
+        self.etag = None if self.has_token else hashlib.sha256(body).hexdigest()[:20]
+
+
+class PageCache:
+    def __init__(self, app=None):
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._release = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Call after CSRFProtect and Assets so their Jinja globals are wrapped."""
+        app.config.setdefault('PAGE_CACHE_ENABLED', True)
+        generate_token = app.jinja_env.globals.get('csrf_token')
+        if generate_token is not None:
+            def csrf_token():
+                if g.get('page_cache_render'):
+                    return CSRF_PLACEHOLDER
+                return generate_token()
+            app.jinja_env.globals['csrf_token'] = csrf_token
+            # Flask-WTF also injects csrf_token through a context processor; override it too
+            app.context_processor(lambda: {'csrf_token': csrf_token})
+        self._pages = {}
+        self._release = self._fingerprint(app)
+        app.extensions['page_cache'] = self
+
+    def _fingerprint(self, app):
+        digest = hashlib.sha256()
+        sources = [app.template_folder, os.path.join(app.static_folder, 'dist')]
+        for root in [os.path.join(app.root_path, folder) for folder in sources if folder]:
+            for dirpath, _, filenames in sorted(os.walk(root)):
+                for filename in sorted(filenames):
+                    stat = os.stat(os.path.join(dirpath, filename))
+                    digest.update(f'{dirpath}/{filename}:{stat.st_mtime_ns}:{stat.st_size}'.encode('utf-8'))
+        return digest.hexdigest()
+
+    def release(self):
+        if current_app.jinja_env.auto_reload:
+            # Development: pick up template edits without a restart
+            self._release = self._fingerprint(current_app)
+        return self._release
+
+    def cached(self, *config_keys):
+        """Cache a view's HTML per variant; ``config_keys`` name the config values it reads."""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if not current_app.config['PAGE_CACHE_ENABLED']:
+                    return view(*args, **kwargs)
+                key = (
+                    request.endpoint,
+                    tuple(sorted(kwargs.items())),
+                    tuple(current_app.config.get(name) for name in config_keys),
+                    self.release(),
+                )
+                page = self._pages.get(key)
+                if page is None:
+                    g.page_cache_render = True
+                    try:
+                        response = current_app.make_response(view(*args, **kwargs))
+                    finally:
+                        g.page_cache_render = False
+                    if response.status_code != 200 or response.is_streamed or response.mimetype != 'text/html':
+                        return response
+                    page = _Page(response.get_data(), response.mimetype)
+                    with self._lock:
+                        self._pages[key] = page
+                return self._respond(page)
+
+            return wrapper
+
+        return decorator
+
+    def _respond(self, page):
+        if page.has_token:
+            token = current_app.jinja_env.globals['csrf_token']()
+            body = page.body.replace(CSRF_PLACEHOLDER.encode('utf-8'), token.encode('utf-8'))
+            response = current_app.response_class(body, mimetype=page.mimetype)
+            response.cache_control.no_store = True
+            return response
+        response = current_app.response_class(page.body, mimetype=page.mimetype)
+        response.set_etag(page.etag)
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
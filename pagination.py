@@ -0,0 +1,35 @@
+import base64
+import json
+
+
+def encode_cursor(*values):
+    """Pack keyset values into an opaque, URL-safe cursor string."""
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor, size):
+    """Unpack a cursor produced by encode_cursor.
+
+    Returns None for an empty cursor and raises ValueError if the cursor is
+    malformed or does not hold exactly ``size`` values.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw.decode('utf-8'))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f'Malformed cursor: {e}') from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Malformed cursor')
+    return values
+
+
+def parse_limit(value, default=20, maximum=50):
+    """Parse a ``limit`` query argument, clamped to [1, maximum]."""
+    try:
+        limit = int(value) if value is not None else default
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, maximum))
@@ -0,0 +1,158 @@
+"""Shared cache for OAuth provider metadata (OIDC discovery documents, JWKS).
+
+Authlib fetches ``server_metadata_url`` and ``jwks_uri`` lazily, once per
+worker process, on the login callback itself. This cache keeps both documents
+in a directory shared by every worker on the host, honours a TTL, and refreshes
+entries in a background thread before they expire, so callbacks only pay for
+the token exchange.
+
+The cached JWKS decides which ID token signatures are trusted, so the
+directory must be private to the app's user: it is created 0700, refused if
+another user owns it or can write to it, and entries are written 0600.
+"""
+import hashlib
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+
+
+def _private_directory(directory):
+    """Create ``directory`` 0700 if needed and make sure nobody but us can plant files in it."""
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode):
+        raise RuntimeError(f'OAuth cache path {directory} is not a directory')
+    if hasattr(os, 'getuid') and info.st_uid != os.getuid():
+        raise RuntimeError(f'OAuth cache directory {directory} is owned by another user')
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise RuntimeError(f'OAuth cache directory {directory} is writable by other users')
+
+
+class ProviderCache:
+    def __init__(self, directory, ttl=3600, timeout=3.0, session=None):
+        self.directory = directory
+        self.ttl = ttl
+        self.timeout = timeout
+        self._session = session
+        self._memory = {}
+        self._lock = threading.Lock()
+        self._refresher = None
+        self._refresher_pid = None
+        _private_directory(directory)
+
+    @property
+    def session(self):
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+        return self._session
+
+    def get(self, url):
+        """Return the JSON document at ``url``, fetching it only if nothing usable is cached."""
+        entry = self._memory.get(url)
+        if entry is None or self._is_stale(entry):
+            entry = self._read_file(url) or entry
+            if entry is not None:
+                self._memory[url] = entry
+        if entry is None:
+            entry = self._refresh(url)
+        elif self._is_stale(entry):
+            # Serve the stale copy now; the refresher will replace it shortly
+            self._ensure_refresher()
+        return entry['data']
+
+    def prime(self, client):
+        """Load cached discovery metadata and JWKS into an authlib client.
+
+        Afterwards authlib's load_server_metadata() and fetch_jwk_set() are
+        served from memory. An unknown ``kid`` still makes authlib refetch the
+        key set itself, so key rotation keeps working.
+        """
+        url = client._server_metadata_url
+        if not url:
+            return
+        metadata = dict(self.get(url))
+        if metadata.get('jwks_uri'):
+            metadata['jwks'] = self.get(metadata['jwks_uri'])
+        metadata['_loaded_at'] = time.time()
+        client.server_metadata.update(metadata)
+        self._ensure_refresher()
+
+    def _is_stale(self, entry):
+        return time.time() - entry['fetched_at'] > self.ttl
+
+    def _path(self, url):
+        return os.path.join(self.directory, hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+    def _read_file(self, url):
+        try:
+            with open(self._path(url), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _refresh(self, url):
+        resp = self.session.get(url, timeout=self.timeout)
+        resp.raise_for_status()
+        entry = {'fetched_at': time.time(), 'data': resp.json()}
+        # Write-then-rename so other workers never read a partial file (mkstemp creates it 0600)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self._path(url))
+        self._memory[url] = entry
+        return entry
+
+    def _claim(self, url):
+        """Take a short-lived cross-process lock so one worker refreshes each URL."""
+        lock_path = self._path(url) + '.lock'
+        try:
+            if time.time() - os.path.getmtime(lock_path) > self.timeout * 4:
+                os.remove(lock_path)
+        except OSError:
+            pass
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600))
+            return lock_path
+        except FileExistsError:
+            return None
+
+    def refresh_due(self):
+        """Refresh every known entry that is within 20% of its TTL."""
+        horizon = self.ttl * 0.8
+        for url in list(self._memory):
+            entry = self._read_file(url) or self._memory[url]
+            if time.time() - entry['fetched_at'] < horizon:
+                self._memory[url] = entry
+                continue
+            lock_path = self._claim(url)
+            if lock_path is None:
+                continue
+            try:
+                self._refresh(url)
+            except Exception as e:
+                print(f"[OAUTH] Metadata refresh failed for {url}: {e}")
+            finally:
+                os.remove(lock_path)
+
+    def _ensure_refresher(self):
+        if self._refresher is not None and self._refresher.is_alive() and self._refresher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._refresher is not None and self._refresher.is_alive() and self._refresher_pid == os.getpid():
+                return
+            self._refresher_pid = os.getpid()
+            self._refresher = threading.Thread(target=self._run_refresher, name='oauth-metadata', daemon=True)
+            self._refresher.start()
+
+    def _run_refresher(self):
+        interval = max(1.0, min(60.0, self.ttl / 10))
+        while True:
+            try:
+                self.refresh_due()
+            except Exception as e:
+                print(f"[OAUTH] Metadata refresher error: {e}")
+            time.sleep(interval)
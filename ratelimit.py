@@ -0,0 +1,257 @@
+"""Sliding-window rate limiting declared per route.
+
+Each limit keeps two fixed-window counters (current and previous) per key and
+weights the previous one by how much of it still overlaps the sliding window,
+which approximates a true sliding log in O(1) space. Counters live either in
+process memory (``memory://``) or in a small SQLite file shared by all workers
+on the host (``sqlite:///path/to/ratelimit.db``). A counter stops counting two
+of its own periods after its last hit, and is dropped once that has passed,
+so an hourly limit is never cleared early by per-minute traffic.
+
+Limits run before the view body, so rejected floods never reach the database
+or password hashing.
+"""
+import collections
+import functools
+import inspect
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from flask import current_app, jsonify, request, session
+
+import aio
+
+DEFAULT_MESSAGE = 'Too many requests. Please slow down and try again shortly.'
+# How often SQLiteStorage deletes expired counters
+PRUNE_INTERVAL = 60.0
+
+
+def _sliding_estimate(bucket, current, previous, now, period):
+    """Return (estimated hits in the window, counters rolled forward to now)."""
+    now_bucket = int(now // period)
+    if now_bucket != bucket:
+        previous = current if now_bucket == bucket + 1 else 0
+        current = 0
+        bucket = now_bucket
+    overlap = 1.0 - (now - bucket * period) / period
+    return previous * overlap + current, bucket, current, previous
+
+
+def _expires(bucket, period):
+    # Past the end of the next window the counter carries no weight
+    return (bucket + 2) * period
+
+
+def _retry_after(current, previous, limit, now, period, bucket):
+    """Whole seconds until the estimate drops below ``limit`` again."""
+    elapsed = now - bucket * period
+    if current < limit and previous > 0:
+        # The previous window decays away while this one is still open
+        wait = (1.0 - (limit - current) / previous) * period - elapsed
+    else:
+        # This window's hits carry over into the next one and decay there
+        wait = period - elapsed + max(0.0, 1.0 - limit / current) * period if current else period - elapsed
+    return max(1, math.floor(wait) + 1)
+
+
+class MemoryStorage:
+    """Per-process counters; enough for a single worker or development.
+
+    Counters are grouped by period and kept in last-hit order, so within a
+    group expiry order is hit order and pruning only ever looks at expired keys.
+    """
+
+    def __init__(self):
+        self._by_period = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, period, now):
+        with self._lock:
+            for group_period, group in self._by_period.items():
+                self._prune(group, group_period, now)
+            counters = self._by_period.setdefault(period, collections.OrderedDict())
+            bucket, current, previous = counters.pop(key, (int(now // period), 0, 0))
+            estimate, bucket, current, previous = _sliding_estimate(bucket, current, previous, now, period)
+            allowed = estimate < limit
+            if allowed:
+                current += 1
+            counters[key] = (bucket, current, previous)
+        return allowed, (0 if allowed else _retry_after(current, previous, limit, now, period, bucket))
+
+    @staticmethod
+    def _prune(counters, period, now):
+        while counters:
+            key, (bucket, _, _) = next(iter(counters.items()))
+            if _expires(bucket, period) > now:
+                break
+            del counters[key]
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(counters) for counters in self._by_period.values())
+
+    def reset(self):
+        with self._lock:
+            self._by_period.clear()
+
+
+class SQLiteStorage:
+    """Counters in a local SQLite file so every worker on the host shares them."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._next_prune = 0.0
+        connection = self._connect()
+        columns = {row[1] for row in connection.execute('PRAGMA table_info(rate_limit)')}
+        if columns and 'expires' not in columns:
+            # Counters are disposable, so an old table is simply replaced
+            connection.execute('DROP TABLE rate_limit')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS rate_limit ('
+            'key TEXT PRIMARY KEY, bucket INTEGER NOT NULL, '
+            'current INTEGER NOT NULL, previous INTEGER NOT NULL, expires REAL NOT NULL)'
+        )
+        connection.execute('CREATE INDEX IF NOT EXISTS ix_rate_limit_expires ON rate_limit (expires)')
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            # Counters are disposable; never wait on fsync for them
+            connection.execute('PRAGMA synchronous=OFF')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def hit(self, key, limit, period, now):
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT bucket, current, previous FROM rate_limit WHERE key = ?', (key,)
+            ).fetchone()
+            bucket, current, previous = row if row else (int(now // period), 0, 0)
+            estimate, bucket, current, previous = _sliding_estimate(bucket, current, previous, now, period)
+            allowed = estimate < limit
+            if allowed:
+                current += 1
+            connection.execute(
+                'INSERT OR REPLACE INTO rate_limit (key, bucket, current, previous, expires) VALUES (?, ?, ?, ?, ?)',
+                (key, bucket, current, previous, _expires(bucket, period)),
+            )
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        if now >= self._next_prune:
+            self._next_prune = now + PRUNE_INTERVAL
+            self.prune(now)
+        return allowed, (0 if allowed else _retry_after(current, previous, limit, now, period, bucket))
+
+    def prune(self, now):
+        """Delete counters that no longer carry any weight."""
+        self._connect().execute('DELETE FROM rate_limit WHERE expires <= ?', (now,))
+
+    def reset(self):
+        self._connect().execute('DELETE FROM rate_limit')
+
+
+def _storage_from_url(url):
+    if not url or url == 'memory://':
+        return MemoryStorage()
+    if url.startswith('sqlite:///'):
+        return SQLiteStorage(url[len('sqlite:///'):])
+    raise ValueError(f'Unsupported rate limit storage: {url}')
+
+
+def _client_ip():
+    return request.remote_addr or 'unknown'
+
+
+def _request_email():
+    email = None
+    if request.is_json:
+        payload = request.get_json(silent=True) or {}
+        email = payload.get('email') if isinstance(payload, dict) else None
+    if not email:
+        email = request.form.get('email') or request.args.get('email') or session.get('email_to_verify')
+    return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+
+def _session_user():
+    user_id = session.get('user_id')
+    return str(user_id) if user_id is not None else None
+
+
+KEY_FUNCS = {
+    'ip': _client_ip,
+    'email': _request_email,
+    'user': _session_user,
+}
+
+
+class RateLimiter:
+    def __init__(self, app=None):
+        self.storage = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RATELIMIT_ENABLED', True)
+        app.config.setdefault('RATELIMIT_STORAGE_URL', 'memory://')
+        self.storage = _storage_from_url(app.config['RATELIMIT_STORAGE_URL'])
+        app.extensions['ratelimit'] = self
+
+    def limit(self, count, per, by='ip', message=DEFAULT_MESSAGE, on_limit=None):
+        """Allow ``count`` requests per ``per`` seconds for each ``by`` key.
+
+        ``by`` is one of 'ip', 'email' or 'user'; requests with no value for
+        the key (e.g. no email in the body) are not counted. ``on_limit`` may
+        build a custom response from the retry-after seconds.
+        """
+        key_func = KEY_FUNCS[by]
+
+        def decorator(view):
+            scope = f'{view.__name__}:{by}:{count}/{per}'
+
+            def check():
+                if not current_app.config['RATELIMIT_ENABLED']:
+                    return None
+                identity = key_func()
+                if identity is None:
+                    return None
+                allowed, retry_after = self.storage.hit(f'{scope}:{identity}', count, per, time.time())
+                if allowed:
+                    return None
+                print(f"[RATELIMIT] {scope} exceeded for {identity}")
+                if on_limit is not None:
+                    response = current_app.make_response(on_limit(retry_after))
+                else:
+                    response = jsonify({'message': message})
+                    response.status_code = 429
+                response.headers['Retry-After'] = str(retry_after)
+                return response
+
+            if inspect.iscoroutinefunction(view):
+                @functools.wraps(view)
+                async def wrapper(*args, **kwargs):
+                    # SQLiteStorage blocks on the database file; keep it off the event loop
+                    limited = await aio.run_sync(check)
+                    return limited if limited is not None else await view(*args, **kwargs)
+            else:
+                @functools.wraps(view)
+                def wrapper(*args, **kwargs):
+                    limited = check()
+                    return limited if limited is not None else view(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def reset(self):
+        self.storage.reset()
@@ -0,0 +1,178 @@
+"""Hearts on secrets with write-behind counters.
+
+Who hearted what is a ``reaction`` row, unique per (user, secret), so double
+taps and races are settled by the database and never counted twice. Counting
+does not touch a shared row: each process keeps +1/-1 deltas in memory and a
+background thread folds them into ``reaction_count`` every
+REACTION_FLUSH_SECONDS, as one upsert per secret into one of SLOTS rows
+picked at random for that flush. A burst of hearts on a popular secret
+therefore costs one small write per flush, and workers flushing together
+rarely land on the same rows. (PIDs are no good as slots: they are often
+sequential or share residues, so workers would keep colliding.)
+
+Readers sum the slots for a whole page in one query and add the deltas still
+pending in their own process, so counts from other workers lag by at most one
+flush. ``flask recount-reactions`` rebuilds the counters from ``reaction``.
+"""
+import atexit
+import os
+import random
+import threading
+import time
+
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import Reaction, ReactionCount
+
+SLOTS = 16
+# Keeps IN lists well under SQLite's bound-parameter limit
+_CHUNK = 500
+
+
+def _upsert(dialect):
+    module = postgresql if dialect == 'postgresql' else sqlite
+    stmt = module.insert(ReactionCount)
+    return stmt.on_conflict_do_update(
+        index_elements=[ReactionCount.secret_id, ReactionCount.slot],
+        set_={'count': ReactionCount.count + stmt.excluded['count']}
+    )
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), _CHUNK):
+        yield ids[start:start + _CHUNK]
+
+
+class ReactionCounter:
+    def __init__(self, interval=2.0):
+        self.interval = interval
+        self._deltas = {}
+        # Deltas being written right now; still counted by readers until committed,
+        # and cleared under _lock in the same step as the commit
+        self._flushing = {}
+        self._engine = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def add(self, engine, secret_id, delta):
+        """Record ``delta`` hearts for a secret; written out by the next flush."""
+        if self.interval > 0:
+            self._ensure_worker()
+        with self._lock:
+            self._deltas[secret_id] = self._deltas.get(secret_id, 0) + delta
+            self._engine = engine
+        if self.interval <= 0:
+            self.flush()
+
+    def pending(self, secret_ids):
+        with self._lock:
+            return {secret_id: self._deltas.get(secret_id, 0) + self._flushing.get(secret_id, 0)
+                    for secret_id in secret_ids if secret_id in self._deltas or secret_id in self._flushing}
+
+    def flush(self):
+        """Write pending deltas to a random slot; on failure they are kept for the next try."""
+        with self._flush_lock:
+            with self._lock:
+                deltas, self._deltas = self._deltas, {}
+                self._flushing = deltas
+                engine = self._engine
+            slot = random.randrange(SLOTS)
+            rows = [{'secret_id': secret_id, 'slot': slot, 'count': delta}
+                    for secret_id, delta in deltas.items() if delta]
+            try:
+                if rows:
+                    with engine.connect() as connection:
+                        transaction = connection.begin()
+                        connection.execute(_upsert(engine.dialect.name), rows)
+                        # A reader that sees the committed rows must not add the deltas again
+                        with self._lock:
+                            transaction.commit()
+                            self._flushing = {}
+                else:
+                    with self._lock:
+                        self._flushing = {}
+            except Exception as e:
+                print(f"[REACTIONS] Flush of {len(rows)} counters failed: {e}")
+                with self._lock:
+                    for secret_id, delta in deltas.items():
+                        self._deltas[secret_id] = self._deltas.get(secret_id, 0) + delta
+                    self._flushing = {}
+
+    def _ensure_worker(self):
+        # Threads do not survive fork(), so pre-forked workers start their own
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                # Deltas inherited from the parent are the parent's to flush
+                self._deltas, self._flushing = {}, {}
+                self._flush_lock = threading.Lock()
+                atexit.register(self.flush)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='reaction-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+
+def react(connection, user_id, secret_id):
+    """Insert the user's heart; False if they had already hearted the secret."""
+    module = postgresql if connection.dialect.name == 'postgresql' else sqlite
+    result = connection.execute(
+        module.insert(Reaction).values(user_id=user_id, secret_id=secret_id).on_conflict_do_nothing()
+    )
+    return result.rowcount == 1
+
+
+def unreact(connection, user_id, secret_id):
+    """Remove the user's heart and return when it was given, or None if there was none."""
+    return connection.execute(
+        delete(Reaction).filter_by(user_id=user_id, secret_id=secret_id).returning(Reaction.created_at)
+    ).scalar()
+
+
+def counts(connection, counter, secret_ids):
+    """Approximate heart count per secret id: flushed slots plus this process's pending deltas."""
+    totals = {}
+    for chunk in _chunks(secret_ids):
+        totals.update(connection.execute(
+            select(ReactionCount.secret_id, func.sum(ReactionCount.count))
+            .where(ReactionCount.secret_id.in_(chunk))
+            .group_by(ReactionCount.secret_id)
+        ).all())
+    for secret_id, delta in counter.pending(secret_ids).items():
+        totals[secret_id] = totals.get(secret_id, 0) + delta
+    return {secret_id: max(0, totals.get(secret_id) or 0) for secret_id in secret_ids}
+
+
+def hearted_by(connection, user_id, secret_ids):
+    """Ids among ``secret_ids`` the user has hearted."""
+    hearted = set()
+    for chunk in _chunks(secret_ids):
+        hearted.update(connection.execute(
+            select(Reaction.secret_id).where(Reaction.user_id == user_id, Reaction.secret_id.in_(chunk))
+        ).scalars())
+    return hearted
+
+
+def recount(connection):
+    """Rebuild ``reaction_count`` from ``reaction``; returns the number of secrets with hearts.
+
+    Deltas still pending in running workers are added on top when they
+    flush, so run this with workers stopped for exact counts.
+    """
+    connection.execute(delete(ReactionCount))
+    result = connection.execute(insert(ReactionCount).from_select(
+        ['secret_id', 'slot', 'count'],
+        select(Reaction.secret_id, literal(0), func.count()).group_by(Reaction.secret_id)
+    ))
+    return result.rowcount
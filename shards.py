@@ -0,0 +1,264 @@
+"""Sharding of the ``secret`` table across several SQLite files.
+
+SQLite admits one writer per database file, so with SECRET_SHARDS=N (N > 1)
+secrets are spread over N files, the ``shard-0`` ... ``shard-{N-1}`` binds
+(SECRET_SHARD_URL, a template with ``{shard}``), and posts by different users
+commit in parallel. Users, auth tables and the archive stay on the primary
+database. A user's secrets all live on the shard picked by a jump consistent
+hash of their id, so timelines read one shard; the global feed and search
+read every shard and merge.
+
+Shard files cannot share an autoincrement counter, so ids come from blocks
+leased from ``secret_id_block`` on the primary: one primary write per
+ID_BLOCK_SIZE secrets per process. Ids are therefore globally unique and rows
+keep them when ``flask rebalance-shards`` moves them to another shard.
+
+With SECRET_SHARDS=1 (the default) ``secret`` lives on the primary as before.
+Changing the count only changes where new posts go; run
+``flask rebalance-shards --from-count OLD`` afterwards to move existing rows
+(including those in the primary table when sharding is first switched on).
+"""
+import datetime
+import os
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+
+import fulltext
+from extensions import db
+from models import Secret
+
+ID_BLOCK_SIZE = 1000
+
+_ID_BLOCK_DDL = text(
+    'CREATE TABLE IF NOT EXISTS secret_id_block ('
+    'id INTEGER PRIMARY KEY CHECK (id = 1), next_id INTEGER NOT NULL)'
+)
+
+# Raw values are copied as stored, so compressed content is moved without
+# being decoded and re-encoded
+_SELECT_BATCH = text(
+    'SELECT id, title, content, is_anonymous, created_at, user_id FROM secret '
+    'WHERE id > :after_id ORDER BY id LIMIT :batch_size'
+)
+_INSERT_ROW = text(
+    'INSERT INTO secret (id, title, content, is_anonymous, created_at, user_id) '
+    'VALUES (:id, :title, :content, :is_anonymous, :created_at, :user_id)'
+)
+
+
+def jump_hash(key, buckets):
+    """Lamping and Veach's jump consistent hash of an integer key into ``buckets``.
+
+    Growing from N to N+1 buckets moves only 1/(N+1) of the keys.
+    """
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_url(app, index):
+    """Database URL of shard ``index``; relative SQLite paths live in the instance folder."""
+    url = app.config['SECRET_SHARD_URL'].format(shard=index)
+    prefix = 'sqlite:///'
+    if url.startswith(prefix) and not os.path.isabs(url[len(prefix):]) and url[len(prefix):] != ':memory:':
+        url = prefix + os.path.join(app.instance_path, url[len(prefix):])
+    return url
+
+
+class IdAllocator:
+    """Hands out secret ids from blocks leased on the primary (hi/lo)."""
+
+    def __init__(self, block_size=ID_BLOCK_SIZE):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = self._end = 0
+        self._pid = None
+
+    def next_id(self, engine):
+        with self._lock:
+            # A block leased before fork() would be handed out by every worker
+            if self._next >= self._end or self._pid != os.getpid():
+                self._next = self._lease(engine)
+                self._end = self._next + self.block_size
+                self._pid = os.getpid()
+            value = self._next
+            self._next += 1
+            return value
+
+    def _lease(self, engine):
+        with engine.begin() as connection:
+            connection.execute(text('UPDATE secret_id_block SET next_id = next_id + :size WHERE id = 1'),
+                               {'size': self.block_size})
+            end = connection.execute(text('SELECT next_id FROM secret_id_block WHERE id = 1')).scalar()
+        if end is None:
+            raise RuntimeError('secret_id_block is missing; run `flask init-db`')
+        return end - self.block_size
+
+
+class SecretShards:
+    def __init__(self, app=None):
+        self.count = 1
+        self.ids = IdAllocator()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Add the shard binds; call before db.init_app."""
+        app.config.setdefault('SECRET_SHARDS', 1)
+        app.config.setdefault('SECRET_SHARD_URL', 'sqlite:///secrets-{shard}.db')
+        self.count = max(1, int(app.config['SECRET_SHARDS']))
+        if self.count > 1:
+            os.makedirs(app.instance_path, exist_ok=True)
+            binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+            for index in range(self.count):
+                binds[f'shard-{index}'] = shard_url(app, index)
+        app.extensions['secret_shards'] = self
+
+    @property
+    def sharded(self):
+        return self.count > 1
+
+    def engines(self):
+        """Engines holding the ``secret`` table, in shard order."""
+        if not self.sharded:
+            return [db.engine]
+        return [db.engines[f'shard-{index}'] for index in range(self.count)]
+
+    def index_for(self, user_id, count=None):
+        return jump_hash(int(user_id), count or self.count)
+
+    def engine_for(self, user_id):
+        return self.engines()[self.index_for(user_id)]
+
+    def prepare(self, values):
+        """Return ``(engine, values)`` for inserting a secret, with an id assigned when sharded."""
+        if self.sharded:
+            values = dict(values, id=self.ids.next_id(db.engine))
+        engine = self.engine_for(values['user_id'])
+        created_at = values.get('created_at')
+        if isinstance(created_at, datetime.datetime) and engine.dialect.name == 'sqlite':
+            # SQLAlchemy would always append .ffffff; store whole seconds the way
+            # CURRENT_TIMESTAMP does, so keyset comparisons on the text see one form
+            fmt = '%Y-%m-%d %H:%M:%S.%f' if created_at.microsecond else '%Y-%m-%d %H:%M:%S'
+            values = dict(values, created_at=db.literal(created_at.strftime(fmt), db.String))
+        return engine, values
+
+    def insert(self, values):
+        """Insert one secret on its shard and return ``(engine, id)``."""
+        engine, values = self.prepare(values)
+        with engine.begin() as connection:
+            result = connection.execute(Secret.__table__.insert().values(**values))
+        return engine, result.inserted_primary_key[0]
+
+    def install(self):
+        """Create the secret table, its indexes and search index on every shard.
+
+        Returns the number of shards whose search index was new and has been
+        backfilled. When sharded, also seeds the id allocator past every id
+        already in use.
+        """
+        created = 0
+        for engine in self.engines():
+            Secret.__table__.create(engine, checkfirst=True)
+            for index in Secret.__table__.indexes:
+                index.create(engine, checkfirst=True)
+            try:
+                with engine.begin() as connection:
+                    if fulltext.install(connection):
+                        fulltext.backfill(connection)
+                        created += 1
+            except Exception as e:
+                print(f"[MIGRATION] Search index setup failed on {engine.url}: {e}")
+        if self.sharded:
+            self._seed_ids()
+        return created
+
+    def _seed_ids(self):
+        # Ids handed out by autoincrement before sharding (or archived since) must never be reused
+        highest = max(self._max_id(engine) for engine in self._all_engines())
+        archived = db.engines['archive']
+        with archived.connect() as connection:
+            if archived.dialect.has_table(connection, 'secret_archive'):
+                highest = max(highest, connection.execute(text('SELECT MAX(id) FROM secret_archive')).scalar() or 0)
+        with db.engine.begin() as connection:
+            connection.execute(_ID_BLOCK_DDL)
+            current = connection.execute(text('SELECT next_id FROM secret_id_block WHERE id = 1')).scalar()
+            if current is None:
+                connection.execute(text('INSERT INTO secret_id_block (id, next_id) VALUES (1, :next_id)'),
+                                   {'next_id': highest + 1})
+            elif current <= highest:
+                connection.execute(text('UPDATE secret_id_block SET next_id = :next_id WHERE id = 1'),
+                                   {'next_id': highest + 1})
+
+    def _all_engines(self):
+        engines = self.engines()
+        return engines if db.engine in engines else [db.engine] + engines
+
+    @staticmethod
+    def _max_id(engine):
+        with engine.connect() as connection:
+            if not engine.dialect.has_table(connection, 'secret'):
+                return 0
+            return connection.execute(text('SELECT MAX(id) FROM secret')).scalar() or 0
+
+    def rebalance(self, app, from_count=1, batch_size=500, pause=0.0):
+        """Move every secret onto the shard its author maps to under the current count.
+
+        Scans the primary table and shards ``0 .. from_count - 1`` (which may
+        no longer be configured). Each batch is copied before it is deleted at
+        the source and a copy replaces any earlier one, so an interrupted run
+        is simply re-run; readers merge by id and never see a row twice.
+        Returns the number of rows moved.
+        """
+        targets = self.engines()
+        sources = self._all_engines()
+        extra = []
+        for index in range(self.count, from_count):
+            engine = create_engine(shard_url(app, index))
+            if os.path.exists(engine.url.database or ''):
+                extra.append(engine)
+            else:
+                engine.dispose()
+        moved = 0
+        try:
+            for source in sources + extra:
+                moved += self._drain(source, targets, batch_size, pause)
+        finally:
+            for engine in extra:
+                engine.dispose()
+        return moved
+
+    def _drain(self, source, targets, batch_size, pause):
+        with source.connect() as connection:
+            if not source.dialect.has_table(connection, 'secret'):
+                return 0
+        after_id = 0
+        moved = 0
+        while True:
+            with source.connect() as connection:
+                rows = connection.execute(_SELECT_BATCH, {'after_id': after_id, 'batch_size': batch_size}).all()
+            if not rows:
+                return moved
+            by_target = {}
+            for row in rows:
+                target = targets[self.index_for(row.user_id, len(targets))]
+                if target is not source:
+                    by_target.setdefault(target, []).append(row)
+            for target, batch in by_target.items():
+                ids = [row.id for row in batch]
+                with target.begin() as connection:
+                    connection.execute(Secret.__table__.delete().where(Secret.id.in_(ids)))
+                    connection.execute(_INSERT_ROW, [row._asdict() for row in batch])
+                with source.begin() as connection:
+                    connection.execute(Secret.__table__.delete().where(Secret.id.in_(ids)))
+                moved += len(batch)
+            after_id = rows[-1].id
+            if by_target:
+                print(f"[SHARDS] Moved {moved} secrets from {source.url.database} so far (up to id {after_id})")
+                if pause:
+                    time.sleep(pause)
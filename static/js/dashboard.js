@@ -1,48 +1,5 @@
 // Starry background animation
-const canvas = document.getElementById("stars");
-if (!canvas) {
-    console.log("No stars canvas found, skipping animation");
-} else {
-    const ctx = canvas.getContext("2d");
-
-function resizeCanvas() {
-    canvas.width = window.innerWidth;
-    canvas.height = window.innerHeight;
-}
-resizeCanvas();
-window.addEventListener("resize", resizeCanvas);
-
-let stars = [];
-for (let i = 0; i < 150; i++) {
-    stars.push({
-        x: Math.random() * canvas.width,
-        y: Math.random() * canvas.height,
-        radius: Math.random() * 1.5,
-        speed: Math.random() * 0.5 + 0.2,
-        opacity: Math.random() * 0.8 + 0.2
-    });
-}
-
-function animateStars() {
-    ctx.clearRect(0, 0, canvas.width, canvas.height);
-    
-    stars.forEach(star => {
-        ctx.globalAlpha = star.opacity;
-        ctx.fillStyle = "#fff";
-        ctx.beginPath();
-        ctx.arc(star.x, star.y, star.radius, 0, Math.PI * 2);
-        ctx.fill();
-        
-        star.y += star.speed;
-        if (star.y > canvas.height) {
-            star.y = 0;
-            star.x = Math.random() * canvas.width;
-        }
-    });
-    
-    requestAnimationFrame(animateStars);
-}
-animateStars();
+startStarfield();
 
 // Secret form handling
 const secretForm = document.getElementById('secretForm');
@@ -163,13 +120,66 @@ function createSecretCard(secret) {
                 </div>
             </div>
             <div class="secret-content">${escapeHtml(secret.content)}</div>
-            <div class="secret-date">
-                <i class="fas fa-clock"></i> ${date}
+            <div class="secret-footer">
+                <div class="secret-date">
+                    <i class="fas fa-clock"></i> ${date}
+                </div>
+                <button type="button" class="heart-button${secret.hearted ? ' hearted' : ''}" data-secret-id="${secret.id}"
+                        aria-pressed="${secret.hearted ? 'true' : 'false'}" title="${secret.hearted ? 'Remove heart' : 'Send a heart'}">
+                    <i class="${secret.hearted ? 'fas' : 'far'} fa-heart"></i>
+                    <span class="heart-count">${secret.hearts || 0}</span>
+                </button>
             </div>
         </div>
     `;
 }
 
+// Heart or un-heart a secret; the button updates right away and rolls back on failure
+async function toggleHeart(button) {
+    const hearted = button.classList.contains('hearted');
+    const countEl = button.querySelector('.heart-count');
+    const previousCount = parseInt(countEl.textContent, 10) || 0;
+
+    function render(isHearted, count) {
+        button.classList.toggle('hearted', isHearted);
+        button.setAttribute('aria-pressed', isHearted ? 'true' : 'false');
+        button.title = isHearted ? 'Remove heart' : 'Send a heart';
+        button.querySelector('i').className = `${isHearted ? 'fas' : 'far'} fa-heart`;
+        countEl.textContent = count;
+    }
+
+    render(!hearted, Math.max(0, previousCount + (hearted ? -1 : 1)));
+    button.disabled = true;
+    try {
+        const response = await fetch(`/api/secrets/${button.dataset.secretId}/heart`, {
+            method: hearted ? 'DELETE' : 'POST'
+        });
+        const result = await response.json();
+        if (response.ok) {
+            render(result.hearted, result.hearts);
+        } else {
+            render(hearted, previousCount);
+            showNotification(result.message || 'Could not save your heart', 'error');
+        }
+    } catch (error) {
+        render(hearted, previousCount);
+        showNotification('Network error. Please try again.', 'error');
+        console.error('❌ Heart error:', error);
+    } finally {
+        button.disabled = false;
+    }
+}
+
+const secretsFeed = document.getElementById('secretsFeed');
+if (secretsFeed) {
+    secretsFeed.addEventListener('click', function(e) {
+        const button = e.target.closest('.heart-button');
+        if (button && !button.disabled) {
+            toggleHeart(button);
+        }
+    });
+}
+
 // Utility function to escape HTML
 function escapeHtml(text) {
     const div = document.createElement('div');
@@ -238,4 +248,3 @@ document.addEventListener('DOMContentLoaded', loadSecrets);
 // Refresh secrets every 30 seconds
 setInterval(loadSecrets, 30000);
 
-} // Close the canvas check if statement
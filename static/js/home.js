@@ -9,40 +9,4 @@ if (toggle && navLinks) {
 }
 
 // Starry Background (only if canvas exists)
-const canvas = document.getElementById("stars");
-if (!canvas) {
-  console.log("No stars canvas found, skipping animation");
-} else {
-  const ctx = canvas.getContext("2d");
-
-function resizeCanvas() {
-  canvas.width = window.innerWidth;
-  canvas.height = window.innerHeight;
-}
-resizeCanvas();
-window.addEventListener("resize", resizeCanvas);
-
-let stars = [];
-for (let i = 0; i < 200; i++) {
-  stars.push({
-    x: Math.random() * canvas.width,
-    y: Math.random() * canvas.height,
-    radius: Math.random() * 1.5,
-    speed: Math.random() * 0.5 + 0.2
-  });
-}
-
-function animateStars() {
-  ctx.clearRect(0, 0, canvas.width, canvas.height);
-  ctx.fillStyle = "#fff";
-  stars.forEach(star => {
-    ctx.beginPath();
-    ctx.arc(star.x, star.y, star.radius, 0, Math.PI * 2);
-    ctx.fill();
-    star.y += star.speed;
-    if (star.y > canvas.height) star.y = 0;
-  });
-  requestAnimationFrame(animateStars);
-}
-animateStars();
-}
+startStarfield({ count: 200, twinkle: false });
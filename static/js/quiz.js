@@ -1,45 +1,5 @@
-// Starry background animation (reused from dashboard)
-const canvas = document.getElementById("stars");
-const ctx = canvas.getContext("2d");
-
-function resizeCanvas() {
-    canvas.width = window.innerWidth;
-    canvas.height = window.innerHeight;
-}
-resizeCanvas();
-window.addEventListener("resize", resizeCanvas);
-
-let stars = [];
-for (let i = 0; i < 150; i++) {
-    stars.push({
-        x: Math.random() * canvas.width,
-        y: Math.random() * canvas.height,
-        radius: Math.random() * 1.5,
-        speed: Math.random() * 0.5 + 0.2,
-        opacity: Math.random() * 0.8 + 0.2
-    });
-}
-
-function animateStars() {
-    ctx.clearRect(0, 0, canvas.width, canvas.height);
-
-    stars.forEach(star => {
-        ctx.globalAlpha = star.opacity;
-        ctx.fillStyle = "#fff";
-        ctx.beginPath();
-        ctx.arc(star.x, star.y, star.radius, 0, Math.PI * 2);
-        ctx.fill();
-
-        star.y += star.speed;
-        if (star.y > canvas.height) {
-            star.y = 0;
-            star.x = Math.random() * canvas.width;
-        }
-    });
-
-    requestAnimationFrame(animateStars);
-}
-animateStars();
+// Starry background animation
+startStarfield();
 
 // Quiz functionality
 class CosmicQuiz {
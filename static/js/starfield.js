@@ -0,0 +1,52 @@
+// Starry background animation shared by every page with a #stars canvas
+function startStarfield(options = {}) {
+    const canvas = document.getElementById("stars");
+    if (!canvas) {
+        console.log("No stars canvas found, skipping animation");
+        return;
+    }
+    const ctx = canvas.getContext("2d");
+    const count = options.count || 150;
+    const twinkle = options.twinkle !== false;
+
+    function resizeCanvas() {
+        canvas.width = window.innerWidth;
+        canvas.height = window.innerHeight;
+    }
+    resizeCanvas();
+    window.addEventListener("resize", resizeCanvas);
+
+    let stars = [];
+    for (let i = 0; i < count; i++) {
+        stars.push({
+            x: Math.random() * canvas.width,
+            y: Math.random() * canvas.height,
+            radius: Math.random() * 1.5,
+            speed: Math.random() * 0.5 + 0.2,
+            opacity: twinkle ? Math.random() * 0.8 + 0.2 : 1
+        });
+    }
+
+    function animateStars() {
+        ctx.clearRect(0, 0, canvas.width, canvas.height);
+        ctx.fillStyle = "#fff";
+
+        stars.forEach(star => {
+            ctx.globalAlpha = star.opacity;
+            ctx.beginPath();
+            ctx.arc(star.x, star.y, star.radius, 0, Math.PI * 2);
+            ctx.fill();
+
+            star.y += star.speed;
+            if (star.y > canvas.height) {
+                star.y = 0;
+                if (twinkle) {
+                    star.x = Math.random() * canvas.width;
+                }
+            }
+        });
+
+        requestAnimationFrame(animateStars);
+    }
+    animateStars();
+}
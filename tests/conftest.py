@@ -0,0 +1,46 @@
+import pytest
+
+from app import create_app, init_database
+from extensions import db
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """Build the app on throwaway databases under ``tmp_path``; keyword arguments override config."""
+    monkeypatch.setenv('OAUTH_CACHE_DIR', str(tmp_path / 'oauth-cache'))
+    monkeypatch.setenv('CONTENT_DICT_DIR', str(tmp_path / 'content-dicts'))
+    monkeypatch.setenv('DEMO_MODE', 'true')
+    apps = []
+
+    def make(**config):
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'users.db'}",
+            'SQLALCHEMY_BINDS': {'archive': f"sqlite:///{tmp_path / 'archive.db'}"},
+            'SECRET_SHARD_URL': f"sqlite:///{tmp_path}/secrets-{{shard}}.db",
+            'RATELIMIT_ENABLED': False,
+            'WRITE_BATCH_WINDOW_MS': 0,
+            'REACTION_FLUSH_SECONDS': 0,
+            'PAGE_CACHE_ENABLED': False,
+            **config,
+        })
+        with app.app_context():
+            init_database()
+        apps.append(app)
+        return app
+
+    yield make
+    for app in apps:
+        with app.app_context():
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+    # init_app registers a metadata per bind on the shared ``db``; drop the shard
+    # ones so create_all in the next test's unsharded app does not look for them
+    for key in [key for key in db.metadatas if key and key.startswith('shard-')]:
+        del db.metadatas[key]
+
+
+def login(client, user_id):
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
@@ -0,0 +1,34 @@
+"""Translating ASGI scopes into WSGI environs."""
+import importlib
+
+import pytest
+
+
+@pytest.fixture
+def asgi(tmp_path, monkeypatch):
+    # Importing the module builds the app, so point it at throwaway databases
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'users.db'}")
+    monkeypatch.setenv('ARCHIVE_DATABASE_URL', f"sqlite:///{tmp_path / 'archive.db'}")
+    monkeypatch.setenv('SECRET_SHARD_URL', f"sqlite:///{tmp_path}/secrets-{{shard}}.db")
+    monkeypatch.setenv('OAUTH_CACHE_DIR', str(tmp_path / 'oauth-cache'))
+    monkeypatch.setenv('CONTENT_DICT_DIR', str(tmp_path / 'content-dicts'))
+    return importlib.import_module('asgi')
+
+
+def scope(headers):
+    return {'type': 'http', 'method': 'GET', 'path': '/api/secrets', 'query_string': b'limit=5',
+            'http_version': '1.1', 'headers': [(name.encode(), value.encode()) for name, value in headers]}
+
+
+def test_repeated_cookie_headers_join_as_one_cookie_header(asgi):
+    environ = asgi._environ(scope([('cookie', 'session=abc'), ('cookie', 'theme=dark'),
+                                   ('accept', 'text/html'), ('accept', 'application/json')]), None)
+    assert environ['HTTP_COOKIE'] == 'session=abc; theme=dark'
+    assert environ['HTTP_ACCEPT'] == 'text/html,application/json'
+    assert environ['QUERY_STRING'] == 'limit=5' and environ['PATH_INFO'] == '/api/secrets'
+
+
+def test_content_headers_are_not_prefixed(asgi):
+    environ = asgi._environ(scope([('content-type', 'application/json'), ('content-length', '2')]), None)
+    assert environ['CONTENT_TYPE'] == 'application/json' and environ['CONTENT_LENGTH'] == '2'
+    assert 'HTTP_CONTENT_TYPE' not in environ
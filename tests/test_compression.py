@@ -0,0 +1,120 @@
+"""Negotiated response compression and the JSON provider."""
+import datetime
+import gzip
+import json
+import zlib
+
+import pytest
+from flask import Flask, Response, jsonify
+from flask.json.provider import DefaultJSONProvider
+
+import compression
+import json_provider
+from compression import CompressionMiddleware
+
+
+def names(encoders):
+    return [(name, None) for name in encoders]
+
+
+@pytest.mark.parametrize('accept, expected', [
+    ('gzip, br;q=0.5', 'gzip'),
+    ('gzip, br', 'br'),
+    ('zstd;q=0.2, gzip;q=0.9', 'gzip'),
+    ('*', 'zstd'),
+    ('gzip;q=0, identity', None),
+    ('', None),
+])
+def test_negotiate_honours_q_values_then_server_order(accept, expected):
+    choice = compression.negotiate(accept, names(['zstd', 'br', 'gzip']))
+    assert (choice[0] if choice else None) == expected
+
+
+def make_app(**options):
+    app = Flask(__name__)
+    payload = {'items': [{'id': i, 'title': f'secret number {i}'} for i in range(200)]}
+
+    @app.route('/big')
+    def big():
+        return jsonify(payload)
+
+    @app.route('/small')
+    def small():
+        return jsonify({'ok': True})
+
+    @app.route('/stream')
+    def stream():
+        return Response((f'{{"line": {i}}}\n' for i in range(500)), mimetype='application/x-ndjson')
+
+    @app.route('/tagged')
+    def tagged():
+        response = jsonify(payload)
+        response.set_etag('abc')
+        return response
+
+    @app.route('/image')
+    def image():
+        return Response(b'\x89PNG' + b'\x00' * 4096, mimetype='image/png')
+
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app, encoders=[('gzip', compression._Gzip)], **options)
+    return app, payload
+
+
+def test_buffered_body_is_compressed_with_exact_length():
+    app, payload = make_app()
+    response = app.test_client().get('/big', headers={'Accept-Encoding': 'gzip'})
+    body = response.get_data()
+    assert response.headers['Content-Encoding'] == 'gzip' and response.headers['Vary'] == 'Accept-Encoding'
+    assert int(response.headers['Content-Length']) == len(body)
+    assert json.loads(gzip.decompress(body)) == payload
+
+
+def test_streamed_body_is_compressed_incrementally():
+    app, _ = make_app(min_size=0)
+    response = app.test_client().get('/stream', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Length' not in response.headers
+    decoder = zlib.decompressobj(31)
+    lines = []
+    for chunk in response.response:
+        # Each chunk is flushed, so it decodes on its own
+        lines.extend(decoder.decompress(chunk).decode().splitlines())
+    assert lines == [f'{{"line": {i}}}' for i in range(500)]
+
+
+def test_what_is_left_alone():
+    app, _ = make_app()
+    client = app.test_client()
+    assert 'Content-Encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+    assert 'Content-Encoding' not in client.get('/image', headers={'Accept-Encoding': 'gzip'}).headers
+    assert 'Content-Encoding' not in client.get('/big').headers
+    assert 'Content-Encoding' not in client.head('/big', headers={'Accept-Encoding': 'gzip'}).headers
+
+
+def test_compressed_strong_etag_becomes_weak():
+    app, _ = make_app()
+    response = app.test_client().get('/tagged', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['ETag'] == 'W/"abc"'
+
+
+def test_api_responses_are_negotiated(make_app):
+    app = make_app(COMPRESS_ENABLED=True, COMPRESS_MIN_SIZE=0, DEDUP_ENABLED=False)
+    response = app.test_client().get('/api/secrets', headers={'Accept-Encoding': 'gzip;q=1, br;q=0'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert isinstance(json.loads(gzip.decompress(response.get_data())), list)
+
+
+def test_orjson_provider_matches_the_default_output():
+    pytest.importorskip('orjson')
+    app = Flask(__name__)
+    value = {'b': [1, 2.5, None], 'a': {'when': datetime.datetime(2024, 5, 1, 12, 30), 'text': 'é ✨'}}
+    fast, default = json_provider.OrjsonProvider(app), DefaultJSONProvider(app)
+    assert json.loads(fast.dumps(value)) == json.loads(default.dumps(value))
+    assert list(json.loads(fast.dumps(value))) == ['a', 'b']
+    assert fast.dumps(value, indent=2) == default.dumps(value, indent=2)
+
+
+def test_provider_names():
+    app = Flask(__name__)
+    assert type(json_provider.provider_for(app, 'stdlib')) is DefaultJSONProvider
+    with pytest.raises(ValueError):
+        json_provider.provider_for(app, 'simplejson')
@@ -0,0 +1,214 @@
+"""Duplicate filtering of new secrets: who a repeat counts against, and the quarantine queue."""
+import datetime
+
+import pytest
+from sqlalchemy import create_engine, insert, select
+
+import dedup
+from app import dedup_secrets_command, quarantined_secrets_command, secret_shards
+from conftest import login
+from extensions import db
+from models import (QuarantinedSecret, Reaction, ReactionCount, Secret, SecretFingerprint, SecretScore,
+                    TrendingSecret, User)
+
+SHORT = 'i miss my dad'
+LONG = ('Every night I leave the porch light on for my brother, even though he moved across the country '
+        'three years ago and never once said he was coming back.')
+
+
+def users(app):
+    with app.app_context():
+        return [user.id for user in User.query.order_by(User.id).limit(2)]
+
+
+def post(client, user_id, content, title='A secret'):
+    login(client, user_id)
+    return client.post('/api/secrets', json={'title': title, 'content': content})
+
+
+def test_short_repeat_only_counts_against_its_author(make_app):
+    app = make_app()
+    alice, bob = users(app)
+    client = app.test_client()
+    assert post(client, alice, SHORT).status_code == 201
+    # The same short line from someone else is an independent post
+    assert post(client, bob, SHORT.upper() + '!').status_code == 201
+    assert post(client, alice, SHORT).status_code == 409
+
+
+def test_long_repeat_counts_across_authors(make_app):
+    app = make_app()
+    alice, bob = users(app)
+    client = app.test_client()
+    assert post(client, alice, LONG).status_code == 201
+    assert post(client, bob, LONG).status_code == 409
+    assert post(client, bob, LONG.replace('three', 'four')).status_code == 409
+
+
+def test_match_scoping_in_memory():
+    index = dedup.DuplicateFilter(window_minutes=60, cross_user_min_chars=80)
+    index.add(1, 10, 1000.0, dedup.fingerprint(SHORT))
+    index.add(2, 10, 1000.0, dedup.fingerprint(LONG))
+    assert index.match(dedup.fingerprint(SHORT), 20) is None
+    assert index.match(dedup.fingerprint(SHORT), 10) == dedup.Match('exact', 1, 1.0)
+    assert index.match(dedup.fingerprint(LONG), 20) == dedup.Match('exact', 2, 1.0)
+
+
+def test_quarantined_secret_can_be_released_or_discarded(make_app):
+    app = make_app(DEDUP_ACTION='quarantine')
+    alice, bob = users(app)
+    client = app.test_client()
+    assert post(client, alice, LONG).status_code == 201
+    assert post(client, bob, LONG, title='first copy').status_code == 202
+    assert post(client, bob, LONG + ' Really.', title='second copy').status_code == 202
+
+    runner = app.test_cli_runner()
+    listing = runner.invoke(quarantined_secrets_command)
+    assert listing.exit_code == 0 and 'first copy' in listing.output and '2 secrets held' in listing.output
+    with app.app_context():
+        held = {row.title: row.id for row in db.session.execute(db.select(QuarantinedSecret)).scalars()}
+
+    result = runner.invoke(quarantined_secrets_command,
+                           ['--release', str(held['first copy']), '--discard', str(held['second copy'])])
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        assert db.session.execute(db.select(QuarantinedSecret)).first() is None
+        released = [row for engine in secret_shards.engines()
+                    for row in db.session.execute(db.select(Secret).filter_by(title='first copy'),
+                                                  bind_arguments={'bind': engine}).scalars()]
+        assert [(row.user_id, row.content) for row in released] == [(bob, LONG)]
+
+    missing = runner.invoke(quarantined_secrets_command, ['--discard', '999'])
+    assert missing.exit_code != 0
+
+
+def test_backfill_drops_hearts_and_trending_of_quarantined_secrets(make_app):
+    app = make_app(DEDUP_ENABLED=False)
+    alice, bob = users(app)
+    with app.app_context():
+        _, original = secret_shards.insert({'title': 'original', 'content': LONG, 'user_id': alice})
+        _, repeat = secret_shards.insert({'title': 'repeat', 'content': LONG, 'user_id': bob})
+    client = app.test_client()
+    login(client, alice)
+    for secret_id in (original, repeat):
+        assert client.post(f'/api/secrets/{secret_id}/heart').status_code == 201
+    with app.app_context():
+        app.extensions['trending'].refresh(db.engine)
+
+    result = app.test_cli_runner().invoke(dedup_secrets_command)
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        assert db.session.execute(db.select(QuarantinedSecret.secret_id)).scalars().all() == [repeat]
+        for model in (Reaction, ReactionCount, SecretScore, TrendingSecret):
+            remaining = set(db.session.execute(db.select(model.secret_id)).scalars())
+            assert repeat not in remaining and original in remaining, model.__name__
+    page = client.get('/api/secrets?sort=trending').get_json()
+    assert [item['id'] for item in page['secrets']] == [original]
+
+
+def test_normalize_folds_case_width_and_punctuation():
+    assert dedup.normalize('  I MISS\tmy   Dad!!! ') == 'i miss my dad'
+    assert dedup.normalize('ﬁne — Ｆine_fine') == 'fine fine fine'
+
+
+def test_fingerprint_ignores_formatting_and_skips_signature_for_short_texts():
+    short = dedup.fingerprint(SHORT)
+    assert short.slots is None and short.length == len(SHORT)
+    assert dedup.fingerprint('I miss my DAD...').digest == short.digest
+    assert len(dedup.fingerprint(LONG).slots) == dedup.SIGNATURE_SLOTS
+
+
+def similarity(a, b):
+    return sum(x == y for x, y in zip(dedup.fingerprint(a).slots, dedup.fingerprint(b).slots)) / dedup.SIGNATURE_SLOTS
+
+
+def test_signature_estimates_similarity():
+    assert similarity(LONG, LONG) == 1.0
+    assert similarity(LONG, LONG.replace('three', 'four')) >= 0.8
+    other = ('The first thing I do every morning is check whether my old phone still has her voicemail on it, '
+             'and it always does, and I never delete it.')
+    assert similarity(LONG, other) < 0.3
+
+
+def test_near_match_and_expiry():
+    index = dedup.DuplicateFilter(window_minutes=1, max_entries=2)
+    index.add(1, 10, 1000.0, dedup.fingerprint(LONG))
+    match = index.match(dedup.fingerprint(LONG.replace('brother', 'sister')), 20)
+    assert match.kind == 'near' and match.secret_id == 1 and match.similarity >= 0.8
+
+    index.expire(1061.0)
+    assert index.match(dedup.fingerprint(LONG), 20) is None
+    assert not index._exact and not index._buckets and not index._by_secret
+
+    # Over max_entries the oldest go first
+    for secret_id in (2, 3, 4):
+        index.add(secret_id, 10, 2000.0 + secret_id, dedup.fingerprint(f'{LONG} {secret_id}'))
+    index.expire(2005.0)
+    assert sorted(index._by_secret) == [3, 4]
+
+
+@pytest.fixture
+def fingerprint_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fingerprints.db'}")
+    SecretFingerprint.__table__.create(engine)
+    yield engine
+    engine.dispose()
+
+
+def record(engine, secret_id, content, created_at, row_id=None):
+    fp = dedup.fingerprint(content)
+    values = {'secret_id': secret_id, 'user_id': 10, 'digest': fp.digest, 'signature': dedup._pack(fp.slots),
+              'created_at': created_at}
+    if row_id is not None:
+        values['id'] = row_id
+    with engine.begin() as connection:
+        connection.execute(insert(SecretFingerprint).values(**values))
+
+
+def test_sync_sees_rows_that_commit_out_of_id_order(fingerprint_engine):
+    index = dedup.DuplicateFilter(window_minutes=60)
+    record(fingerprint_engine, 1, LONG, 1000.0, row_id=5)
+    with fingerprint_engine.connect() as connection:
+        assert index.check(connection, dedup.fingerprint(LONG), 20, now=1001.0).secret_id == 1
+    # Stamped a moment earlier but visible only now, with a lower id
+    record(fingerprint_engine, 2, SHORT, 999.0, row_id=3)
+    with fingerprint_engine.connect() as connection:
+        assert index.check(connection, dedup.fingerprint(SHORT), 10, now=1002.0).secret_id == 2
+
+
+def test_remember_keeps_fingerprints_that_failed_to_record(tmp_path, fingerprint_engine):
+    index = dedup.DuplicateFilter(window_minutes=60)
+    broken = create_engine(f"sqlite:///{tmp_path / 'empty.db'}")
+    assert index.remember(broken, 1, 10, dedup.fingerprint(LONG), now=1000.0) is False
+    assert index.match(dedup.fingerprint(LONG), 20).secret_id == 1
+
+    assert index.remember(fingerprint_engine, 2, 10, dedup.fingerprint(SHORT), now=1001.0) is True
+    with fingerprint_engine.connect() as connection:
+        assert sorted(connection.execute(select(SecretFingerprint.secret_id)).scalars()) == [1, 2]
+    broken.dispose()
+
+
+def test_backfill_quarantines_repeats_within_the_window(make_app):
+    app = make_app(DEDUP_ENABLED=False)
+    alice, bob = users(app)
+    # After the demo secrets, so ids follow posting time as they do in production
+    start = datetime.datetime.now(datetime.UTC).replace(tzinfo=None, microsecond=0) + datetime.timedelta(days=1)
+    posts = [('original', alice, LONG, 0), ('copy', bob, LONG, 30), ('much later', bob, LONG, 200),
+             ('own short', alice, SHORT, 1), ('short by another', bob, SHORT, 2)]
+    ids = {}
+    with app.app_context():
+        for title, user_id, content, minutes in posts:
+            _, ids[title] = secret_shards.insert({'title': title, 'content': content, 'user_id': user_id,
+                                                  'created_at': start + datetime.timedelta(minutes=minutes)})
+        now = start.replace(tzinfo=datetime.UTC).timestamp() + 210 * 60
+
+        scanned, quarantined, fingerprinted = dedup.backfill(db.engine, secret_shards.engines(), now=now,
+                                                             dry_run=True)
+        assert quarantined == 1 and fingerprinted == 0
+        assert db.session.execute(db.select(QuarantinedSecret)).first() is None
+
+        scanned, quarantined, fingerprinted = dedup.backfill(db.engine, secret_shards.engines(), now=now)
+        assert quarantined == 1
+        assert db.session.execute(db.select(QuarantinedSecret.secret_id)).scalars().all() == [ids['copy']]
+        # Only 'much later' is still inside the window as of now
+        assert db.session.execute(db.select(SecretFingerprint.secret_id)).scalars().all() == [ids['much later']]
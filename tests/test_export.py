@@ -0,0 +1,93 @@
+"""Streaming NDJSON export of secrets."""
+import datetime
+import gzip
+import json
+
+import pytest
+from sqlalchemy import event
+
+import archive
+import export
+from app import export_secrets_command, secret_shards
+from conftest import login
+from extensions import db
+from models import User
+
+
+@pytest.fixture(params=[1, 3], ids=['single', 'sharded'])
+def app(request, make_app):
+    app = make_app(SECRET_SHARDS=request.param, ARCHIVE_AFTER_DAYS=30, DEDUP_ENABLED=False)
+    with app.app_context():
+        users = User.query.order_by(User.id).all()
+        old = datetime.datetime.now(datetime.UTC).replace(tzinfo=None) - datetime.timedelta(days=90)
+        for i in range(6):
+            secret_shards.insert({'title': f'old {i}', 'content': f'from long ago {i} ' * 20, 'is_anonymous': i == 0,
+                                  'user_id': users[0].id, 'created_at': old + datetime.timedelta(hours=i)})
+        secret_shards.insert({'title': 'recent', 'content': 'just now', 'user_id': users[0].id})
+        archive.archive_before(old + datetime.timedelta(days=1), engines=secret_shards.engines())
+    return app
+
+
+def user(app, index=0):
+    with app.app_context():
+        found = User.query.order_by(User.id).all()[index]
+        return found.id, found.username
+
+
+def test_own_export_lists_archived_then_hot_secrets(app):
+    user_id, username = user(app)
+    client = app.test_client()
+    assert client.get('/api/me/export').status_code == 401
+    login(client, user_id)
+    response = client.get('/api/me/export')
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    titles = [row['title'] for row in rows]
+    # Archived rows come first; all six old ones moved except the newest secret on its shard
+    assert titles[:5] == [f'old {i}' for i in range(5)]
+    assert {'old 5', 'recent'} <= set(titles[5:])
+    assert rows[0]['author'] == 'Anonymous' and rows[1]['author'] == username
+    assert rows[1]['content'] == 'from long ago 1 ' * 20
+
+    zipped = client.get('/api/me/export?gzip=1')
+    assert zipped.mimetype == 'application/gzip'
+    assert gzip.decompress(zipped.get_data()).decode() == response.get_data(as_text=True)
+
+
+def test_export_reads_one_chunk_at_a_time(app):
+    user_id, _ = user(app)
+    with app.app_context():
+        statements = []
+
+        def listener(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engines = secret_shards.engines()
+        for engine in {*engines, db.engine}:
+            event.listen(engine, 'before_cursor_execute', listener)
+        rows = export.iter_rows(db.engine, user_id=user_id, chunk_size=2, secret_engines=[secret_shards.engine_for(user_id)])
+        first = next(rows)
+        read_before = len(statements)
+        rest = list(rows)
+        for engine in {*engines, db.engine}:
+            event.remove(engine, 'before_cursor_execute', listener)
+    ids = [first['id']] + [row['id'] for row in rest]
+    assert ids == sorted(ids) and len(ids) == len(set(ids))
+    assert read_before <= 2 and len(statements) > read_before
+
+
+def test_cli_export_of_one_user_and_of_everyone(app, tmp_path):
+    _, username = user(app)
+    runner = app.test_cli_runner()
+    output = tmp_path / 'mine.ndjson.gz'
+    result = runner.invoke(export_secrets_command, ['--user', username, '--gzip', '--output', str(output)])
+    assert result.exit_code == 0, result.output
+    mine = [json.loads(line) for line in gzip.decompress(output.read_bytes()).decode().splitlines()]
+    assert {row['title'] for row in mine} >= {f'old {i}' for i in range(6)} | {'recent'}
+
+    everyone = runner.invoke(export_secrets_command, ['--chunk-size', '3'])
+    assert everyone.exit_code == 0
+    exported = [json.loads(line) for line in everyone.output.splitlines() if line.startswith('{')]
+    assert len(exported) > len(mine) and len({row['id'] for row in exported}) == len(exported)
+
+    assert runner.invoke(export_secrets_command, ['--user', 'nobody-here']).exit_code != 0
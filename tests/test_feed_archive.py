@@ -0,0 +1,79 @@
+"""The global feed falls through to the archive, and archive-secrets never archives past what it reads."""
+import datetime
+
+import pytest
+
+import archive
+from app import archive_secrets_command, secret_shards
+from extensions import db
+from models import ArchivedSecret, Secret, User
+
+
+@pytest.fixture(params=[1, 3], ids=['single', 'sharded'])
+def app(request, make_app):
+    app = make_app(SECRET_SHARDS=request.param, ARCHIVE_AFTER_DAYS=30, DEDUP_ENABLED=False)
+    with app.app_context():
+        users = User.query.all()
+        old = datetime.datetime.now(datetime.UTC).replace(tzinfo=None, microsecond=0) - datetime.timedelta(days=60)
+        for i in range(12):
+            secret_shards.insert({
+                'title': f'old secret {i}',
+                'content': f'written long ago, number {i}',
+                'is_anonymous': i % 3 == 0,
+                'user_id': users[i % len(users)].id,
+                'created_at': old + datetime.timedelta(hours=i),
+            })
+        cutoff = datetime.datetime.now(datetime.UTC).replace(tzinfo=None) - datetime.timedelta(days=30)
+        assert archive.archive_before(cutoff, engines=secret_shards.engines()) > 0
+    return app
+
+
+def test_global_feed_pages_past_archive_boundary(app):
+    with app.app_context():
+        hot = [row.id for engine in secret_shards.engines()
+               for row in db.session.execute(db.select(Secret), bind_arguments={'bind': engine}).scalars()]
+        archived = {row.id: row for row in db.session.execute(db.select(ArchivedSecret)).scalars()}
+        usernames = dict(db.session.execute(db.select(User.id, User.username)).all())
+    assert archived
+
+    client = app.test_client()
+    seen, cursor = [], None
+    while True:
+        query = {'limit': 4} if cursor is None else {'limit': 4, 'cursor': cursor}
+        body = client.get('/api/secrets', query_string=query).get_json()
+        seen.extend(body['secrets'])
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+
+    ids = [item['id'] for item in seen]
+    assert len(ids) == len(set(ids))
+    assert set(ids) == set(hot) | set(archived)
+    keys = [(item['created_at'], item['id']) for item in seen]
+    assert keys == sorted(keys, reverse=True)
+    for item in seen:
+        if item['id'] in archived:
+            row = archived[item['id']]
+            assert item['author'] == ('Anonymous' if row.is_anonymous else usernames[row.user_id])
+
+
+def test_bare_list_includes_archived_secrets(app):
+    with app.app_context():
+        archived = set(db.session.execute(db.select(ArchivedSecret.id)).scalars())
+    body = app.test_client().get('/api/secrets').get_json()
+    ids = [item['id'] for item in body]
+    assert archived <= set(ids) and len(ids) == len(set(ids))
+    keys = [(item['created_at'], item['id']) for item in body]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_archive_secrets_refuses_cutoffs_the_feeds_do_not_read(make_app):
+    runner = make_app(ARCHIVE_AFTER_DAYS=0, DEDUP_ENABLED=False).test_cli_runner()
+    result = runner.invoke(archive_secrets_command, ['--older-than-days', '60'])
+    assert result.exit_code != 0 and 'ARCHIVE_AFTER_DAYS' in result.output
+
+    runner = make_app(ARCHIVE_AFTER_DAYS=30, DEDUP_ENABLED=False).test_cli_runner()
+    result = runner.invoke(archive_secrets_command, ['--older-than-days', '7'])
+    assert result.exit_code != 0 and 'at least' in result.output
+    assert runner.invoke(archive_secrets_command, ['--older-than-days', '60']).exit_code == 0
+    assert runner.invoke(archive_secrets_command).exit_code == 0
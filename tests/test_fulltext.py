@@ -0,0 +1,49 @@
+"""Search indexing through the secret_text() triggers, and writers that lack the function."""
+import sqlite3
+
+import pytest
+
+from app import search_backfill_command, search_drop_triggers_command, secret_shards
+from conftest import login
+from models import User
+
+
+def search(client, query):
+    return [item['title'] for item in client.get('/api/secrets/search', query_string={'q': query}).get_json()['results']]
+
+
+def test_compressed_secrets_are_indexed_as_plain_text(make_app):
+    app = make_app(DEDUP_ENABLED=False, CONTENT_COMPRESS_MIN_BYTES=16)
+    with app.app_context():
+        user_id = User.query.first().id
+    client = app.test_client()
+    login(client, user_id)
+    content = 'The lighthouse keeper never told anyone about the letters. ' * 3
+    assert client.post('/api/secrets', json={'title': 'Letters', 'content': content}).status_code == 201
+    assert search(client, 'lighthouse') == ['Letters']
+    assert search(client, 'lightho') == ['Letters']
+
+
+def test_outside_writers_drop_the_triggers_and_backfill_afterwards(make_app):
+    app = make_app(DEDUP_ENABLED=False)
+    runner = app.test_cli_runner()
+    with app.app_context():
+        path = secret_shards.engines()[0].url.database
+        user_id = User.query.first().id
+    insert = ("INSERT INTO secret (title, content, is_anonymous, user_id, created_at) "
+              f"VALUES ('Restored', 'a secret about the harbour', 0, {user_id}, '2024-01-01 00:00:00')")
+
+    with sqlite3.connect(path) as connection:
+        with pytest.raises(sqlite3.OperationalError, match='secret_text'):
+            connection.execute(insert)
+
+    result = runner.invoke(search_drop_triggers_command)
+    assert result.exit_code == 0 and 'Dropped 3 triggers' in result.output
+    with sqlite3.connect(path) as connection:
+        connection.execute(insert)
+
+    assert runner.invoke(search_backfill_command).exit_code == 0
+    assert search(app.test_client(), 'harbour') == ['Restored']
+    with sqlite3.connect(path) as connection:
+        with pytest.raises(sqlite3.OperationalError, match='secret_text'):
+            connection.execute(insert)
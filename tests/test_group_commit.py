@@ -0,0 +1,88 @@
+"""Group commit: batching concurrent inserts while each caller keeps its own id or error."""
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, event, select
+from sqlalchemy.exc import IntegrityError
+
+from group_commit import GroupCommitter
+
+metadata = MetaData()
+note = Table('note', metadata, Column('id', Integer, primary_key=True), Column('slug', String, unique=True))
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'notes.db'}")
+    metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def count_commits(engine):
+    commits = []
+    event.listen(engine, 'commit', lambda connection: commits.append(1))
+    return commits
+
+
+def test_lone_insert_does_not_wait_for_the_window(engine):
+    writer = GroupCommitter(note, window=5.0)
+    started = time.monotonic()
+    assert writer.submit(engine, {'slug': 'alone'}) == 1
+    assert time.monotonic() - started < 1.0
+
+
+def test_concurrent_callers_each_get_their_own_id(engine):
+    writer = GroupCommitter(note, window=0.05)
+    barrier = threading.Barrier(16)
+    results = {}
+
+    def submit(i):
+        barrier.wait()
+        results[i] = writer.submit(engine, {'slug': f'note-{i}'})
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(results.values())) == 16
+    with engine.connect() as connection:
+        stored = dict(connection.execute(select(note.c.id, note.c.slug)).all())
+    assert {stored[new_id] for new_id in results.values()} == {f'note-{i}' for i in range(16)}
+
+
+def test_failed_batch_is_replayed_so_each_caller_gets_its_own_error(engine):
+    writer = GroupCommitter(note)
+    with engine.begin() as connection:
+        connection.execute(note.insert().values(slug='taken'))
+    commits = count_commits(engine)
+    items = [(engine, {'slug': slug}, Future()) for slug in ('first', 'taken', 'second', 'taken')]
+    writer._flush(engine, items)
+
+    outcomes = [future.exception() or future.result() for _, _, future in items]
+    assert isinstance(outcomes[1], IntegrityError) and isinstance(outcomes[3], IntegrityError)
+    assert outcomes[1] is not outcomes[3]
+    assert isinstance(outcomes[0], int) and isinstance(outcomes[2], int) and outcomes[0] != outcomes[2]
+    # The batch rolled back, then the two good rows committed on their own
+    assert len(commits) == 2
+    with engine.connect() as connection:
+        assert sorted(connection.execute(select(note.c.slug)).scalars()) == ['first', 'second', 'taken']
+
+
+def test_queued_rows_share_one_transaction(engine):
+    writer = GroupCommitter(note, window=0.05)
+    commits = count_commits(engine)
+    futures = []
+    for i in range(5):
+        future = Future()
+        writer._queue.put((engine, {'slug': f'burst-{i}'}, future))
+        futures.append(future)
+    # Start the writer only once the burst is queued
+    threading.Thread(target=writer._run, daemon=True).start()
+
+    assert len({future.result(timeout=5) for future in futures}) == 5
+    assert len(commits) == 1
@@ -0,0 +1,76 @@
+"""Cached anonymous pages: variants, ETags and per-response CSRF tokens."""
+import itertools
+
+from flask import Flask, render_template_string
+
+from page_cache import CSRF_PLACEHOLDER, PageCache
+
+
+def test_cached_page_answers_conditional_requests(make_app):
+    app = make_app(PAGE_CACHE_ENABLED=True)
+    client = app.test_client()
+    first = client.get('/about')
+    assert first.status_code == 200 and first.headers['ETag']
+    assert 'no-cache' in first.headers['Cache-Control']
+    second = client.get('/about')
+    assert second.get_data() == first.get_data() and second.headers['ETag'] == first.headers['ETag']
+    assert client.get('/about', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+    assert client.get('/about', headers={'If-None-Match': '"stale"'}).status_code == 200
+
+
+def test_config_values_are_part_of_the_variant(make_app):
+    app = make_app(PAGE_CACHE_ENABLED=True, RECAPTCHA_SITE_KEY='first-key')
+    client = app.test_client()
+    assert b'first-key' in client.get('/signup').get_data()
+    app.config['RECAPTCHA_SITE_KEY'] = 'second-key'
+    page = client.get('/signup').get_data()
+    assert b'second-key' in page and b'first-key' not in page
+
+
+def test_disabled_cache_renders_every_time(make_app):
+    app = make_app(PAGE_CACHE_ENABLED=False)
+    response = app.test_client().get('/about')
+    assert response.status_code == 200 and 'ETag' not in response.headers
+    assert not app.extensions['page_cache']._pages
+
+
+def make_token_app():
+    app = Flask(__name__)
+    app.config['PAGE_CACHE_ENABLED'] = True
+    tokens = itertools.count()
+    app.jinja_env.globals['csrf_token'] = lambda: f'token-{next(tokens)}'
+    cache = PageCache(app)
+    renders = []
+
+    @app.route('/form')
+    @cache.cached()
+    def form():
+        renders.append(1)
+        return render_template_string('<form><input value="{{ csrf_token() }}"></form>')
+
+    @app.route('/missing')
+    @cache.cached()
+    def missing():
+        renders.append(1)
+        return 'gone', 404
+
+    return app, renders
+
+
+def test_tokens_are_fresh_on_every_response_of_a_cached_page():
+    app, renders = make_token_app()
+    client = app.test_client()
+    first, second = client.get('/form'), client.get('/form')
+    assert len(renders) == 1
+    assert first.get_data() != second.get_data()
+    for response in (first, second):
+        body = response.get_data(as_text=True)
+        assert 'token-' in body and CSRF_PLACEHOLDER not in body
+        assert 'ETag' not in response.headers and 'no-store' in response.headers['Cache-Control']
+
+
+def test_error_responses_are_not_cached():
+    app, renders = make_token_app()
+    client = app.test_client()
+    assert [client.get('/missing').status_code for _ in range(2)] == [404, 404]
+    assert len(renders) == 2
@@ -0,0 +1,135 @@
+"""Sliding-window estimates, Retry-After and counter expiry."""
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+from flask import Flask
+
+import ratelimit
+from ratelimit import MemoryStorage, RateLimiter, SQLiteStorage
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def storage(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryStorage()
+    return SQLiteStorage(str(tmp_path / 'ratelimit.db'))
+
+
+def test_sliding_estimate_weights_previous_window_by_overlap():
+    # A quarter of the way into bucket 10, three quarters of bucket 9 still overlap
+    estimate, bucket, current, previous = ratelimit._sliding_estimate(10, 1, 4, 615.0, 60)
+    assert (bucket, current, previous) == (10, 1, 4)
+    assert estimate == pytest.approx(4.0)
+
+
+def test_sliding_estimate_rolls_counters_forward():
+    assert ratelimit._sliding_estimate(9, 3, 7, 615.0, 60)[1:] == (10, 0, 3)
+    # More than one window later nothing carries over
+    assert ratelimit._sliding_estimate(8, 3, 7, 615.0, 60)[1:] == (10, 0, 0)
+
+
+@pytest.mark.parametrize('current, previous, limit, elapsed, expected', [
+    # 4 * (1 - e/60) + 1 < 4 once more than 15s have passed
+    (1, 4, 4, 0, 16),
+    # Without a previous window this one's hits decay through the next: 3 * (1 - x) < 3
+    (3, 0, 3, 0, 61),
+    (1, 0, 1, 20, 41),
+    # Over the limit inside this window: 6 * (1 - x) < 4 needs a third of the next one
+    (6, 2, 4, 30, 51),
+])
+def test_retry_after_is_first_allowed_second(current, previous, limit, elapsed, expected):
+    now = 600.0 + elapsed
+    retry_after = ratelimit._retry_after(current, previous, limit, now, 60, 10)
+    assert retry_after == expected
+
+    def estimate(at):
+        return ratelimit._sliding_estimate(10, current, previous, at, 60)[0]
+    assert estimate(now + retry_after) < limit
+    assert estimate(now + retry_after - 1) >= limit
+
+
+def test_limit_then_recover(storage):
+    now = 6000.0
+    assert [storage.hit('k', 3, 60, now)[0] for _ in range(4)] == [True, True, True, False]
+    allowed, retry_after = storage.hit('k', 3, 60, now + 10)
+    assert not allowed and retry_after == 61 - 10
+    assert not storage.hit('k', 3, 60, now + 10 + retry_after - 1)[0]
+    assert storage.hit('k', 3, 60, now + 10 + retry_after)[0]
+
+
+def test_short_limits_do_not_expire_long_ones(storage):
+    now = 36000.0
+    for _ in range(3):
+        assert storage.hit('hourly', 3, 3600, now)[0]
+    # Many per-minute keys across several minutes, well past their own expiry
+    for minute in range(10):
+        for i in range(50):
+            storage.hit(f'minute-{minute}-{i}', 5, 60, now + minute * 60)
+    assert not storage.hit('hourly', 3, 3600, now + 600)[0]
+
+
+def test_expired_counters_are_dropped(tmp_path):
+    memory = MemoryStorage()
+    memory.hit('old', 5, 60, 6000.0)
+    memory.hit('fresh', 5, 60, 6100.0)
+    assert len(memory) == 2
+    memory.hit('fresh', 5, 60, 6130.0)
+    assert len(memory) == 1
+
+    path = str(tmp_path / 'ratelimit.db')
+    shared = SQLiteStorage(path)
+    shared.hit('old', 5, 60, 6000.0)
+    shared.hit('fresh', 5, 60, 6130.0)
+    shared.prune(6130.0)
+    assert [row[0] for row in sqlite3.connect(path).execute('SELECT key FROM rate_limit')] == ['fresh']
+
+
+def test_sqlite_storage_replaces_table_without_expiry(tmp_path):
+    path = str(tmp_path / 'ratelimit.db')
+    connection = sqlite3.connect(path)
+    connection.execute('CREATE TABLE rate_limit (key TEXT PRIMARY KEY, bucket INTEGER NOT NULL, '
+                       'current INTEGER NOT NULL, previous INTEGER NOT NULL)')
+    connection.commit()
+    assert SQLiteStorage(path).hit('k', 1, 60, 6000.0)[0]
+
+
+def test_limited_response_carries_retry_after(monkeypatch):
+    app = Flask(__name__)
+    limiter = RateLimiter(app)
+
+    @app.route('/ping')
+    @limiter.limit(2, per=60)
+    def ping():
+        return 'pong'
+
+    monkeypatch.setattr(ratelimit.time, 'time', lambda: 6015.0)
+    client = app.test_client()
+    assert [client.get('/ping').status_code for _ in range(2)] == [200, 200]
+    response = client.get('/ping')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '46'
+
+
+def test_async_views_check_limits_off_the_event_loop():
+    app = Flask(__name__)
+    limiter = RateLimiter(app)
+    threads = []
+
+    class RecordingStorage(MemoryStorage):
+        def hit(self, *args):
+            threads.append(threading.current_thread().name)
+            return super().hit(*args)
+
+    limiter.storage = RecordingStorage()
+
+    @limiter.limit(1, per=60)
+    async def ping():
+        return 'pong'
+
+    with app.test_request_context('/ping'):
+        assert asyncio.run(ping()) == 'pong'
+        response = asyncio.run(ping())
+    assert response.status_code == 429
+    assert len(threads) == 2 and threading.main_thread().name not in threads
@@ -0,0 +1,89 @@
+"""Hearts: one per user and secret, write-behind counters and what readers see meanwhile."""
+import sqlite3
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+
+import reactions
+from conftest import login
+from extensions import db
+from models import Reaction, ReactionCount, Secret, User
+
+
+class HookedConnection(sqlite3.Connection):
+    after_commit = None
+
+    def commit(self):
+        super().commit()
+        if HookedConnection.after_commit is not None:
+            hook, HookedConnection.after_commit = HookedConnection.after_commit, None
+            hook()
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'hearts.db'}", connect_args={'factory': HookedConnection})
+    db.metadata.create_all(engine, tables=[Reaction.__table__, ReactionCount.__table__])
+    yield engine
+    HookedConnection.after_commit = None
+    engine.dispose()
+
+
+def count(engine, counter, secret_id):
+    with engine.connect() as connection:
+        return reactions.counts(connection, counter, [secret_id])[secret_id]
+
+
+def test_reader_right_after_the_commit_counts_deltas_once(engine):
+    counter = reactions.ReactionCounter(interval=60)
+    # Queued as add() would, without starting the background flusher
+    counter._deltas, counter._engine = {7: 3}, engine
+    seen = []
+    reader = threading.Thread(target=lambda: seen.append(count(engine, counter, 7)))
+
+    def read_between_commit_and_cleanup():
+        reader.start()
+        reader.join(timeout=0.2)
+
+    HookedConnection.after_commit = read_between_commit_and_cleanup
+    counter.flush()
+    reader.join()
+    assert seen == [3]
+    assert count(engine, counter, 7) == 3
+
+
+def test_failed_flush_keeps_deltas_for_the_next_one(tmp_path, engine):
+    counter = reactions.ReactionCounter(interval=0)
+    broken = create_engine(f"sqlite:///{tmp_path / 'empty.db'}")
+    counter.add(broken, 7, 1)
+    counter.add(broken, 7, 1)
+    assert counter.pending([7]) == {7: 2}
+    counter.add(engine, 7, -1)
+    assert counter.pending([7]) == {}
+    assert count(engine, counter, 7) == 1
+    broken.dispose()
+
+
+def test_hearts_are_one_per_user_and_counted_with_the_feed(make_app):
+    app = make_app(DEDUP_ENABLED=False)
+    with app.app_context():
+        user_ids = [user.id for user in User.query.order_by(User.id)]
+        secret_id = db.session.execute(db.select(Secret.id).order_by(Secret.id)).scalars().first()
+    client = app.test_client()
+    for user_id in user_ids:
+        login(client, user_id)
+        assert client.post(f'/api/secrets/{secret_id}/heart').status_code == 201
+    # A second tap changes nothing
+    again = client.post(f'/api/secrets/{secret_id}/heart')
+    assert again.status_code == 200 and again.get_json()['hearts'] == len(user_ids)
+
+    def listed():
+        items = client.get('/api/secrets', query_string={'limit': 50}).get_json()['secrets']
+        return next(item for item in items if item['id'] == secret_id)
+
+    item = listed()
+    assert item['hearts'] == len(user_ids) and item['hearted']
+    assert client.delete(f'/api/secrets/{secret_id}/heart').status_code == 200
+    item = listed()
+    assert item['hearts'] == len(user_ids) - 1 and not item['hearted']
@@ -0,0 +1,77 @@
+"""Ranked full-text search: matching, highlighting, paging and sharding."""
+import pytest
+
+import fulltext
+from app import secret_shards
+from conftest import login
+from models import User
+
+
+@pytest.fixture(params=[1, 3], ids=['single', 'sharded'])
+def app(request, make_app):
+    app = make_app(SECRET_SHARDS=request.param, DEDUP_ENABLED=False)
+    with app.app_context():
+        users = User.query.all()
+        for i in range(7):
+            secret_shards.insert({'title': f'Lantern {i}', 'content': f'I keep a paper lantern lit, night {i}.',
+                                  'user_id': users[i % len(users)].id})
+        secret_shards.insert({'title': 'Unrelated', 'content': 'Nothing but a <b>quokka</b>.', 'user_id': users[0].id})
+    return app
+
+
+def search(client, **query):
+    response = client.get('/api/secrets/search', query_string=query)
+    return response.status_code, response.get_json()
+
+
+def test_build_match_quotes_terms_and_prefixes_the_last():
+    assert fulltext.build_match('paper lan') == '"paper" "lan"*'
+    assert fulltext.build_match('"); DROP TABLE secret; --') == '"DROP" "TABLE" "secret"*'
+    assert fulltext.build_match('  ...  ') is None
+
+
+def test_render_highlight_escapes_content_but_keeps_marks():
+    assert fulltext.render_highlight('<b>\x02lantern\x03</b>') == '&lt;b&gt;<mark>lantern</mark>&lt;/b&gt;'
+
+
+def test_search_pages_through_every_hit_once(app):
+    client = app.test_client()
+    seen, cursor = [], None
+    while True:
+        query = {'q': 'lantern', 'limit': 3, **({'cursor': cursor} if cursor else {})}
+        status, body = search(client, **query)
+        assert status == 200
+        seen.extend(body['results'])
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+    assert sorted(item['title'] for item in seen) == [f'Lantern {i}' for i in range(7)]
+    assert all('<mark>' in item['highlight']['content'] for item in seen)
+
+
+def test_prefix_match_and_escaped_snippets(app):
+    client = app.test_client()
+    status, body = search(client, q='lante')
+    assert status == 200 and len(body['results']) == 7
+    status, body = search(client, q='quokka')
+    assert [item['title'] for item in body['results']] == ['Unrelated']
+    assert '&lt;b&gt;<mark>quokka</mark>&lt;/b&gt;' in body['results'][0]['highlight']['content']
+
+
+def test_bad_queries_are_rejected(app):
+    client = app.test_client()
+    assert search(client)[0] == 400
+    assert search(client, q='lantern', cursor='garbage')[0] == 400
+    status, body = search(client, q='!!!')
+    assert status == 200 and body['results'] == [] and body['next_cursor'] is None
+
+
+def test_results_carry_hearts(app):
+    client = app.test_client()
+    with app.app_context():
+        user_id = User.query.first().id
+    login(client, user_id)
+    secret_id = search(client, q='Unrelated')[1]['results'][0]['id']
+    assert client.post(f'/api/secrets/{secret_id}/heart').status_code == 201
+    hit = search(client, q='Unrelated')[1]['results'][0]
+    assert hit['hearts'] == 1 and hit['hearted']
@@ -0,0 +1,96 @@
+"""Sharding secrets: placement by author, globally unique ids and rebalancing."""
+import threading
+from collections import Counter
+
+import pytest
+from sqlalchemy import create_engine, text
+
+import shards
+from app import rebalance_shards_command, secret_shards
+from extensions import db
+from models import Secret, User
+
+
+def test_jump_hash_is_stable_and_moves_keys_only_to_the_new_shard():
+    keys = range(1, 5001)
+    before = [shards.jump_hash(key, 4) for key in keys]
+    assert before == [shards.jump_hash(key, 4) for key in keys]
+    assert set(before) == {0, 1, 2, 3}
+    assert max(Counter(before).values()) < 1.2 * len(keys) / 4
+
+    after = [shards.jump_hash(key, 5) for key in keys]
+    moved = [(old, new) for old, new in zip(before, after) if old != new]
+    assert all(new == 4 for _, new in moved)
+    assert abs(len(moved) - len(keys) / 5) < 0.05 * len(keys)
+
+
+@pytest.fixture
+def primary(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    with engine.begin() as connection:
+        connection.execute(shards._ID_BLOCK_DDL)
+        connection.execute(text('INSERT INTO secret_id_block (id, next_id) VALUES (1, 100)'))
+    yield engine
+    engine.dispose()
+
+
+def test_id_allocators_never_hand_out_the_same_id(primary):
+    # Two allocators stand in for two worker processes sharing the primary
+    allocators = [shards.IdAllocator(block_size=7), shards.IdAllocator(block_size=7)]
+    ids = []
+    lock = threading.Lock()
+
+    def take(allocator):
+        taken = [allocator.next_id(primary) for _ in range(50)]
+        with lock:
+            ids.extend(taken)
+
+    threads = [threading.Thread(target=take, args=(allocators[i % 2],)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(ids) == 300 and len(set(ids)) == 300 and min(ids) >= 100
+
+
+def test_forked_worker_leases_its_own_block(primary):
+    allocator = shards.IdAllocator(block_size=10)
+    first = allocator.next_id(primary)
+    allocator._pid = -1
+    assert allocator.next_id(primary) == first + 10
+
+
+def test_secrets_land_on_their_authors_shard_with_unique_ids(make_app):
+    app = make_app(SECRET_SHARDS=3, DEDUP_ENABLED=False)
+    with app.app_context():
+        users = User.query.all()
+        for user in users:
+            for i in range(4):
+                secret_shards.insert({'title': f'{user.username} {i}', 'content': 'sharded', 'user_id': user.id})
+        ids = []
+        for index, engine in enumerate(secret_shards.engines()):
+            for row in db.session.execute(db.select(Secret), bind_arguments={'bind': engine}).scalars():
+                assert secret_shards.index_for(row.user_id) == index
+                ids.append(row.id)
+    assert len(ids) == len(set(ids))
+
+
+def test_switching_sharding_on_keeps_ids_and_moves_rows(make_app):
+    app = make_app(DEDUP_ENABLED=False)
+    with app.app_context():
+        user_id = User.query.first().id
+        before = {row.id for row in db.session.execute(db.select(Secret)).scalars()}
+
+    app = make_app(SECRET_SHARDS=3, DEDUP_ENABLED=False)
+    result = app.test_cli_runner().invoke(rebalance_shards_command)
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        _, new_id = secret_shards.insert({'title': 'after', 'content': 'sharded now', 'user_id': user_id})
+        assert new_id > max(before)
+        on_shards = [row.id for engine in secret_shards.engines()
+                     for row in db.session.execute(db.select(Secret), bind_arguments={'bind': engine}).scalars()]
+        assert db.session.execute(text('SELECT COUNT(*) FROM secret')).scalar() == 0
+    # init_database seeds demo secrets into the new shards as well
+    assert before | {new_id} <= set(on_shards) and len(set(on_shards)) == len(on_shards)
+    feed = app.test_client().get('/api/secrets').get_json()
+    assert sorted(item['id'] for item in feed) == sorted(on_shards)
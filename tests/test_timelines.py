@@ -0,0 +1,80 @@
+"""Per-user timelines: who sees which secrets, keyset paging and the timeline index."""
+import datetime
+
+import pytest
+from sqlalchemy import text
+
+from app import secret_shards
+from conftest import login
+from extensions import db
+from models import User
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app(DEDUP_ENABLED=False)
+    with app.app_context():
+        author = User.query.order_by(User.id).first()
+        posted = datetime.datetime(2030, 1, 1, 12, 0, 0)
+        for i in range(9):
+            # Three secrets per second, so paging has to break ties on id
+            secret_shards.insert({'title': f'entry {i}', 'content': f'diary entry {i}', 'is_anonymous': i % 4 == 0,
+                                  'user_id': author.id, 'created_at': posted + datetime.timedelta(seconds=i // 3)})
+    return app
+
+
+def author(app):
+    with app.app_context():
+        user = User.query.order_by(User.id).first()
+        return user.id, user.username
+
+
+def pages(client, url, limit):
+    seen, cursor = [], None
+    while True:
+        query = {'limit': limit, **({'cursor': cursor} if cursor else {})}
+        body = client.get(url, query_string=query).get_json()
+        seen.extend(body['secrets'])
+        cursor = body['next_cursor']
+        if cursor is None:
+            return seen
+
+
+def test_own_timeline_includes_anonymous_secrets_newest_first(app):
+    user_id, _ = author(app)
+    client = app.test_client()
+    login(client, user_id)
+    seen = pages(client, '/api/me/secrets', 2)
+    titles = [item['title'] for item in seen if item['title'].startswith('entry')]
+    assert titles == [f'entry {i}' for i in reversed(range(9))]
+    keys = [(item['created_at'], item['id']) for item in seen]
+    assert keys == sorted(keys, reverse=True) and len(set(keys)) == len(keys)
+
+
+def test_public_timeline_hides_anonymous_secrets(app):
+    user_id, username = author(app)
+    client = app.test_client()
+    seen = pages(client, f'/api/users/{username}/secrets', 4)
+    titles = {item['title'] for item in seen}
+    assert {f'entry {i}' for i in range(9) if i % 4} <= titles
+    assert not {f'entry {i}' for i in (0, 4, 8)} & titles
+    assert all(item['author'] == username for item in seen)
+
+
+def test_timeline_errors(app):
+    client = app.test_client()
+    assert client.get('/api/me/secrets').status_code == 401
+    assert client.get('/api/users/nobody-here/secrets').status_code == 404
+    _, username = author(app)
+    assert client.get(f'/api/users/{username}/secrets?cursor=garbage').status_code == 400
+
+
+def test_timeline_query_uses_the_author_index(app):
+    user_id, _ = author(app)
+    with app.app_context():
+        plan = db.session.execute(text(
+            'EXPLAIN QUERY PLAN SELECT id FROM secret WHERE user_id = :user_id '
+            'ORDER BY created_at DESC, id DESC LIMIT 20'
+        ), {'user_id': user_id}).all()
+    detail = ' '.join(row[-1] for row in plan)
+    assert 'ix_secret_user_timeline' in detail and 'TEMP B-TREE' not in detail
@@ -0,0 +1,199 @@
+"""Decayed trending scores, their flushing and the materialized top list."""
+import math
+import time
+
+import pytest
+from sqlalchemy import create_engine, select, update
+
+import trending
+from app import refresh_trending_command, secret_shards
+from conftest import login
+from extensions import db
+from models import Secret, SecretScore, TrendingRefresh, TrendingSecret, User
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'trending.db'}")
+    db.metadata.create_all(engine, tables=[SecretScore.__table__, TrendingSecret.__table__,
+                                           TrendingRefresh.__table__])
+    with engine.begin() as connection:
+        trending.install(connection)
+    yield engine
+    engine.dispose()
+
+
+def listed(engine):
+    with engine.connect() as connection:
+        return [secret_id for secret_id, _ in trending.page(connection, None, 100)]
+
+
+def set_refreshed_at(engine, at):
+    with engine.begin() as connection:
+        connection.execute(update(TrendingRefresh).where(TrendingRefresh.id == 1).values(refreshed_at=at))
+
+
+def test_idle_tick_refreshes_events_whose_claim_failed(engine, monkeypatch):
+    scores = trending.TrendingScores(interval=0, refresh_every=60)
+    clock = [10000.0]
+    monkeypatch.setattr(trending.time, 'time', lambda: clock[0])
+    # Another worker refreshed just before this heart arrived
+    set_refreshed_at(engine, clock[0] - 1)
+    scores.record(engine, 7, trending.HEART_WEIGHT)
+    assert listed(engine) == []
+
+    clock[0] += 30
+    scores.flush()
+    assert listed(engine) == []
+    clock[0] += 31
+    # No new events, but the earlier ones are still waiting for a refresh
+    scores.flush()
+    assert listed(engine) == [7]
+    assert scores._flushed_at is None
+
+
+def test_refresh_by_another_worker_settles_pending_flush(engine, monkeypatch):
+    scores = trending.TrendingScores(interval=0, refresh_every=60)
+    clock = [10000.0]
+    monkeypatch.setattr(trending.time, 'time', lambda: clock[0])
+    set_refreshed_at(engine, clock[0] - 1)
+    scores.record(engine, 7, trending.HEART_WEIGHT)
+    assert scores._flushed_at == clock[0]
+
+    clock[0] += 5
+    set_refreshed_at(engine, clock[0])
+    scores.flush()
+    assert scores._flushed_at is None
+    with engine.connect() as connection:
+        assert connection.execute(select(TrendingRefresh.refreshed_at)).scalar() == clock[0]
+
+
+NOW = 1e6
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Flushes refresh against the wall clock, which would prune these made-up event times
+    monkeypatch.setattr(trending.time, 'time', lambda: NOW)
+
+
+def score_of(engine, secret_id):
+    with engine.connect() as connection:
+        return connection.execute(select(SecretScore.score).where(SecretScore.secret_id == secret_id)).scalar()
+
+
+def test_log_helpers():
+    assert trending.logaddexp(None, 1.5) == 1.5 and trending.logaddexp(1.5, None) == 1.5
+    assert trending.logaddexp(0.0, 0.0) == pytest.approx(math.log(2))
+    assert trending.logaddexp(1000.0, 1000.0) == pytest.approx(1000.0 + math.log(2))
+    assert trending.logsubexp(math.log(3), 0.0) == pytest.approx(math.log(2))
+    assert trending.logsubexp(1.0, 1.0) is None
+    assert trending.logsubexp(None, 1.0) is None and trending.logsubexp(1.0, None) == 1.0
+
+
+def test_score_is_log_of_weighted_exponential_sum(engine, clock):
+    scores = trending.TrendingScores(half_life_hours=1, interval=0)
+    scores.record(engine, 1, trending.POST_WEIGHT, at=NOW - 1000)
+    scores.record(engine, 1, trending.HEART_WEIGHT, at=NOW)
+    expected = math.log(trending.POST_WEIGHT * math.exp(-scores.rate * 1000) + trending.HEART_WEIGHT) + scores.rate * NOW
+    assert score_of(engine, 1) == pytest.approx(expected)
+
+
+def test_decay_halves_weight_every_half_life(engine, clock):
+    scores = trending.TrendingScores(half_life_hours=1, interval=0)
+    scores.record(engine, 1, trending.HEART_WEIGHT, at=NOW - 3601)
+    scores.record(engine, 1, trending.HEART_WEIGHT, at=NOW - 3601)
+    scores.record(engine, 2, trending.HEART_WEIGHT, at=NOW - 1)
+    scores.record(engine, 3, trending.HEART_WEIGHT, at=NOW)
+    # Two hearts an hour older weigh as much as one
+    assert score_of(engine, 1) == pytest.approx(score_of(engine, 2))
+    scores.refresh(engine)
+    assert listed(engine)[0] == 3
+
+
+def test_unheart_removes_exactly_its_weight(engine, clock):
+    scores = trending.TrendingScores(interval=0)
+    scores.record(engine, 1, trending.HEART_WEIGHT, at=NOW - 1000)
+    scores.record(engine, 1, trending.HEART_WEIGHT, at=NOW)
+    scores.record(engine, 2, trending.HEART_WEIGHT, at=NOW)
+    scores.record(engine, 1, -trending.HEART_WEIGHT, at=NOW - 1000)
+    assert score_of(engine, 1) == pytest.approx(score_of(engine, 2))
+
+    scores.record(engine, 2, -trending.HEART_WEIGHT, at=NOW)
+    assert score_of(engine, 2) is None
+    scores.refresh(engine)
+    assert listed(engine) == [1]
+
+
+def test_refresh_drops_scores_decayed_past_retention(engine, clock):
+    scores = trending.TrendingScores(half_life_hours=1, interval=0)
+    scores.record(engine, 1, trending.HEART_WEIGHT, at=NOW - 3600 * (trending.RETAIN_HALF_LIVES + 1))
+    scores.record(engine, 2, trending.HEART_WEIGHT, at=NOW - 3600 * (trending.RETAIN_HALF_LIVES - 1))
+    scores.refresh(engine)
+    assert listed(engine) == [2]
+    assert score_of(engine, 1) is None
+
+
+def test_rebuild_recomputes_scores_from_posts_and_hearts(make_app):
+    app = make_app(DEDUP_ENABLED=False)
+    client = app.test_client()
+    with app.app_context():
+        user_ids = [user.id for user in User.query.order_by(User.id)]
+        posted = {row.id: row.created_at for engine in secret_shards.engines()
+                  for row in db.session.execute(db.select(Secret), bind_arguments={'bind': engine}).scalars()}
+    hearted = sorted(posted)[:3]
+    for count, user_id in enumerate(user_ids, 1):
+        login(client, user_id)
+        for secret_id in hearted[:count]:
+            assert client.post(f'/api/secrets/{secret_id}/heart').status_code == 201
+    with app.app_context():
+        scores = app.extensions['trending']
+        incremental = dict(db.session.execute(db.select(SecretScore.secret_id, SecretScore.score)).all())
+        assert sorted(incremental) == hearted
+        scores.rebuild(db.engine, secret_shards.engines())
+        rebuilt = dict(db.session.execute(db.select(SecretScore.secret_id, SecretScore.score)).all())
+    # Demo secrets predate trending, so only their hearts were recorded as they happened
+    assert set(rebuilt) == set(posted)
+    for secret_id, score in rebuilt.items():
+        post = math.log(trending.POST_WEIGHT) + scores.rate * trending.epoch(posted[secret_id])
+        assert score == pytest.approx(trending.logaddexp(incremental.get(secret_id), post), abs=1e-3)
+
+
+def test_trending_feed_pages_by_score_cursor(make_app):
+    app = make_app(DEDUP_ENABLED=False)
+    with app.app_context():
+        user_id = User.query.first().id
+        scores = app.extensions['trending']
+        for i in range(7):
+            _, secret_id = secret_shards.insert({'title': f'secret {i}', 'content': f'body {i}', 'user_id': user_id})
+            # Later ids get more recent engagement; the last two tie and fall back to id order
+            scores.record(db.engine, secret_id, trending.HEART_WEIGHT, at=time.time() - 60 + min(i, 5))
+        scores.refresh(db.engine)
+        expected = [secret_id for secret_id, _ in trending.page(db.session.connection(), None, 100)]
+    assert len(expected) == 7
+
+    client = app.test_client()
+    seen, cursor = [], None
+    while True:
+        query = {'sort': 'trending', 'limit': 3, **({'cursor': cursor} if cursor else {})}
+        body = client.get('/api/secrets', query_string=query).get_json()
+        seen.extend(item['id'] for item in body['secrets'])
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+    assert seen == expected
+    assert client.get('/api/secrets?sort=trending&cursor=nonsense').status_code == 400
+
+
+def test_unsupported_database_disables_trending(make_app, monkeypatch):
+    monkeypatch.setattr(trending, 'DIALECTS', ('postgresql',))
+    app = make_app(DEDUP_ENABLED=False)
+    assert app.extensions['trending'] is None
+    client = app.test_client()
+    assert client.get('/api/secrets?sort=trending').status_code == 501
+    with app.app_context():
+        user_id = User.query.first().id
+    login(client, user_id)
+    assert client.post('/api/secrets', json={'title': 'still works', 'content': 'posting without trending'}).status_code == 201
+    result = app.test_cli_runner().invoke(refresh_trending_command)
+    assert result.exit_code != 0 and 'disabled' in result.output
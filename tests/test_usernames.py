@@ -0,0 +1,55 @@
+"""Usernames allocated to new OAuth accounts."""
+import pytest
+from sqlalchemy import event
+
+from app import _allocate_username
+from extensions import db
+from models import User
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app(DEDUP_ENABLED=False)
+
+
+def add_users(*usernames):
+    for username in usernames:
+        db.session.add(User(username=username, email=f'{username}@example.com', password='x'))
+    db.session.commit()
+
+
+def test_free_name_is_used_as_is(app):
+    with app.app_context():
+        assert _allocate_username('nightowl') == 'nightowl'
+        add_users('nightowl2')
+        assert _allocate_username('nightowl') == 'nightowl'
+
+
+def test_taken_name_gets_one_more_than_its_highest_suffix(app):
+    with app.app_context():
+        add_users('nightowl')
+        assert _allocate_username('nightowl') == 'nightowl1'
+        add_users('nightowl1', 'nightowl3', 'nightowl9', 'nightowl10')
+        assert _allocate_username('nightowl') == 'nightowl11'
+
+
+def test_names_that_are_not_numeric_suffixes_are_ignored(app):
+    with app.app_context():
+        add_users('nightowl', 'nightowl2', 'nightowl99x', 'nightowl007', 'nightowls', 'nightowl_5')
+        assert _allocate_username('nightowl') == 'nightowl3'
+
+
+def test_suffix_lookup_is_a_single_limited_query(app):
+    with app.app_context():
+        add_users('nightowl', *[f'nightowl{i}' for i in range(1, 40)])
+        statements = []
+
+        def listener(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            assert _allocate_username('nightowl') == 'nightowl40'
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+    assert len(statements) == 2 and 'LIMIT' in statements[-1]
@@ -0,0 +1,271 @@
+"""Trending ranking: time-decayed engagement, maintained as events happen.
+
+A secret's trending value at time t is the sum of w * 2^(-(t - t_e) / H) over
+its events e (the post itself and each heart), with half-life H =
+TRENDING_HALF_LIFE_HOURS. Decay scales every secret by the same factor, so
+only events change the order, and ``secret_score`` can store the
+time-independent log(sum(w * e^(rate * t_e))), rate = ln 2 / H. An event is
+then one logaddexp into the score and an un-heart the matching subtraction of
+the heart's own weight; nothing is rescanned and logs never overflow.
+
+Events are folded per secret in memory and written every
+REACTION_FLUSH_SECONDS as one upsert per secret. The merge happens in the
+database, so concurrent flushes from several workers cannot lose each other's
+events. SQLite gets ``trending_logaddexp``/``trending_logsubexp`` as Python
+functions on every connection; PostgreSQL gets SQL versions from ``flask
+init-db``. On any other database the app runs with trending switched off.
+
+A worker whose flushed events may not be in the list yet tries on every tick,
+with or without new events, to claim ``trending_refresh``. The first to claim
+it once per TRENDING_REFRESH_SECONDS copies the best TRENDING_TOP_K scores into ``trending_secret`` and drops scores that
+have decayed below 2^-RETAIN_HALF_LIVES of a fresh heart. The trending feed
+reads only that materialized list. ``flask refresh-trending`` refreshes on
+demand; ``--rebuild`` recomputes every score from post and heart times (after
+changing the half-life, for example).
+"""
+import atexit
+import datetime
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from sqlalchemy import delete, event, insert, select, text, update
+from sqlalchemy.engine import Engine
+
+from extensions import db
+from models import Reaction, Secret, SecretScore, TrendingRefresh, TrendingSecret
+
+POST_WEIGHT = 0.5
+HEART_WEIGHT = 1.0
+RETAIN_HALF_LIVES = 10
+
+DIALECTS = ('sqlite', 'postgresql')
+
+# NULL means nothing is left (every heart was taken back); refresh drops those rows
+_UPSERT = text(
+    'INSERT INTO secret_score (secret_id, score) VALUES (:secret_id, trending_logsubexp(:pos, :neg)) '
+    'ON CONFLICT (secret_id) DO UPDATE SET '
+    'score = trending_logsubexp(trending_logaddexp(secret_score.score, :pos), :neg)'
+)
+
+
+# exp() underflow is an error in PostgreSQL, so terms more than 40 nats apart
+# (negligible next to double precision) short-circuit to the larger one
+_POSTGRES_FUNCTIONS = [
+    """CREATE OR REPLACE FUNCTION trending_logaddexp(a double precision, b double precision)
+       RETURNS double precision LANGUAGE sql IMMUTABLE AS $$
+         SELECT CASE WHEN a IS NULL THEN b
+                     WHEN b IS NULL THEN a
+                     WHEN ABS(a - b) > 40 THEN GREATEST(a, b)
+                     ELSE GREATEST(a, b) + LN(1 + EXP(LEAST(a, b) - GREATEST(a, b))) END
+       $$""",
+    """CREATE OR REPLACE FUNCTION trending_logsubexp(a double precision, b double precision)
+       RETURNS double precision LANGUAGE sql IMMUTABLE AS $$
+         SELECT CASE WHEN b IS NULL THEN a
+                     WHEN a IS NULL OR a - b < 1e-9 THEN NULL
+                     WHEN a - b > 40 THEN a
+                     ELSE a + LN(1 - EXP(b - a)) END
+       $$""",
+]
+
+
+def logaddexp(a, b):
+    """log(e^a + e^b), with None standing for log(0)."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def logsubexp(a, b):
+    """log(e^a - e^b), or None when nothing (or only rounding error) is left."""
+    if b is None:
+        return a
+    if a is None or a - b < 1e-9:
+        return None
+    return a + math.log1p(-math.exp(b - a))
+
+
+def epoch(value):
+    """Seconds since the epoch for a naive UTC datetime (as CURRENT_TIMESTAMP stores them)."""
+    return value.replace(tzinfo=datetime.UTC).timestamp()
+
+
+class TrendingScores:
+    def __init__(self, half_life_hours=6.0, interval=2.0, refresh_every=60.0, top_k=500):
+        self.rate = math.log(2) / (half_life_hours * 3600.0)
+        self.interval = interval
+        self.refresh_every = refresh_every
+        self.top_k = top_k
+        self._events = {}
+        self._engine = None
+        # When this worker last flushed events that no refresh has picked up yet
+        self._flushed_at = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def record(self, engine, secret_id, weight, at=None):
+        """Add an event of ``weight`` (negative to take one back) that happened at epoch seconds ``at``."""
+        if self.interval > 0:
+            self._ensure_worker()
+        at = time.time() if at is None else at
+        term = math.log(abs(weight)) + self.rate * at
+        with self._lock:
+            pos, neg = self._events.get(secret_id, (None, None))
+            if weight > 0:
+                pos = logaddexp(pos, term)
+            else:
+                neg = logaddexp(neg, term)
+            self._events[secret_id] = (pos, neg)
+            self._engine = engine
+        if self.interval <= 0:
+            self.flush()
+
+    def flush(self):
+        """Fold pending events into ``secret_score``, then refresh the top list if ours are not in it and it is due."""
+        with self._lock:
+            events, self._events = self._events, {}
+            engine = self._engine
+        if events:
+            rows = [{'secret_id': secret_id, 'pos': pos, 'neg': neg} for secret_id, (pos, neg) in events.items()]
+            try:
+                with engine.begin() as connection:
+                    connection.execute(_UPSERT, rows)
+            except Exception as e:
+                print(f"[TRENDING] Flush of {len(rows)} scores failed: {e}")
+                with self._lock:
+                    for secret_id, (pos, neg) in events.items():
+                        current = self._events.get(secret_id, (None, None))
+                        self._events[secret_id] = (logaddexp(current[0], pos), logaddexp(current[1], neg))
+                return
+            self._flushed_at = time.time()
+        flushed_at = self._flushed_at
+        if flushed_at is None:
+            return
+        try:
+            if self.refresh(engine, force=False) is not None or _refreshed_since(engine, flushed_at):
+                # Unless another flush landed meanwhile
+                if self._flushed_at == flushed_at:
+                    self._flushed_at = None
+        except Exception as e:
+            print(f"[TRENDING] Refresh failed: {e}")
+
+    def refresh(self, engine, force=True, now=None):
+        """Rebuild ``trending_secret`` from the best scores; returns its size, or None if another worker just did.
+
+        Unless ``force``, only one caller per ``refresh_every`` seconds (across
+        workers) gets to run it.
+        """
+        now = time.time() if now is None else now
+        with engine.begin() as connection:
+            if not force:
+                claimed = connection.execute(
+                    update(TrendingRefresh)
+                    .where(TrendingRefresh.id == 1, TrendingRefresh.refreshed_at <= now - self.refresh_every)
+                    .values(refreshed_at=now)
+                ).rowcount
+                if not claimed:
+                    return None
+            floor = self.rate * now - RETAIN_HALF_LIVES * math.log(2)
+            connection.execute(delete(SecretScore).where(SecretScore.score.is_(None) | (SecretScore.score < floor)))
+            connection.execute(delete(TrendingSecret))
+            connection.execute(insert(TrendingSecret).from_select(
+                ['secret_id', 'score'],
+                select(SecretScore.secret_id, SecretScore.score)
+                .order_by(SecretScore.score.desc(), SecretScore.secret_id.desc())
+                .limit(self.top_k)
+            ))
+            if force:
+                connection.execute(update(TrendingRefresh).where(TrendingRefresh.id == 1).values(refreshed_at=now))
+            return connection.execute(select(db.func.count()).select_from(TrendingSecret)).scalar()
+
+    def rebuild(self, engine, secret_engines, now=None):
+        """Recompute every score from post and heart times within the retention horizon, then refresh."""
+        now = time.time() if now is None else now
+        horizon = datetime.datetime.fromtimestamp(
+            now - RETAIN_HALF_LIVES * math.log(2) / self.rate, datetime.UTC
+        ).replace(tzinfo=None)
+        scores = {}
+
+        def add(secret_id, weight, created_at):
+            term = math.log(weight) + self.rate * epoch(created_at)
+            scores[secret_id] = logaddexp(scores.get(secret_id), term)
+
+        secret = Secret.__table__
+        for shard in secret_engines:
+            with shard.connect() as connection:
+                for secret_id, created_at in connection.execute(
+                    select(secret.c.id, secret.c.created_at).where(secret.c.created_at >= horizon)
+                ):
+                    add(secret_id, POST_WEIGHT, created_at)
+        with engine.connect() as connection:
+            for secret_id, created_at in connection.execute(
+                select(Reaction.secret_id, Reaction.created_at).where(Reaction.created_at >= horizon)
+            ):
+                add(secret_id, HEART_WEIGHT, created_at)
+
+        with engine.begin() as connection:
+            connection.execute(delete(SecretScore))
+            if scores:
+                connection.execute(insert(SecretScore), [
+                    {'secret_id': secret_id, 'score': score} for secret_id, score in scores.items()
+                ])
+        return len(scores), self.refresh(engine, now=now)
+
+    def _ensure_worker(self):
+        # Threads do not survive fork(), so pre-forked workers start their own
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                # Events inherited from the parent are the parent's to flush
+                self._events, self._flushed_at = {}, None
+                atexit.register(self.flush)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='trending-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+
+def _refreshed_since(engine, at):
+    # A refresh stamped at or after ``at`` started once our flush had committed
+    with engine.connect() as connection:
+        refreshed_at = connection.execute(select(TrendingRefresh.refreshed_at).where(TrendingRefresh.id == 1)).scalar()
+    return refreshed_at is not None and refreshed_at >= at
+
+
+def install(connection):
+    """Create the score functions (PostgreSQL) and the refresh bookkeeping row if they are missing."""
+    if connection.dialect.name == 'postgresql':
+        for ddl in _POSTGRES_FUNCTIONS:
+            connection.execute(text(ddl))
+    if connection.execute(select(TrendingRefresh.id).where(TrendingRefresh.id == 1)).first() is None:
+        connection.execute(insert(TrendingRefresh).values(id=1, refreshed_at=0.0))
+
+
+def page(connection, after, limit):
+    """``(secret_id, score)`` rows of the trending list after keyset ``after``, best first."""
+    stmt = select(TrendingSecret.secret_id, TrendingSecret.score)
+    if after:
+        stmt = stmt.where(db.tuple_(TrendingSecret.score, TrendingSecret.secret_id) < (after[0], after[1]))
+    return connection.execute(
+        stmt.order_by(TrendingSecret.score.desc(), TrendingSecret.secret_id.desc()).limit(limit)
+    ).all()
+
+
+@event.listens_for(Engine, 'connect')
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function('trending_logaddexp', 2, logaddexp, deterministic=True)
+        dbapi_connection.create_function('trending_logsubexp', 2, logsubexp, deterministic=True)